@@ -0,0 +1,632 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Array-backed cascade engines for the threshold model.
+
+The networkx graph generated for a case is converted once into a compressed
+sparse row (CSR) adjacency structure (`indptr`/`indices`), and the per-node
+state of a trial (assessed profit *I*, ambiguity *A*, adoption) is kept in
+NumPy arrays. The engines in this module evaluate the same adoption rule as
+`disim.run1997ThresholdModel`::
+
+    B_i,k = I_i + (A_i * k/N) > 0
+
+where *k* is the number of adopted neighbors of node *i* and *N* is the number
+of nodes in the network. For fixed *I*, *A* and *N* the rule reduces to an
+integer threshold on *k* (see `adoptionThresholds`), which the engines
+precompute once per trial so the cascade itself only compares counters.
+
+:Author: Christopher Kirkos
+
+Implementation
+--------------
+"""
+
+from __future__ import division
+
+import numpy as np
+from scipy import sparse
+from random import shuffle as _shuffle, Random
+from collections import deque
+from heapq import heappush, heappop
+from graphsearch import boundaryMasks, markGraphChanged
+
+class CSRTopology(object):
+    """The immutable topology of a generated network held as flat adjacency
+    arrays.
+
+    Nodes are addressed by their index in `nodes`, which preserves the order
+    of `G.nodes()`. The neighbors of node index *i* are
+    ``indices[indptr[i]:indptr[i+1]]``, in the order of `G.neighbors()`.
+    """
+
+    def __init__(self, G):
+        """Construct the topology from a networkx graph.
+
+        :param networkx.Graph G: A graph whose nodes carry the 'segments'
+                                 attribute (see `graphgen.generateARCorePeriph`).
+        """
+        self.nodes = G.nodes()
+        self.n = len(self.nodes)
+        self.index = dict((node,i) for i,node in enumerate(self.nodes))
+
+        indptr = [0]
+        indices = []
+        for node in self.nodes:
+            indices.extend(self.index[nb] for nb in G.neighbors(node))
+            indptr.append(len(indices))
+        self.indptr = np.array(indptr, dtype=np.intp)
+        self.indices = np.array(indices, dtype=np.intp)
+        self.degree = np.diff(self.indptr)
+        # the node index owning each entry of `indices`
+        self.rows = np.repeat(np.arange(self.n), self.degree)
+        # sparse adjacency matrix for propagating many trials at once
+        self.adjacency = sparse.csr_matrix(
+                                (np.ones(len(self.indices), dtype=np.intp),
+                                 self.indices, self.indptr),
+                                shape=(self.n, self.n))
+
+        self.segments = [G.node[node]['segments'] for node in self.nodes]
+        self.isCore = self.segmentMask('core')
+
+    def neighbors(self, i):
+        "The neighbor indices of node index `i`."
+        return self.indices[self.indptr[i]:self.indptr[i+1]]
+
+    def segmentMask(self, segment):
+        "Boolean array, True for each node that belongs to `segment`."
+        return np.array([segment in s for s in self.segments], dtype=bool)
+
+    def crossSegmentDegree(self, segment):
+        """The number of neighbors of each node that do not belong to
+        `segment`."""
+        return neighborSums(self, ~self.segmentMask(segment))
+
+
+class TrialState(object):
+    """The mutable state of a trial on a `CSRTopology`: assessed profits `I`,
+    ambiguities `A`, adoption flags `adopted` and, optionally, the
+    `influence` lists.
+
+    The buffers are allocated once per case and `reset` at the start of each
+    trial, so trials do not copy the case's network.
+    """
+
+    def __init__(self, topo, Ai, recordInfluence=False):
+        """
+        :param CSRTopology topo: The case topology.
+        :param Ai: The ambiguity level of the case, the same for every node
+                   and trial.
+        :param bool recordInfluence: Whether to keep influence lists.
+        """
+        self.n = topo.n
+        self.I = np.zeros(topo.n)
+        self.A = np.repeat(Ai, topo.n)
+        self.adopted = np.zeros(topo.n, dtype=bool)
+        self.influence = [[] for i in xrange(topo.n)] \
+                         if recordInfluence else None
+
+    def reset(self, I, seedNode):
+        """Start a new trial.
+
+        :param I: The assessed profit of each node.
+        :param int seedNode: Index of the seed adopter.
+        """
+        self.I[:] = I
+        self.adopted[:] = False
+        self.adopted[seedNode] = True
+        if self.influence is not None:
+            self.influence[:] = [[] for i in xrange(self.n)]
+
+
+def neighborSums(topo, values):
+    """For every node, the number of its neighbors for which the boolean
+    array `values` is True."""
+    return np.bincount(topo.rows[values[topo.indices]], minlength=topo.n)
+
+
+# Threshold of nodes that cannot adopt at any number of adopted neighbors
+NEVER_ADOPT = np.iinfo(np.intp).max
+
+def adoptionThresholds(I, A, N, degree=None):
+    """The least number of adopted neighbors *k* for which each node adopts,
+    ``I + (A * k/N) > 0``.
+
+    This is ``floor(-I*N/A) + 1`` for nodes with ``I <= 0`` and 0 for nodes
+    with ``I > 0``. The result is corrected against the floating point rule
+    itself, so comparing a count with the threshold gives exactly the same
+    decision as evaluating *B_i,k*.
+
+    :param numpy.Array I: Assessed profit of each node.
+    :param numpy.Array A: Ambiguity of each node (>= 0).
+    :param int N: The number of nodes in the network.
+    :param numpy.Array degree: Optional degree of each node. Nodes whose
+                               threshold exceeds their degree can never
+                               adopt.
+    :returns: Integer array of thresholds, `NEVER_ADOPT` for nodes that
+              cannot adopt.
+    """
+    I = np.asarray(I, dtype=float)
+    A = np.asarray(A, dtype=float)
+    # no node has more than N-1 neighbors, larger thresholds are unreachable
+    cap = N + 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.where(A > 0, -I*N/A, np.where(I > 0, -1.0, cap))
+    t = (np.floor(np.clip(x, -1, cap)) + 1).astype(np.intp)
+
+    def adopts(k):
+        return I + (A * (k/N)) > 0
+    t[(t > 0) & adopts(t-1)] -= 1
+    t[(t < cap) & ~adopts(t)] += 1
+
+    never = t >= cap
+    if degree is not None:
+        never |= t > degree
+    t[never] = NEVER_ADOPT
+    return t
+
+
+def sweepCascade(topo, I, A, adopted, influence=None, shuffle=_shuffle):
+    """Run the cascade with the activation schedule of the original
+    simulation loop: repeated sweeps over the non-adopters in uniformly random
+    order until a sweep produces no adoption.
+
+    Within a sweep, agents see the adoptions made earlier in the same sweep
+    (incremental updating). Adopted-neighbor counts are kept up to date as
+    nodes adopt instead of being recounted for each agent, and are compared
+    with the integer `adoptionThresholds`.
+
+    The `shuffle` function is called exactly as in the original loop, so a
+    trial consumes the random number stream identically.
+
+    :param CSRTopology topo: The network topology.
+    :param numpy.Array I: Assessed profit of each node.
+    :param numpy.Array A: Ambiguity (weight of bandwagon pressure) of each node.
+    :param numpy.Array adopted: Boolean adoption state, updated in place. The
+                                seed adopter(s) must already be set.
+    :param list influence: Optional list (one entry per node) that receives,
+                           for each adopting node, the indices of its
+                           neighbors that had adopted at the time of adoption.
+    :returns: The `adopted` array.
+    """
+    indptr, indices = topo.indptr, topo.indices
+    counts = neighborSums(topo, adopted)
+    T = adoptionThresholds(I, A, topo.n, topo.degree).tolist()
+
+    while True:
+        agents = np.flatnonzero(~adopted).tolist()
+        shuffle(agents)
+        madeChange = False
+        for a in agents:
+            if counts[a] >= T[a]:
+                adopted[a] = True
+                nbrs = indices[indptr[a]:indptr[a+1]]
+                if influence is not None:
+                    influence[a] = nbrs[adopted[nbrs]].tolist()
+                counts[nbrs] += 1
+                madeChange = True
+        if not madeChange:
+            break
+
+    return adopted
+
+
+def frontierCascade(topo, I, A, adopted, influence=None, shuffle=_shuffle):
+    """Run the cascade event-driven: a running adopted-neighbor count is kept
+    for every node and only the neighbors of a node that just adopted are
+    re-checked. Each edge is visited a constant number of times, so a trial
+    costs O(edges) instead of O(sweeps x edges) for `sweepCascade`.
+
+    The candidates that can adopt from the initial state are activated in
+    uniformly random order; nodes that become able to adopt are activated in
+    the order they were reached. The final adopters are the same as with
+    `sweepCascade` (adoption is monotone) and, as there, the influence list of
+    a node holds its neighbors that had adopted at the time it adopted.
+
+    The parameters and return value are the same as `sweepCascade`.
+    """
+    indptr, indices = topo.indptr, topo.indices
+    counts = neighborSums(topo, adopted)
+    T = adoptionThresholds(I, A, topo.n, topo.degree)
+
+    # nodes that have adopted, are waiting in the frontier to adopt or can 
+    # never adopt (these are never checked)
+    ready = counts >= T
+    queued = adopted | ready | (T == NEVER_ADOPT)
+    initial = np.flatnonzero(ready & ~adopted).tolist()
+    T = T.tolist()
+    shuffle(initial)
+    frontier = deque(initial)
+
+    while frontier:
+        a = frontier.popleft()
+        adopted[a] = True
+        nbrs = indices[indptr[a]:indptr[a+1]]
+        if influence is not None:
+            influence[a] = nbrs[adopted[nbrs]].tolist()
+        counts[nbrs] += 1
+        for b in nbrs.tolist():
+            if not queued[b] and counts[b] >= T[b]:
+                queued[b] = True
+                frontier.append(b)
+
+    return adopted
+
+
+def closureCascade(topo, I, A, adopted, influence=None, shuffle=None):
+    """Compute the final adopters with a single traversal from the initial
+    adopters.
+
+    The adoption rule is monotone in the number of adopted neighbors and
+    adoption is never reversed, so the final set of adopters does not depend
+    on the order in which agents are activated. This function skips the
+    random activation order altogether (`shuffle` is accepted for signature
+    compatibility and not called, so no random numbers are consumed). Only the
+    influence lists, if recorded, reflect the traversal order.
+
+    The other parameters and the return value are the same as `sweepCascade`.
+    """
+    indptr, indices = topo.indptr, topo.indices
+    counts = neighborSums(topo, adopted)
+    T = adoptionThresholds(I, A, topo.n, topo.degree)
+
+    ready = counts >= T
+    queued = adopted | ready | (T == NEVER_ADOPT)
+    stack = np.flatnonzero(ready & ~adopted).tolist()
+    T = T.tolist()
+
+    while stack:
+        a = stack.pop()
+        adopted[a] = True
+        nbrs = indices[indptr[a]:indptr[a+1]]
+        if influence is not None:
+            influence[a] = nbrs[adopted[nbrs]].tolist()
+        counts[nbrs] += 1
+        for b in nbrs.tolist():
+            if not queued[b] and counts[b] >= T[b]:
+                queued[b] = True
+                stack.append(b)
+
+    return adopted
+
+
+def referenceCascade(topo, I, A, adopted, influence=None, shuffle=_shuffle):
+    """Run the cascade exactly as the original simulation loop
+    (`disim.runTrialNx`): repeated sweeps over the non-adopters in random
+    order, recounting the adopted neighbors of each agent and evaluating
+    the floating point rule *B_i,k* itself.
+
+    It does not use `adoptionThresholds`, so it is the reference the
+    engines are verified against (see `verifyCascade`). The parameters and
+    return value are the same as `sweepCascade`.
+    """
+    indptr, indices = topo.indptr, topo.indices
+    N = topo.n
+
+    while True:
+        agents = np.flatnonzero(~adopted).tolist()
+        shuffle(agents)
+        madeChange = False
+        for a in agents:
+            nbrs = indices[indptr[a]:indptr[a+1]]
+            adoptedNeighbors = nbrs[adopted[nbrs]]
+            Bik = I[a] + (A[a] * (len(adoptedNeighbors)/N))
+            if Bik > 0:
+                adopted[a] = True
+                if influence is not None:
+                    influence[a] = adoptedNeighbors.tolist()
+                madeChange = True
+        if not madeChange:
+            break
+
+    return adopted
+
+
+def verifyCascade(topo, I, A, initialAdopted, adopted, seed=None):
+    """Check a cascade result against the original simulation loop
+    (`referenceCascade`), run from the same initial adopters.
+
+    The reference evaluates the adoption rule without the integer
+    thresholds of the engines, so a wrong threshold is detected. It
+    shuffles with its own random number generator, so it does not disturb
+    the random stream of the simulation.
+
+    :param numpy.Array initialAdopted: The adoption state before the cascade.
+    :param numpy.Array adopted: The adoption state computed by the cascade
+                                under test.
+    :param seed: Seed for the shuffles of the reference run.
+    :raises AssertionError: If the sets of adopters differ.
+    """
+    expected = referenceCascade(topo, I, A, initialAdopted.copy(),
+                                shuffle=Random(seed).shuffle)
+    if not (expected == adopted).all():
+        raise AssertionError("Cascade adopters differ from the original "
+                             "simulation loop at nodes %s" % 
+                             [topo.nodes[i] for i in 
+                              np.flatnonzero(expected != adopted)])
+
+
+def batchCascade(topo, I, A, adopted):
+    """Run the cascades of many trials on the same topology at once.
+
+    The state of the trials is held in *trials x n* arrays (one row per
+    trial). Adoption proceeds in synchronous rounds: in each round every
+    non-adopter whose adopted-neighbor count has reached its threshold adopts,
+    and the counts of all trials are updated with one sparse matrix product
+    of the new adopters against the adjacency matrix. The final adopters are
+    the same as with the other cascades (adoption is monotone); only the
+    activation order differs.
+
+    :param CSRTopology topo: The network topology shared by all trials.
+    :param numpy.Array I: *trials x n* assessed profits.
+    :param numpy.Array A: *trials x n* ambiguities.
+    :param numpy.Array adopted: *trials x n* boolean adoption state, updated
+                                in place. The seed adopters must be set.
+    :returns: *trials x n* integer array of the round in which each node 
+              adopted (0 for the initial adopters, -1 for non-adopters). See
+              `influenceFromRounds`.
+    """
+    T = adoptionThresholds(I, A, topo.n, topo.degree)
+    adj = topo.adjacency
+    counts = adj.dot(adopted.T.astype(np.intp)).T
+    rounds = np.where(adopted, 0, -1)
+
+    r = 0
+    while True:
+        new = ~adopted & (counts >= T)
+        if not new.any():
+            break
+        r += 1
+        adopted |= new
+        rounds[new] = r
+        counts += adj.dot(new.T.astype(np.intp)).T
+
+    return rounds
+
+
+def influenceFromRounds(topo, rounds):
+    """The influence lists of a trial run by `batchCascade`: the neighbors of
+    each adopter that had adopted in an earlier round.
+
+    :param numpy.Array rounds: The adoption rounds of a single trial (one row
+                               of the `batchCascade` result).
+    :returns: A list with the influencing neighbor indices of each node.
+    """
+    influence = [[] for i in xrange(topo.n)]
+    for a in np.flatnonzero(rounds > 0):
+        nbrs = topo.neighbors(a)
+        nr = rounds[nbrs]
+        influence[a] = nbrs[(nr >= 0) & (nr < rounds[a])].tolist()
+    return influence
+
+
+def criticalAmbiguities(topo, I, seedNode):
+    """Compute, for every node, the critical ambiguity above which it is an
+    adopter at the end of the cascade started from `seedNode`.
+
+    With the profits and seed of a trial fixed, the final adopters only grow
+    with the ambiguity *A* (for *A* >= 0): node *i* adopts once *k* of its
+    neighbors have, with ``A > -I_i*N/k``. Its critical ambiguity is
+    therefore::
+
+        c_i = min_k max(c_(k), -I_i*N/k)
+
+    where *c_(k)* is the *k*-th smallest critical ambiguity among its
+    neighbors. The values are settled in increasing order with a priority
+    queue, like the distances of Dijkstra's algorithm, so the adopters of the
+    trial at every ambiguity level ``A >= 0`` come out of one traversal: they
+    are the nodes with ``A > c_i``.
+
+    :param CSRTopology topo: The network topology.
+    :param numpy.Array I: The assessed profit of each node.
+    :param int seedNode: Index of the seed adopter.
+    :returns: A float array of the critical ambiguities, ``-inf`` for the 
+              seed and the nodes with a positive profit (adopters at any 
+              ambiguity), ``inf`` for the nodes that never adopt.
+    """
+    indptr, indices = topo.indptr, topo.indices
+    N = topo.n
+    I = np.asarray(I, dtype=float)
+    critical = np.repeat(np.inf, N)
+    critical[I > 0] = -np.inf
+    critical[seedNode] = -np.inf
+    # the number of settled neighbors of each node
+    settledNeighbors = np.zeros(N, dtype=np.intp)
+    settled = np.zeros(N, dtype=bool)
+    heap = [(-np.inf, a) for a in np.flatnonzero(critical == -np.inf)]
+    
+    while heap:
+        c, a = heappop(heap)
+        if settled[a]:
+            continue
+        settled[a] = True
+        for b in indices[indptr[a]:indptr[a+1]].tolist():
+            if settled[b]:
+                continue
+            # `a` is the k-th neighbor of b to settle, so c is c_(k) of b
+            settledNeighbors[b] += 1
+            cb = max(c, -I[b]*N/settledNeighbors[b])
+            if cb < critical[b]:
+                critical[b] = cb
+                heappush(heap, (cb, b))
+
+    return critical
+
+
+def influenceFromCritical(topo, critical, Ai):
+    """The influence lists of a trial solved by `criticalAmbiguities` at the
+    ambiguity level `Ai`: the adopted neighbors of each adopter with a lower
+    critical ambiguity.
+
+    :returns: A list with the influencing neighbor indices of each node.
+    """
+    influence = [[] for i in xrange(topo.n)]
+    for a in np.flatnonzero(critical < Ai):
+        nbrs = topo.neighbors(a)
+        influence[a] = nbrs[critical[nbrs] < critical[a]].tolist()
+    return influence
+
+
+def countWeaknessesAndPressurePoints(topo, I, A, proportion=1/2,
+                                     targetSegment='periphery'):
+    """Array version of `graphsearch.findWeaknessesAndPressurePoints` that
+    only counts the boundary weaknesses and pressure points.
+
+    `I` and `A` may also be *trials x n* arrays, in which case the counts of
+    every trial are returned as arrays.
+
+    :returns: A tuple (# boundary weaknesses, # boundary pressure points).
+    """
+    weak, ppoint = boundaryMasks(topo.adjacency, 
+                                 topo.segmentMask(targetSegment), I, A,
+                                 proportion)
+    numWeak = weak.sum(axis=-1)
+    numPPoints = ppoint.sum(axis=-1)
+    if np.ndim(I) == 1:
+        return (int(numWeak), int(numPPoints))
+    return (numWeak, numPPoints)
+
+
+def applyTrialState(G, topo, I, A, adopted, influence=None):
+    """Write the state of an array-backed trial onto the networkx graph `G`
+    (node attributes 'I', 'A', 'adopted' and 'influence') so it can be
+    searched and drawn like a graph produced by the original simulation loop.
+    The 'weak' and 'ppoint' attributes of a previous trial are cleared.
+
+    :returns: The graph `G`.
+    """
+    nodes = topo.nodes
+    for i,node in enumerate(nodes):
+        attrs = G.node[node]
+        attrs['I'] = float(I[i])
+        attrs['A'] = A[i].item()
+        attrs['adopted'] = bool(adopted[i])
+        attrs['influence'] = [nodes[j] for j in influence[i]] \
+                             if influence is not None else []
+        attrs['weak'] = False
+        attrs['ppoint'] = False
+    markGraphChanged(G)
+    return G
+
+
+def graphTrialState(G, topo):
+    """The inverse of `applyTrialState`: the state of the trial held in the
+    node attributes of `G`, indexed like `topo.nodes`.
+
+    :returns: A tuple (I, A, adopted, influence) of the arrays of the 
+              assessed profits, ambiguities and adoption flags and the 
+              influencing neighbor indices of each node.
+    """
+    attrs = [G.node[node] for node in topo.nodes]
+    I = np.array([a['I'] for a in attrs], dtype=np.float)
+    A = np.array([a['A'] for a in attrs])
+    adopted = np.array([a['adopted'] for a in attrs], dtype=bool)
+    influence = [[topo.index[nb] for nb in a['influence']] for a in attrs]
+    return I, A, adopted, influence
+
+
+class IncrementalCascade(object):
+    """The final adopters of a trial, maintained while ties are inserted into
+    the network one at a time.
+
+    Adding a tie never removes adopters: it can only raise the adopted
+    neighbor count of one endpoint. `addTie` therefore only resumes the
+    cascade from that endpoint when the new count reaches its threshold,
+    instead of re-running the cascade from the seed. Over a whole sweep of
+    densities the work is about that of one cascade on the densest network.
+
+    The boundary weakness and pressure point counts (see
+    `countWeaknessesAndPressurePoints`) are maintained alongside.
+    """
+
+    def __init__(self, topo, I, A, seedNode, proportion=1/2,
+                 targetSegment='periphery'):
+        """
+        :param CSRTopology topo: The network before any tie is inserted. Only
+                                 its node indexing and segments are kept.
+        :param numpy.Array I: The assessed profit of each node.
+        :param numpy.Array A: The ambiguity of each node.
+        :param int seedNode: Index of the seed adopter.
+        """
+        self.n = topo.n
+        self.isCore = topo.isCore
+        self.neighbors = [topo.neighbors(i).tolist() for i in xrange(topo.n)]
+        # the degree may still grow, so NEVER_ADOPT only marks nodes that
+        # cannot adopt at any degree
+        self.T = adoptionThresholds(I, A, topo.n).tolist()
+        self.adopted = np.zeros(topo.n, dtype=bool)
+        self.adopted[seedNode] = True
+        self.counts = neighborSums(topo, self.adopted).tolist()
+        self.numCoreAdopters = int(self.isCore[seedNode])
+        self.numPeriphAdopters = 1 - self.numCoreAdopters
+
+        self.target = topo.segmentMask(targetSegment)
+        self.crossDeg = topo.crossSegmentDegree(targetSegment).tolist()
+        self.ppointDegree = (topo.n - np.count_nonzero(self.target)) * \
+                            proportion
+        self.numWeaknesses = 0
+        self.numPPoints = 0
+        for a in np.flatnonzero(self.target):
+            self._updateBoundary(a, 1)
+
+        self._propagate([a for a in xrange(topo.n) 
+                         if not self.adopted[a] and 
+                         self.counts[a] >= self.T[a]])
+
+    def _updateBoundary(self, a, sign):
+        """Add (`sign` 1) or remove (-1) target node `a` from the boundary
+        counts."""
+        if self.crossDeg[a] > 0 and self.T[a] <= 1:
+            self.numWeaknesses += sign
+        if self.crossDeg[a] >= self.ppointDegree:
+            self.numPPoints += sign
+
+    def _propagate(self, stack):
+        "Adopt the nodes of `stack` and continue the cascade from them."
+        adopted, counts, T = self.adopted, self.counts, self.T
+        for a in stack:
+            adopted[a] = True
+        while stack:
+            a = stack.pop()
+            if self.isCore[a]:
+                self.numCoreAdopters += 1
+            else:
+                self.numPeriphAdopters += 1
+            for b in self.neighbors[a]:
+                counts[b] += 1
+                if not adopted[b] and counts[b] >= T[b]:
+                    adopted[b] = True
+                    stack.append(b)
+
+    def addTie(self, a, b):
+        """Insert the tie between the node indices `a` and `b` and update the
+        adopters and boundary counts."""
+        self.neighbors[a].append(b)
+        self.neighbors[b].append(a)
+
+        if self.target[a] != self.target[b]:
+            for c in (a, b):
+                if self.target[c]:
+                    self._updateBoundary(c, -1)
+                    self.crossDeg[c] += 1
+                    self._updateBoundary(c, 1)
+
+        if self.adopted[a] != self.adopted[b]:
+            c = b if self.adopted[a] else a
+            self.counts[c] += 1
+            if self.counts[c] >= self.T[c]:
+                self._propagate([c])
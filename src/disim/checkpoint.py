@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Checkpoints of simulation runs.
+
+A checkpoint records, at a case boundary, the number of cases completed,
+the size of each output log once it is flushed to disk, and the in-memory
+state of the run (the case log and the accumulated regression moments).
+The checkpoint file is replaced atomically (written to a temporary file
+and renamed over it), so it always describes a complete case boundary, and
+the logs are synced before it is written, so they hold at least what it
+records. A resumed run truncates the logs to the recorded sizes, which
+discards the output of the cases simulated after the checkpoint, and
+continues with the next case.
+
+The random draws of a case only depend on the base seed of the run and the
+case (see `rng`), so no random generator state is saved: the resumed cases
+are drawn as in an uninterrupted run.
+
+:Author: Christopher Kirkos
+
+Implementation
+--------------
+"""
+
+import os
+import cPickle as pickle
+
+def syncFile(fp):
+    """Flushes the file object `fp` to disk.
+
+    :returns: The position of `fp`, its size for a file written in order.
+    """
+    fp.flush()
+    os.fsync(fp.fileno())
+    return fp.tell()
+
+def reopenFile(path, size):
+    """Opens the file `path` to continue writing it at `size`, discarding
+    what was written after.
+
+    :returns: The file object, open for writing at `size`.
+    """
+    fp = open(path, "r+b")
+    fp.truncate(size)
+    fp.seek(size)
+    return fp
+
+def atomicWrite(path, data):
+    """Writes `data` (str) to the file `path`, which is either left
+    unchanged or replaced by the complete new content."""
+    tmpPath = path + ".tmp"
+    fp = open(tmpPath, "wb")
+    fp.write(data)
+    syncFile(fp)
+    fp.close()
+    os.rename(tmpPath, path)
+
+def saveCheckpoint(path, state):
+    "Replaces the checkpoint `path` by the picklable `state` atomically."
+    atomicWrite(path, pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+
+def loadCheckpoint(path):
+    """The state of the checkpoint `path` (see `saveCheckpoint`), or None if
+    there is no checkpoint."""
+    if not os.path.exists(path):
+        return None
+    fp = open(path, "rb")
+    state = pickle.load(fp)
+    fp.close()
+    return state
+
+def removeCheckpoint(path):
+    "Removes the checkpoint `path`, if any."
+    if os.path.exists(path):
+        os.remove(path)
@@ -16,42 +16,103 @@
 
 """
 A clone of Robert Axtell's Data.java.
+
+The mean and variance are updated with Welford's method, which does not lose
+precision over many samples, and the statistics of two `Data` objects merge
+into those of all their samples (see `Data.merge`), so partial statistics
+can be combined without the samples.
 """
 
 from __future__ import division
-import sys, math
+import math
+import numpy as np
 
 class Data(object):
-    """An object that maintains running mean, variance/standard deviation, min, 
-    max, and number of samples.
+    """An object that maintains running mean, variance/standard deviation, min,
+    max, and number of samples, and optionally a histogram of the samples.
     """
-    def __init__(self):
+    def __init__(self, bins=None):
+        """
+        :param bins: The increasing edges of the bins of the histogram, or
+                     None to keep no histogram. Samples below the first edge
+                     or at or above the last one are counted in two more
+                     bins, so the memory does not depend on the samples.
+        """
         self.N = 0
-        self.min = sys.float_info.max
-        self.max = sys.float_info.min
-        self.sum = 0.0
-        self.sum2 = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.mean = 0.0
+        # the sum of the squared deviations from the mean
+        self.M2 = 0.0
+        self.bins = None if bins is None else np.asarray(bins,
+                                                         dtype=np.float)
+        self.counts = None if bins is None else \
+                      np.zeros(len(self.bins)+1, dtype=np.int64)
 
     def addDatum(self, val):
         "Add a datum, updating the running statistics."
         self.N = self.N + 1
         if val < self.min: self.min = val
         if val > self.max: self.max = val
-        self.sum = self.sum + val
-        self.sum2 = self.sum2 + (val**2)
+        delta = val - self.mean
+        self.mean = self.mean + delta/self.N
+        self.M2 = self.M2 + delta*(val - self.mean)
+        if self.counts is not None:
+            self.counts[np.searchsorted(self.bins, val, side="right")] += 1
+
+    def addData(self, values):
+        "Add an array of data, updating the running statistics."
+        values = np.asarray(values, dtype=np.float).ravel()
+        if len(values) == 0:
+            return
+        batch = Data()
+        batch.N = len(values)
+        batch.min, batch.max = values.min(), values.max()
+        batch.mean = values.mean()
+        batch.M2 = np.dot(values - batch.mean, values - batch.mean)
+        if self.counts is not None:
+            batch.bins = self.bins
+            batch.counts = np.bincount(np.searchsorted(self.bins, values,
+                                                       side="right"),
+                                       minlength=len(self.counts))
+        self.merge(batch)
+
+    def merge(self, other):
+        """Add the samples of the `Data` object `other`, from its statistics
+        (Chan et al.'s parallel update).
+
+        :returns: self
+        """
+        if other.N == 0:
+            return self
+        if self.counts is not None:
+            assert(other.counts is not None and \
+                   np.array_equal(self.bins, other.bins))
+            self.counts = self.counts + other.counts
+        N = self.N + other.N
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta*(other.N/N)
+        self.M2 = self.M2 + other.M2 + (delta**2)*(self.N*other.N/N)
+        self.N = N
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
 
     @property
     def average(self):
         "The average of the data (accessed as a property)."
-        return self.sum/self.N if self.N > 0 else 0.0
+        return self.mean if self.N > 0 else 0.0
+
+    @property
+    def sum(self):
+        "The sum of the data (accessed as a property)."
+        return self.mean*self.N
 
     @property
     def variance(self):
         "The variance of the data (accessed as a property)."
         if self.N > 1:
-            avg = self.average
-            arg = self.sum2 - (self.N * (avg**2))
-            return arg / (self.N - 1)
+            return self.M2 / (self.N - 1)
         else:
             return 0.0
 
@@ -60,3 +121,22 @@ class Data(object):
         "The standard deviation of the data (accessed as a property)."
         return math.sqrt(self.variance)
 
+    def quantile(self, q):
+        """An estimate of the `q` quantile (0 to 1) of the data, interpolated
+        within the bins of the histogram.
+
+        The bins below the first edge and above the last one extend to the
+        minimum and maximum of the data.
+        """
+        assert(self.counts is not None and 0 <= q <= 1)
+        if self.N == 0:
+            return float("nan")
+        edges = np.concatenate([[min(self.min, self.bins[0])], self.bins,
+                                [max(self.max, self.bins[-1])]])
+        cumulative = np.cumsum(self.counts)
+        rank = q*self.N
+        i = min(np.searchsorted(cumulative, rank), len(self.counts)-1)
+        below = cumulative[i] - self.counts[i]
+        fraction = (rank - below)/self.counts[i] if self.counts[i] else 0
+        value = edges[i] + fraction*(edges[i+1] - edges[i])
+        return min(max(value, self.min), self.max)
@@ -31,17 +31,41 @@ Implementation
 
 from __future__ import division
 
-from graphgen import generateARCorePeriph, drawAdoptionNetworkGV
+from graphgen import generateARCorePeriph, drawDotFile, drawDot,\
+					setDefaultNodeAttrs, NestedCorePeriphSweep,\
+					periphTieFromIndex
 from plotting import createCoreDiffusionPlot, createPeripheralDiffusionPlot
-from stats import possibleTies, runOLSRegression1997
+from stats import possibleTies, RegressionSession, TrialMoments
+from triallog import openTrialLog, loadTrialLog, isBinaryTrialLog, \
+					BINARY_EXT
 from graphsearch import findWeaknessesAndPressurePoints, GRAPH_FILTERS,\
-						clearWPPCache
+						markGraphChanged, countPressurePoints,\
+						pressurePointCounts, boundaryMasks
+from cascade import CSRTopology, sweepCascade, frontierCascade,\
+					closureCascade, verifyCascade, batchCascade,\
+					influenceFromRounds, TrialState,\
+					countWeaknessesAndPressurePoints, criticalAmbiguities,\
+					influenceFromCritical, IncrementalCascade,\
+					graphTrialState
+from dotwriter import adoptionNetworkDot, writeDot, DotArchiveWriter, \
+					DotArchive, isDotArchive, DotDocuments
+from render import RenderQueue
+from checkpoint import saveCheckpoint, loadCheckpoint, removeCheckpoint, \
+					syncFile, reopenFile
+from rng import RandomStreams, deriveSeed, drawTrialProfits, \
+				activationShuffle, verifiedTrials
 
+import random
 from random import shuffle, choice, gauss
-from itertools import product
-from os.path import exists, join as pathjoin
+from itertools import product, imap, chain, islice
+from functools import partial
+from multiprocessing import Pool
+from os.path import exists, join as pathjoin, basename, splitext
 from os import makedirs
+from time import time
 import csv
+import json
+import numpy as np
 from data import Data
 from collections import defaultdict
 
@@ -51,10 +75,659 @@ from collections import defaultdict
 #     pressure
 #  3. Model based on learning instead of fads
 
+# Available simulation engines for `run1997ThresholdModel`
+ENGINES = ("nx", "csr", "frontier", "closure", "batch", "parametric",
+		   "incremental")
+
+# The file of the parameters of a simulation run, see `writeRunManifest`
+RUN_MANIFEST = "simulationRun.json"
+
+# The checkpoint file of a simulation run, see `saveRunCheckpoint`
+CHECKPOINT = "simulationRun.checkpoint"
+
+# The cascade function used by each array-backed engine
+CASCADES = {"csr":sweepCascade, "frontier":frontierCascade, 
+			"closure":closureCascade}
+
+# The engines which draw a random activation order of the agents
+SHUFFLING_ENGINES = ("nx", "csr", "frontier")
+
+# "Assessed profits were drawn randomly from a normal distribution
+# with mean -1.0 and standard deviation 1.0" ([AR1997]_ p. 298)
+PROFIT_MU, PROFIT_SIGMA = -1.0, 1.0
+
+def runTrialNx(G, Ai, trickleDirection, draws=None, shuffle=shuffle):
+	"""Runs a single trial of the threshold model on the networkx graph `G`.
+	
+	The graph of a case is reused by all of its trials: the per-trial node
+	attributes are reset at the start of each trial instead of simulating on a
+	copy of the graph. The topology and the 'segments' attributes are left 
+	untouched.
+	
+	:param networkx.Graph G: The generated network for the case.
+	:param Ai: The ambiguity level (weight of bandwagon pressure).
+	:param str trickleDirection: "down" seeds a core node, "up" a peripheral
+								 node.
+	:param tuple draws: The profits and the index of the seed node of this 
+						trial, indexed like `G.nodes()` (see `drawTrials`). 
+						If None, they are drawn from the `random` module.
+	:param function shuffle: Shuffles the agents in place before each sweep,
+							 `random.shuffle` by default (see 
+							 `rng.activationShuffle`).
+	:returns: The graph `G`, with the node attributes 'I', 'A', 'adopted' and
+			  'influence' populated for this trial.
+	"""
+	# clear the results ('adopted', 'influence', 'weak', 'ppoint') of the
+	# previous trial
+	setDefaultNodeAttrs(G)
+	
+	# set the assessed profit (I_i) for each node from normal 
+	# distribution, and the weight of bandwagon pressure (A_i).
+	for i,a in enumerate(G.nodes()):
+		G.node[a]['I'] = gauss(PROFIT_MU, PROFIT_SIGMA) if draws is None \
+						 else draws[0][i]
+		G.node[a]['A'] = Ai
+	markGraphChanged(G)
+	
+	if draws is None:
+		coreNodes = [a for a in G.nodes() if 'core' in G.node[a]['segments']]
+		periphNodes = [a for a in G.nodes() if 'core' not in \
+											G.node[a]['segments']]
+		
+		# select a random core node as an adopter for trickle-down 
+		# diffusion or a random peripheral node for trickle-up diffusion
+		seedNode = choice(coreNodes) if trickleDirection == "down" \
+									 else choice(periphNodes)
+	else:
+		seedNode = G.nodes()[draws[1]]
+	G.node[seedNode]['adopted'] = True
+	
+	# Start simulation
+	while True:
+		# Only evaluate agents that have not yet adopted
+		agents = [n for n in G.nodes() if not G.node[n]['adopted']]
+		
+		# TODO: Option for simultaneous updating vs incremental.
+		# Make a temp copy of the graph here, so that we have a
+		# snapshot of the last round. Then, when complete, replace the 
+		# simulation graph with the newly updated graph.
+		# This would simulate simultaneous updating, instead of  
+		# incremental.
+		
+		# Uniform random agent activation
+		# TODO: Find out how activation occurred in the AR1997 model.
+		shuffle(agents)
+		madeChange = False
+		for a in agents:
+			# will agent a adopt?
+			# compute B_i,k = I_i + (A_i * P_k-1)
+			neighbors = G.neighbors(a)
+			adoptedNeighbors = [n for n in neighbors \
+								if G.node[n]['adopted'] == True]
+			# In the 1997 fad model, Pk1 is the number of neighbor  
+			# adopters divided by the total number of agents in the  
+			# network (potential adopters)
+			Pk1 = len(adoptedNeighbors)/G.number_of_nodes()
+			Bik = G.node[a]['I'] + (G.node[a]['A'] * Pk1)
+			if Bik > 0:
+				# Adopt if Bik was assessed > 0
+				G.node[a]['adopted'] = True
+				G.node[a]['influence'] = adoptedNeighbors
+				madeChange = True
+		
+		# stop after no more agents can be influenced by bandwagon
+		if not madeChange: 
+			break
+	
+	return G
+
+def runTrialCSR(topo, Ai, trickleDirection, recordInfluence=False,
+				cascade=sweepCascade, verify=False, state=None, draws=None,
+				shuffle=shuffle):
+	"""Array-backed equivalent of `runTrialNx`. 
+	
+	With the default `cascade`, the random number stream is consumed in the 
+	same order as `runTrialNx` (profits in node order, seed node, then one 
+	shuffle per sweep), so with the same random state both produce the same
+	trial.
+	
+	:param cascade.CSRTopology topo: The case topology.
+	:param bool recordInfluence: Whether to record the influence lists (only
+								 needed to draw the network).
+	:param function cascade: The cascade function to run (`sweepCascade`,
+							 `frontierCascade` or `closureCascade`).
+	:param bool verify: Check the adopters against a run of the original
+						simulation loop from the same initial state (see
+						`cascade.verifyCascade`).
+	:param cascade.TrialState state: The state buffers of the case, reset 
+									 and reused by this trial. If `None`,
+									 new buffers are allocated.
+	:param tuple draws: The profits and the index of the seed node of this 
+						trial (see `drawTrials`). If None, they are drawn 
+						from the `random` module.
+	:param function shuffle: The activation order shuffle (see 
+							 `runTrialNx`).
+	:returns: A tuple (I, A, adopted, influence) of per-node arrays, indexed
+			  like `topo.nodes`. `influence` is None unless recorded. These 
+			  are the buffers of `state`, overwritten by the next trial.
+	"""
+	if state is None:
+		state = TrialState(topo, Ai, recordInfluence)
+	
+	if draws is None:
+		I = [gauss(PROFIT_MU, PROFIT_SIGMA) for a in xrange(topo.n)]
+		seedCandidates = np.flatnonzero(topo.isCore 
+										if trickleDirection == "down"
+										else ~topo.isCore).tolist()
+		draws = I, choice(seedCandidates)
+	state.reset(*draws)
+	initialAdopted = state.adopted.copy() if verify else None
+	
+	cascade(topo, state.I, state.A, state.adopted, state.influence, 
+			shuffle=shuffle)
+	
+	if verify:
+		verifyCascade(topo, state.I, state.A, initialAdopted, state.adopted)
+	
+	return state.I, state.A, state.adopted, state.influence
+
+def drawTrials(topo, trickleDirection, trials, streams=None):
+	"""Draws the profits and seed nodes of `trials` trials in bulk from 
+	NumPy's random number generator.
+	
+	:param cascade.CSRTopology topo: The case topology.
+	:param str trickleDirection: "down" seeds a core node, "up" a peripheral
+								 node.
+	:param int trials: The number of trials.
+	:param rng.RandomStreams streams: The streams of the case. The draws of 
+									  each trial come from its own stream 
+									  (see `rng.drawTrialProfits`), so they
+									  do not depend on the number of 
+									  trials drawn together. If None, they
+									  are drawn from the global 
+									  `numpy.random` state.
+	:returns: A tuple (I, seeds): the *trials x n* profits, indexed like 
+			  `topo.nodes`, and the index of each trial's seed node.
+	"""
+	seedCandidates = np.flatnonzero(topo.isCore if trickleDirection == "down"
+									else ~topo.isCore)
+	if streams is not None:
+		return drawTrialProfits(streams, trials, topo.n, seedCandidates,
+								PROFIT_MU, PROFIT_SIGMA)
+	I = np.random.normal(PROFIT_MU, PROFIT_SIGMA, (trials, topo.n))
+	seeds = seedCandidates[np.random.randint(len(seedCandidates), 
+											 size=trials)]
+	return I, seeds
+
+def runTrialsBatch(topo, Ai, trickleDirection, trials, draws=None):
+	"""Runs all `trials` of a case at once with `cascade.batchCascade`.
+	
+	:param cascade.CSRTopology topo: The case topology.
+	:param Ai: The ambiguity level (weight of bandwagon pressure).
+	:param str trickleDirection: "down" seeds a core node, "up" a peripheral
+								 node.
+	:param int trials: The number of trials.
+	:param tuple draws: The profits and seed nodes of the trials, as 
+						returned by `drawTrials`. If None, they are drawn 
+						with `drawTrials`.
+	:returns: A tuple (I, A, adopted, rounds) of *trials x n* arrays, indexed 
+			  like `topo.nodes` (see `cascade.batchCascade` for `rounds`).
+	"""
+	if draws is None:
+		draws = drawTrials(topo, trickleDirection, trials)
+	I, seeds = draws
+	A = np.repeat(Ai, trials*topo.n).reshape(trials, topo.n)
+	adopted = np.zeros((trials, topo.n), dtype=bool)
+	adopted[np.arange(trials), seeds] = True
+	
+	rounds = batchCascade(topo, I, A, adopted)
+	
+	return I, A, adopted, rounds
+
+def runTrialsParametric(topo, trickleDirection, trials, draws=None):
+	"""Solves all `trials` of a case for every ambiguity level at once with
+	`cascade.criticalAmbiguities`.
+	
+	:param cascade.CSRTopology topo: The case topology.
+	:param str trickleDirection: "down" seeds a core node, "up" a peripheral
+								 node.
+	:param int trials: The number of trials.
+	:param tuple draws: The profits and seed nodes of the trials, as 
+						returned by `drawTrials`. If None, they are drawn 
+						with `drawTrials`.
+	:returns: A tuple (I, seeds, critical) of the draws and the *trials x n*
+			  critical ambiguities. The adopters of trial *t* at the 
+			  ambiguity level *Ai* are the nodes with ``critical[t] < Ai``.
+	"""
+	if draws is None:
+		draws = drawTrials(topo, trickleDirection, trials)
+	I, seeds = draws
+	critical = np.array([criticalAmbiguities(topo, I[t], seeds[t]) 
+						 for t in xrange(trials)])
+	return I, seeds, critical
+
+# The nested sweeps of the current process, see `nestedSweepGraph`
+NESTED_SWEEPS = {}
+
+def nestedSweepGraph(numCoreNodes, numPeriphNodes, pties, seed):
+	"""The network with `pties` periphery ties of the nested sweep seeded 
+	with `seed` (see `graphgen.NestedCorePeriphSweep`).
+	
+	The sweeps are kept per process, so consecutive cases of a sweep grow 
+	the same network, whichever process simulates them.
+	"""
+	key = (numCoreNodes, numPeriphNodes, seed)
+	if key not in NESTED_SWEEPS:
+		NESTED_SWEEPS[key] = NestedCorePeriphSweep(numCoreNodes, 
+												   numPeriphNodes, seed=seed)
+	return NESTED_SWEEPS[key].graph(pties)
+
+def trialFileName(numberOfNodes, pties, Ai, trial):
+	"""The name of the DOT and PNG files of a trial, without extension, and
+	of its document in a DOT archive."""
+	return "n%d-PTies%d-Ai%g-Trial%d" % (numberOfNodes, pties, Ai, trial)
+
+def caseSeed(seed, *key):
+	"""Derives the random seed of a case from the base `seed` of a run and
+	the `key` identifying the case, eg. (trickle direction, pties, Ai).
+	
+	Every case is seeded independently, so its results do not depend on 
+	which cases were simulated before it or in which process.
+	"""
+	return deriveSeed(seed, *key)
+
+def runCase(case, trickleDirection="down", numberOfNodes=31, trials=100,
+			cpRatio=1/3, outFilePath=".", dots="none", pngs="none", 
+			engine="nx", verifyTrials=0, seed=0, legacySampling=False,
+			nestedSweep=False, pressurePointProportions=(), shared=None,
+			renderTrials=None, renderQueue=None, dotArchive=None):
+	"""Simulates all trials of one case of `run1997ThresholdModel`.
+	
+	The network, and the profits, seed node and activation order of each 
+	trial, are drawn from their own random number streams, derived from 
+	the base `seed` and the case and trial (see `rng.RandomStreams`), so 
+	they do not depend on how the cases are scheduled. This function runs 
+	in the worker processes of a parallel simulation, so it only returns 
+	the results; the caller writes them to the logs.
+	
+	:param tuple case: The case, a tuple (# periphery ties, Ai).
+	:param int seed: The base seed of the simulation run.
+	:param tuple shared: The network, its `cascade.CSRTopology`, the trial
+						 draws (see `drawTrials`) and, for the "parametric" 
+						 engine, the critical ambiguities of the trials 
+						 shared by the cases of a block of common random 
+						 numbers (see `runCaseBlock`). If None, the case 
+						 generates its own network and draws.
+	:param renderTrials: The numbers of the trials whose networks are 
+						 written (see `dots` and `pngs`), or None for all 
+						 trials.
+	:param render.RenderQueue renderQueue: The queue drawing the networks 
+										   in the background, or None to 
+										   draw them in the trial loop.
+	:param dotwriter.DotArchiveWriter dotArchive: The archive receiving the
+												  DOT documents, or the 
+												  `dotwriter.DotDocuments` 
+												  collecting them, or None
+												  to write a file per 
+												  trial.
+	
+	The other parameters are those of `run1997ThresholdModel`.
+	
+	:returns: A tuple (trial log rows, case log row). The case log row is a 
+			  tuple (Ai, avg peripheral density, avg peripheral diffusion, 
+			  avg core diffusion).
+	"""
+	pties, Ai = case
+	numCoreNodes = int(round(numberOfNodes*cpRatio))
+	numPeriphNodes = numberOfNodes - numCoreNodes
+	totalPossiblePeriphTies = possibleTies(numberOfNodes, numCoreNodes)[2]
+	targetSegment = 'periphery' if trickleDirection=="down" else "core"
+	
+	dotFilter = GRAPH_FILTERS[dots](targetSegment=targetSegment)
+	pngFilter = GRAPH_FILTERS[pngs](targetSegment=targetSegment)
+	
+	streams = RandomStreams(seed, trickleDirection, pties, Ai)
+	
+	trialRows = []
+	
+	# Generate a new network for each case, or take it from the nested sweep
+	# of this Ai. The topology is shared by all trials, only the per-trial 
+	# state is reset between them.
+	if shared is not None:
+		Gorig, topo, draws, critical = shared
+	elif nestedSweep:
+		Gorig = nestedSweepGraph(numCoreNodes, numPeriphNodes, pties,
+								 caseSeed(seed, trickleDirection, Ai))
+	else:
+		Gorig = generateARCorePeriph(numCoreNodes, numPeriphNodes, pties,
+									 legacySampling=legacySampling,
+									 rng=streams.spawn("network").python())
+	if shared is None:
+		topo = CSRTopology(Gorig)
+		draws = drawTrials(topo, trickleDirection, trials, streams)
+		critical = None
+	if engine == "parametric" and critical is None:
+		pI, pSeeds, critical = runTrialsParametric(topo, trickleDirection,
+												   trials, draws)
+		draws = pI, pSeeds
+	# the pressure points only depend on the topology of the case
+	extraPPoints = countPressurePoints(Gorig, pressurePointProportions,
+									   targetSegment) \
+				   if pressurePointProportions else []
+	recordInfluence = pngs != "none" or dots != "none"
+	targetMask = topo.segmentMask(targetSegment)
+	if engine != "nx":
+		state = TrialState(topo, Ai, recordInfluence)
+	if engine == "batch":
+		bI, bA, bAdopted, bRounds = runTrialsBatch(topo, Ai, 
+											trickleDirection, trials, draws)
+		bCoreAdopters = (bAdopted & topo.isCore).sum(axis=1)
+		bPeriphAdopters = (bAdopted & ~topo.isCore).sum(axis=1)
+		bWeaknesses, bPPoints = countWeaknessesAndPressurePoints(topo, 
+								bI, bA, targetSegment=targetSegment)
+	
+	verified = verifiedTrials(streams, trials, verifyTrials)
+	trial = 1
+	while trial<=trials:
+		trialDraws = (draws[0][trial-1], draws[1][trial-1])
+		# only seeded for the engines which shuffle
+		trialShuffle = activationShuffle(streams, trial) \
+					   if engine in SHUFFLING_ENGINES else None
+		if engine == "batch":
+			G = None
+			t = trial-1
+			I, A, adopted = bI[t], bA[t], bAdopted[t]
+			if trial in verified:
+				verifyCascade(topo, I, A, bRounds[t] == 0, adopted)
+			influence = influenceFromRounds(topo, bRounds[t]) \
+						if recordInfluence else None
+			numCoreAdopters = int(bCoreAdopters[t])
+			numPeriphAdopters = int(bPeriphAdopters[t])
+			numWeaknesses, numPPoints = int(bWeaknesses[t]), \
+										int(bPPoints[t])
+		elif engine == "parametric":
+			G = None
+			I, A = trialDraws[0], state.A
+			adopted = critical[trial-1] < Ai
+			if trial in verified:
+				initialAdopted = np.zeros(topo.n, dtype=bool)
+				initialAdopted[trialDraws[1]] = True
+				verifyCascade(topo, I, A, initialAdopted, adopted)
+			influence = influenceFromCritical(topo, critical[trial-1], Ai) \
+						if recordInfluence else None
+			numCoreAdopters = int(np.count_nonzero(adopted & topo.isCore))
+			numPeriphAdopters = int(np.count_nonzero(adopted & 
+													~topo.isCore))
+			numWeaknesses, numPPoints = countWeaknessesAndPressurePoints(
+								topo, I, A, targetSegment=targetSegment)
+		elif engine != "nx":
+			G = None
+			I, A, adopted, influence = runTrialCSR(topo, Ai, 
+								trickleDirection, 
+								recordInfluence=recordInfluence,
+								cascade=CASCADES[engine],
+								verify=trial in verified, state=state,
+								draws=trialDraws, shuffle=trialShuffle)
+			numCoreAdopters = int(np.count_nonzero(adopted & topo.isCore))
+			numPeriphAdopters = int(np.count_nonzero(adopted & 
+													~topo.isCore))
+			numWeaknesses, numPPoints = countWeaknessesAndPressurePoints(
+								topo, I, A, targetSegment=targetSegment)
+		else:
+			G = runTrialNx(Gorig, Ai, trickleDirection, trialDraws,
+						   trialShuffle)
+			
+			coreNodes = [a for a in G.nodes() if 'core' in \
+										G.node[a]['segments']]
+			periphNodes = [a for a in G.nodes() if 'core' not in \
+												G.node[a]['segments']]
+			
+			# Find the boundary weaknesses and pressure points
+			weaknesses, ppoints = findWeaknessesAndPressurePoints(G, 
+										targetSegment=targetSegment)
+			
+			# compute adopters in focal and non-focal strata
+			numCoreAdopters = len([a for a in coreNodes 
+									if G.node[a]['adopted']])
+			numPeriphAdopters = len([a for a in periphNodes  
+									if G.node[a]['adopted']])
+			numWeaknesses, numPPoints = len(weaknesses), len(ppoints)
+		
+		if recordInfluence and (renderTrials is None or 
+								trial in renderTrials):
+			outImgFilename = trialFileName(numberOfNodes, pties, Ai, trial)
+			writeDotFile = dotFilter.acceptCounts(numWeaknesses, numPPoints)
+			writePngFile = pngFilter.acceptCounts(numWeaknesses, numPPoints)
+			if writeDotFile or writePngFile:
+				# the network is written and drawn from the DOT document of
+				# the trial state, without a Graphviz graph
+				if G is not None:
+					I, A, adopted, influence = graphTrialState(G, topo)
+				weak, ppoint = boundaryMasks(topo.adjacency, targetMask, 
+											 I, A)
+				dot = adoptionNetworkDot(topo, I, A, adopted, influence, 
+										 weak, ppoint)
+			if writeDotFile:
+				if dotArchive is not None:
+					dotArchive.add(outImgFilename, dot)
+				else:
+					writeDot(pathjoin(outFilePath, outImgFilename+".dot"), 
+							 dot)
+			if writePngFile:
+				# save resulting graph image to file
+				writeFilePng = pathjoin(outFilePath, outImgFilename+".png")
+				if renderQueue is not None:
+					renderQueue.submit(dot, writeFilePng)
+				else:
+					drawDot(dot, writeFilePng)
+		
+		# record experiment results
+		trialRows.append([pties, Ai, trial, numCoreAdopters, numCoreNodes, 
+						  numPeriphAdopters, numPeriphNodes, numWeaknesses,
+						  numPPoints] + extraPPoints)
+		
+		trial += 1
+	
+	peripheralDensity, peripheralDiffusion, coreDiffusion = \
+								caseStatistics(trialRows, numCoreNodes, 
+											   numPeriphNodes, 
+											   totalPossiblePeriphTies)
+	return trialRows, (Ai, peripheralDensity.average, 
+					   peripheralDiffusion.average, coreDiffusion.average)
+
+def caseStatistics(trialRows, numCoreNodes, numPeriphNodes, 
+				   totalPossiblePeriphTies):
+	"""The statistics of the trials of a case.
+	
+	:param list trialRows: The trial log rows of the case.
+	:returns: The `Data` of the peripheral density, the peripheral diffusion
+			  and the core diffusion of the trials.
+	"""
+	peripheralDensity, peripheralDiffusion, coreDiffusion = \
+													Data(), Data(), Data()
+	if trialRows:
+		# (0) # periphery ties, (3) # core adopters, (5) # periph adopters
+		pties, coreAdopters, periphAdopters = np.array(
+						[row[:6] for row in trialRows], dtype=np.float
+											).T[[0, 3, 5]]
+		peripheralDensity.addData(pties/totalPossiblePeriphTies)
+		peripheralDiffusion.addData(periphAdopters/numPeriphNodes)
+		coreDiffusion.addData(coreAdopters/numCoreNodes)
+	return peripheralDensity, peripheralDiffusion, coreDiffusion
+
+def runCaseBlock(block, commonRandomNumbers=False, **caseArgs):
+	"""Simulates the cases of one number of periphery ties for all its 
+	ambiguity levels, with `runCase`.
+	
+	With `commonRandomNumbers`, all cases of the block share the same 
+	generated network and, trial by trial, the same profits and seed node.
+	Only the activation order of the agents is drawn per case. The 
+	differences between the ambiguity levels are then not blurred by the
+	variance of the networks and draws, and the network and draws are 
+	generated once per block instead of once per case.
+	
+	The "parametric" engine always shares them: the critical ambiguities of
+	each trial are computed once and give the adopters at every ambiguity 
+	level of the block.
+	
+	:param tuple block: A tuple (# periphery ties, ambiguity levels).
+	:param bool commonRandomNumbers: Share the network and the draws between
+									 the cases of the block.
+	
+	The other keyword arguments are passed on to `runCase`.
+	
+	:returns: The list of `runCase` results of the block, in the order of 
+			  the ambiguity levels.
+	"""
+	pties, AiLevels = block
+	engine = caseArgs.get('engine', "nx")
+	if not commonRandomNumbers and engine != "parametric":
+		return [runCase((pties, Ai), **caseArgs) for Ai in AiLevels]
+	
+	trickleDirection = caseArgs.get('trickleDirection', "down")
+	numberOfNodes = caseArgs.get('numberOfNodes', 31)
+	cpRatio = caseArgs.get('cpRatio', 1/3)
+	seed = caseArgs.get('seed', 0)
+	numCoreNodes = int(round(numberOfNodes*cpRatio))
+	numPeriphNodes = numberOfNodes - numCoreNodes
+	
+	streams = RandomStreams(seed, trickleDirection, pties)
+	if caseArgs.get('nestedSweep', False):
+		Gorig = nestedSweepGraph(numCoreNodes, numPeriphNodes, pties,
+								 caseSeed(seed, trickleDirection))
+	else:
+		Gorig = generateARCorePeriph(numCoreNodes, numPeriphNodes, pties,
+						legacySampling=caseArgs.get('legacySampling', False),
+						rng=streams.spawn("network").python())
+	topo = CSRTopology(Gorig)
+	draws = drawTrials(topo, trickleDirection, caseArgs.get('trials', 100),
+					   streams)
+	critical = None
+	if engine == "parametric":
+		critical = runTrialsParametric(topo, trickleDirection, 
+									   len(draws[1]), draws)[2]
+	
+	return [runCase((pties, Ai), shared=(Gorig, topo, draws, critical), 
+					**caseArgs)
+			for Ai in AiLevels]
+
+def collectCaseDots(block, numberOfNodes=31, trials=100, **caseArgs):
+	"""Simulates a block of cases with `runCaseBlock`, collecting the DOT documents of its trials in a `dotwriter.DotDocuments`
+	instead of writing them, so they are appended to the DOT archive of the
+	run by the process writing the logs, whatever process simulates the 
+	block.
+	
+	The parameters are those of `runCaseBlock`.
+	
+	:returns: The list of the (`runCase` result, DOT documents) of each case
+			  of the block, the documents as a list of (name, document) in
+			  the order of the trials.
+	"""
+	documents = DotDocuments()
+	results = runCaseBlock(block, numberOfNodes=numberOfNodes, trials=trials,
+						   dotArchive=documents, **caseArgs)
+	pties, AiLevels = block
+	caseNames = [[trialFileName(numberOfNodes, pties, Ai, trial) 
+				  for trial in xrange(1, trials+1)] for Ai in AiLevels]
+	return [(result, [(name, documents[name]) for name in names 
+					  if name in documents])
+			for result, names in zip(results, caseNames)]
+
+def runIncrementalSweep(Ai, peripheryTies, trickleDirection="down", 
+						numberOfNodes=31, trials=100, cpRatio=1/3, 
+						verifyTrials=0, seed=0, pressurePointProportions=()):
+	"""Simulates the cases of all numbers of periphery ties of one ambiguity
+	level with `cascade.IncrementalCascade`.
+	
+	The networks are those of the nested sweep of the run (see 
+	`graphgen.NestedCorePeriphSweep`), and each trial keeps its profits and 
+	seed node across the whole sweep. A trial inserts the ties of the sweep 
+	in order and reads the adopters off its cascade at every number of 
+	periphery ties, so the whole diffusion-vs-density curve of a trial 
+	costs about one cascade.
+	
+	:param Ai: The ambiguity level.
+	:param peripheryTies: The increasing numbers of periphery ties of the 
+						  cases.
+	:param int seed: The base seed of the simulation run.
+	
+	The other parameters are those of `run1997ThresholdModel`.
+	
+	:returns: The list of case results of this Ai (see `runCase`), in the 
+			  order of `peripheryTies`.
+	"""
+	peripheryTies = list(peripheryTies)
+	numCoreNodes = int(round(numberOfNodes*cpRatio))
+	numPeriphNodes = numberOfNodes - numCoreNodes
+	totalPossiblePeriphTies = possibleTies(numberOfNodes, numCoreNodes)[2]
+	targetSegment = 'periphery' if trickleDirection=="down" else "core"
+	
+	# the same sweep and draws for every Ai (common random numbers)
+	streams = RandomStreams(seed, trickleDirection)
+	sweep = NestedCorePeriphSweep(numCoreNodes, numPeriphNodes, 
+								  seed=streams.seedValue)
+	topo = CSRTopology(sweep.graph(0))
+	I, seeds = drawTrials(topo, trickleDirection, trials, streams)
+	A = np.repeat(Ai, topo.n)
+	ties = [[topo.index[a] for a in periphTieFromIndex(idx, numCoreNodes, 
+														 numPeriphNodes)]
+			for idx in sweep.order[:max(peripheryTies)]]
+	# the topology of each case, only built to verify trials
+	caseTopos = [CSRTopology(sweep.graph(pties)) 
+				 for pties in peripheryTies] if verifyTrials > 0 else None
+	# the trials of a sweep are those of all its cases
+	verified = verifiedTrials(streams.spawn(Ai), trials, verifyTrials)
+	
+	trialRows = [[] for pties in peripheryTies]
+	extraPPoints = [[] for pties in peripheryTies]
+	
+	for t in xrange(trials):
+		trialCascade = IncrementalCascade(topo, I[t], A, seeds[t], 
+										  targetSegment=targetSegment)
+		added = 0
+		for p, pties in enumerate(peripheryTies):
+			while added < pties:
+				trialCascade.addTie(*ties[added])
+				added += 1
+			
+			if t+1 in verified:
+				initialAdopted = np.zeros(topo.n, dtype=bool)
+				initialAdopted[seeds[t]] = True
+				verifyCascade(caseTopos[p], I[t], A, initialAdopted, 
+							  trialCascade.adopted)
+			if t == 0 and pressurePointProportions:
+				extraPPoints[p] = pressurePointCounts(trialCascade.crossDeg,
+											trialCascade.target,
+											pressurePointProportions)
+			
+			trialRows[p].append([pties, Ai, t+1, 
+								 trialCascade.numCoreAdopters, numCoreNodes,
+								 trialCascade.numPeriphAdopters, 
+								 numPeriphNodes, trialCascade.numWeaknesses,
+								 trialCascade.numPPoints] + extraPPoints[p])
+	
+	caseResults = []
+	for rows in trialRows:
+		peripheralDensity, peripheralDiffusion, coreDiffusion = \
+								caseStatistics(rows, numCoreNodes, 
+											   numPeriphNodes, 
+											   totalPossiblePeriphTies)
+		caseResults.append((rows, (Ai, peripheralDensity.average,
+								   peripheralDiffusion.average, 
+								   coreDiffusion.average)))
+	return caseResults
+
 def run1997ThresholdModel(trickleDirection="down", numberOfNodes=31,
 						trials=100, cpRatio=1/3,
 						outFilePath="/home/prima/Development/tmp/disim/out",
-						dots="none", pngs="none"):
+						dots="none", pngs="none", engine="nx",
+						verifyTrials=0, workers=1, seed=None,
+						legacySampling=False, nestedSweep=False,
+						commonRandomNumbers=False, ambiguityLevels=None,
+						pressurePointProportions=(), binaryTrialLog=False,
+						streamRegression=False, trialLog=True, 
+						renderWorkers=1, dotArchive=False, resume=False,
+						checkpointInterval=300):
 	"""Runs the initial threshold model	from [AR1997]_
 	
 	:param str trickleDirection: The direction of trickle simulation. This
@@ -74,6 +747,95 @@ def run1997ThresholdModel(trickleDirection="down", numberOfNodes=31,
 					 "none" for no outut.
 	:param str pngs: Condition to output PNG files of the influence networks
 					 (same values/conditions as *dots* argument).
+	:param str engine: The simulation engine. "nx" runs the cascade on a 
+					   networkx copy of the graph for each trial, "csr" on 
+					   flat adjacency arrays (see `cascade`). Both produce
+					   the same trial log rows. "frontier" only re-checks
+					   the neighbors of new adopters; it reaches the same 
+					   adopters, in a different activation order. "closure"
+					   computes the final adopters in a single traversal
+					   without a random activation order. "batch" runs all
+					   trials of a case at once on *trials x n* arrays.
+					   "parametric" computes the critical ambiguity of 
+					   every node once per trial and reads the adopters of
+					   all ambiguity levels off it, with common random 
+					   numbers. "incremental" inserts the ties of a nested 
+					   sweep one at a time and updates the adopters of 
+					   each trial as they are added, with the same profits
+					   and seed node at every density and Ai (see 
+					   `runIncrementalSweep`); it does not draw networks.
+	:param int verifyTrials: For the array-backed engines, the number of 
+							 trials per case whose adopters are checked 
+							 against the original simulation loop (see 
+							 `cascade.verifyCascade`). The trials are a 
+							 uniform sample of the trials of the case, 
+							 drawn from their own random stream (see 
+							 `rng.verifiedTrials`).
+	:param int workers: The number of processes that simulate cases, and 
+						then run the regressions, in parallel. The output 
+						does not depend on the number of workers.
+	:param int seed: The base seed from which each case's random seed is
+					 derived (see `caseSeed`). If `None`, it is drawn from
+					 the `random` module.
+	:param bool legacySampling: Sample the periphery ties of the generated 
+								networks like the original implementation
+								(see `graphgen.generateARCorePeriph`).
+	:param bool nestedSweep: Instead of generating a new network for every
+							 case, draw one ordering of the periphery ties
+							 per Ai and give each case the first `pties` ties
+							 of it (see `graphgen.NestedCorePeriphSweep`).
+							 The network grows between cases, and adjacent 
+							 densities are directly comparable.
+	:param bool commonRandomNumbers: Simulate all Ai levels of a number of 
+									 periphery ties on the same network, 
+									 with the same profits and seed node in
+									 each trial (see `runCaseBlock`).
+	:param ambiguityLevels: The non-negative ambiguity levels (Ai) to 
+							simulate, 1 to 5 in intervals of 1 by default.
+							The "parametric" engine handles arbitrarily 
+							fine grids at no extra simulation cost. The
+							levels are all ints if they are all integral, 
+							else all floats (see 
+							`canonicalAmbiguityLevels`).
+	:param pressurePointProportions: Additional proportions for the boundary 
+									 pressure points, whose counts are 
+									 logged as extra trial log columns (see 
+									 `graphsearch.pressurePointCounts`).
+	:param bool binaryTrialLog: Write the trial log in the binary columnar 
+								format of `triallog` instead of CSV.
+	:param bool streamRegression: Accumulate the moments of the regression
+								  variables of each case as the trials are
+								  simulated, and run the regressions from 
+								  them instead of from the trial log (see
+								  `stats.TrialMoments`).
+	:param bool trialLog: Whether to write the trial log. Without it, the
+						  regressions are run from the accumulated moments.
+	:param int renderWorkers: The number of processes drawing the PNG 
+							  files in the background while the cases are 
+							  simulated (see `render.RenderQueue`). With 0,
+							  or with several `workers`, each case draws 
+							  its networks in its trial loop.
+	:param bool dotArchive: Append the DOT documents of the trials to one 
+							indexed archive, ``adoptionNetworks-n<nodes>.dot``
+							(see `dotwriter.DotArchiveWriter`), instead of 
+							writing a file per trial. The documents are 
+							appended in the order of the trial log, so the
+							archive does not depend on the number of 
+							`workers`.
+	:param bool resume: Continue the run interrupted in `outFilePath` from
+						its last checkpoint (see `checkpoint`), with the 
+						same parameters, instead of starting a new run. The
+						output is the same as that of an uninterrupted run.
+						Without a checkpoint, a new run is started.
+	:param float checkpointInterval: The minimum number of seconds between
+									 two checkpoints, which are written at
+									 case boundaries, or None to write no 
+									 checkpoints.
+	
+	The parameters and the base seed of the run are saved to its run 
+	manifest (see `writeRunManifest`), so the networks of chosen trials can
+	be drawn afterwards with `replayTrial` instead of writing DOT and PNG 
+	files for every trial.
 	
 	.. note::
 		"For each case, we ran 100 trials and calculated the average number of 
@@ -82,23 +844,59 @@ def run1997ThresholdModel(trickleDirection="down", numberOfNodes=31,
 	# Determine number of core nodes 
 	numCoreNodes = int(round(numberOfNodes*cpRatio))
 	
-	targetSegment = 'periphery' if trickleDirection=="down" else "core"
+	assert(engine in ENGINES)
+	# the incremental engine draws no networks
+	assert(engine != "incremental" or (dots == "none" and pngs == "none"))
 	
 	if not exists(outFilePath):
 		makedirs(outFilePath)
 	
-	dotFilter = GRAPH_FILTERS[dots](targetSegment=targetSegment)
-	pngFilter = GRAPH_FILTERS[pngs](targetSegment=targetSegment)
+	# ***** The Checkpoint *****
+	# The number of cases completed, the sizes of the logs and the state of
+	# the run at the last checkpoint, from which an interrupted run resumes
+	checkpointPath = pathjoin(outFilePath, CHECKPOINT)
+	checkpoint = loadCheckpoint(checkpointPath) if resume else None
+	if checkpoint is None:
+		removeCheckpoint(checkpointPath)
+	elif seed is None:
+		seed = loadRunManifest(outFilePath)['seed']
+	archiveDots = dotArchive and dots != "none"
+	# the outputs continued by a resumed run
+	outputs = (binaryTrialLog, trialLog, streamRegression or not trialLog,
+			   archiveDots)
+	assert(checkpoint is None or checkpoint['outputs'] == outputs)
+	# ************************************
+	
+	# "In this first simulation, A_i was fixed to the same value for all
+	# firms, but this value was permitted to vary between 1 and 5 in
+	# intervals of 1." ([AR1997]_ p. 298)	
+	A_i = xrange(1,6) if ambiguityLevels is None else \
+		  canonicalAmbiguityLevels(ambiguityLevels)
+	# the adoption rule is only monotone in non-negative ambiguity levels
+	assert(min(A_i) >= 0)
 	
 	# ***** The Experiment Trial Log *****
-	# Record the results of every trial as a record in a CSV file 
+	# Record the results of every trial as a record in a CSV file, or in the 
+	# binary columnar format of `triallog`
 	# Fields/columns (ordered): 
 	# (0) # periphery ties, (1) Ai, (2) trial #, (3) # core adopters, 
 	# (4) total # core nodes, (5) # periph adopters, (6) total # periph nodes,
-	# (7) # boundary weaknesses, (8) # boundary pressure points
-	expTrialLogOutfile = "experimentTrialLog-n%d.csv" % numberOfNodes
-	expTrialLogFileP = file(pathjoin(outFilePath,expTrialLogOutfile), "w")
-	expTrialLogCSV = csv.writer(expTrialLogFileP)
+	# (7) # boundary weaknesses, (8) # boundary pressure points,
+	# (9...) # boundary pressure points for each of pressurePointProportions
+	expTrialLogOutfile = "experimentTrialLog-n%d%s" % (numberOfNodes,
+							BINARY_EXT if binaryTrialLog else ".csv")
+	expTrialLog = openTrialLog(pathjoin(outFilePath,expTrialLogOutfile), 
+							   binaryTrialLog, len(pressurePointProportions),
+							   checkpoint['trialLog'] if checkpoint 
+							   else None, 
+							   all(isinstance(Ai, int) for Ai in A_i))\
+					if trialLog else None
+	# The moments of the regression variables, accumulated in place of 
+	# reading the trial log back for the regressions
+	trialMoments = TrialMoments(trickleDirection) \
+					if streamRegression or not trialLog else None
+	if checkpoint is not None:
+		trialMoments = checkpoint['trialMoments']
 	# ************************************
 
 	# ***** The Experiment Case Log *****
@@ -107,11 +905,16 @@ def run1997ThresholdModel(trickleDirection="down", numberOfNodes=31,
 	# {ai : (avg peripheral diffusion, avg peripheral density, 
 	#        avg core diffusion), ... }
 	experimentCaseLog = defaultdict(lambda: [[],[],[]])		
+	if checkpoint is not None:
+		experimentCaseLog.update(checkpoint['experimentCaseLog'])
 	# Save trial data to csv too, stream to file
 	# Columns: (0) Ai, (1) avg peripheral diffusion, (2) avg peripheral density,
 	# (3) avg core diffusion 
 	expCaseLogOutfile = "experimentCaseLog-n%d.csv" % numberOfNodes
-	expCaseLogOutfileP = file(pathjoin(outFilePath,expCaseLogOutfile), "w")
+	expCaseLogOutfileP = file(pathjoin(outFilePath,expCaseLogOutfile), "w") \
+						 if checkpoint is None else \
+						 reopenFile(pathjoin(outFilePath,expCaseLogOutfile),
+									checkpoint['caseLog'])
 	expCaseLogCSV = csv.writer(expCaseLogOutfileP)	
 	# Note: The Experiment Case Log is primarily used to generate the  
 	# peripheral/core diffusion graphs.	
@@ -129,134 +932,130 @@ def run1997ThresholdModel(trickleDirection="down", numberOfNodes=31,
 	peripheryTies_i = xrange(0,int(totalPossiblePeriphTies),5)
 	# TODO: parameterize the interval, currently set static to '5'
 	
-	# "In this first simulation, A_i was fixed to the same value for all
-	# firms, but this value was permitted to vary between 1 and 5 in
-	# intervals of 1." ([AR1997]_ p. 298)	
-	A_i = xrange(1,6)	# [1, 2, 3, 4, 5]
 	
-	# generate all combinations of the # of ties and Ai for experimentation
-	cases = product(peripheryTies_i, A_i)
+	# generate all combinations of the # of ties and Ai for experimentation,
+	# simulated in blocks of all Ai levels for each # of ties, from the 
+	# first case not completed before the checkpoint
+	completedCases = checkpoint['cases'] if checkpoint is not None else 0
+	blocks = islice(product(peripheryTies_i, (tuple(A_i),)), 
+					completedCases // len(A_i), None)
 	
-	# A case is a combination of the number
-	for pties,Ai in cases:
-		
-		peripheralDiffusion = Data()
-		peripheralDensity = Data()
-		coreDiffusion = Data()
+	if seed is None:
+		# an int, like the seed loaded from the manifest: the streams are 
+		# keyed by its representation
+		seed = int(random.getrandbits(32))
+	# ***** The Run Manifest *****
+	# The parameters and the base seed of the run, from which any trial can
+	# be replayed and its network drawn later (see `replayTrial`)
+	runParams = dict(trickleDirection=trickleDirection, 
+					 numberOfNodes=numberOfNodes, trials=trials, 
+					 cpRatio=cpRatio, engine=engine, seed=seed, 
+					 legacySampling=legacySampling, nestedSweep=nestedSweep,
+					 commonRandomNumbers=commonRandomNumbers,
+					 ambiguityLevels=list(A_i), pressurePointProportions=
+										list(pressurePointProportions))
+	# a run is only resumed with its own parameters
+	assert(checkpoint is None or loadRunManifest(outFilePath) == 
+								 json.loads(json.dumps(runParams)))
+	writeRunManifest(outFilePath, **runParams)
+	# ************************************
+	# with a DOT archive, the documents of a block are returned with its 
+	# results and appended to the archive in the order of the cases
+	blockRunner = partial(collectCaseDots if archiveDots else runCaseBlock,
+						  commonRandomNumbers=commonRandomNumbers,
+						  trickleDirection=trickleDirection, 
+						  numberOfNodes=numberOfNodes, trials=trials, 
+						  cpRatio=cpRatio, outFilePath=outFilePath, dots=dots,
+						  pngs=pngs, engine=engine, verifyTrials=verifyTrials,
+						  seed=seed, legacySampling=legacySampling,
+						  nestedSweep=nestedSweep,
+						  pressurePointProportions=pressurePointProportions)
+	archive = DotArchiveWriter(pathjoin(outFilePath, 
+							   "adoptionNetworks-n%d.dot" % numberOfNodes),
+							   checkpoint['dotArchive'] if checkpoint 
+							   else None) \
+				if archiveDots else None
+	# the PNG files are drawn in the background, except with several case 
+	# workers, which draw the networks of their own cases
+	renderQueue = RenderQueue(renderWorkers) if renderWorkers > 0 and \
+					workers == 1 and pngs != "none" else None
+	if renderQueue is not None:
+		blockRunner = partial(blockRunner, renderQueue=renderQueue)
+	pool = None
+	try:
+		pool = Pool(workers) if workers > 1 else None
+		# imap returns the results in the order of the blocks
+		mapper = pool.imap if pool is not None else imap
+		if engine == "incremental":
+			sweepRunner = partial(runIncrementalSweep, 
+								  peripheryTies=peripheryTies_i,
+								  trickleDirection=trickleDirection, 
+								  numberOfNodes=numberOfNodes, trials=trials, 
+								  cpRatio=cpRatio, verifyTrials=verifyTrials,
+								  seed=seed, pressurePointProportions=
+												pressurePointProportions)
+			# one sweep per Ai, reordered into the blocks of each # of ties
+			# (the sweeps are simulated whole, even when resumed)
+			sweepResults = list(mapper(sweepRunner, A_i))
+			caseResults = islice(((sweep[p], ()) 
+								  for p in xrange(len(peripheryTies_i))
+								  for sweep in sweepResults), 
+								 completedCases, None)
+		else:
+			caseResults = chain.from_iterable(mapper(blockRunner, blocks))
+			if not archiveDots:
+				caseResults = ((result, ()) for result in caseResults)
+			caseResults = islice(caseResults, completedCases % len(A_i), 
+								 None)
+	
+		checkpointTime = time()
+		# A case is a combination of the number of periphery ties and Ai,
+		# with the DOT documents of its trials for the archive
+		for (trialRows, caseRow), documents in caseResults:
+			for name, dot in documents:
+				archive.add(name, dot)
+			if expTrialLog is not None:
+				expTrialLog.writerows(trialRows)
+			if trialMoments is not None:
+				trialMoments.writerows(trialRows)
 		
-		# Generate a new network for each case
-		Gorig = generateARCorePeriph(numCoreNodes,
-									numberOfNodes-numCoreNodes, pties)
-		trial = 1
-		while trial<=trials:
-			# make a copy of the generated graph b/c the simulation modifies 
-			# the graph
-			G = Gorig.copy()
-			# "Assessed profits were drawn randomly from a normal distribution
-			# with mean -1.0 and standard deviation 1.0" ([AR1997]_ p. 298)
-			mu,sigma = -1.0,1.0
-			
-			# set the assessed profit (I_i) for each node from normal 
-			# distribution, and the weight of bandwagon pressure (A_i).
-			for a in G.nodes():
-				G.node[a]['I'] = gauss(mu,sigma)
-				G.node[a]['A'] = Ai
-				G.node[a]['adopted'] = False
-				G.node[a]['influence'] = []
-			
-			coreNodes = [a for a in G.nodes() if 'core' in \
-										G.node[a]['segments']]
-			periphNodes = [a for a in G.nodes() if 'core' not in \
-												G.node[a]['segments']]
-			
-			# select a random core node as an adopter for trickle-down 
-			# diffusion or a random peripheral node for trickle-up diffusion
-			seedNode = choice(coreNodes) if trickleDirection == "down" \
-										 else choice(periphNodes)
-			G.node[seedNode]['adopted'] = True
-			
-			# Start simulation
-			while True:
-				# Only evaluate agents that have not yet adopted
-				agents = [n for n in G.nodes() if not G.node[n]['adopted']]
-				
-				# TODO: Option for simultaneous updating vs incremental.
-				# Make a temp copy of the graph here, so that we have a
-				# snapshot of the last round. Then, when complete, replace the 
-				# simulation graph with the newly updated graph.
-				# This would simulate simultaneous updating, instead of  
-				# incremental.
-				
-				# Uniform random agent activation
-				# TODO: Find out how activation occurred in the AR1997 model.
-				shuffle(agents)
-				madeChange = False
-				for a in agents:
-					# will agent a adopt?
-					# compute B_i,k = I_i + (A_i * P_k-1)
-					neighbors = G.neighbors(a)
-					adoptedNeighbors = [n for n in neighbors \
-										if G.node[n]['adopted'] == True]
-					# In the 1997 fad model, Pk1 is the number of neighbor  
-					# adopters divided by the total number of agents in the  
-					# network (potential adopters)
-					Pk1 = len(adoptedNeighbors)/G.number_of_nodes()
-					Bik = G.node[a]['I'] + (G.node[a]['A'] * Pk1)
-					if Bik > 0:
-						# Adopt if Bik was assessed > 0
-						G.node[a]['adopted'] = True
-						G.node[a]['influence'] = adoptedNeighbors
-						madeChange = True
-				
-				# stop after no more agents can be influenced by bandwagon
-				if not madeChange: 
-					break
-			
-			# Find the boundary weaknesses and pressure points
-			weaknesses, ppoints = findWeaknessesAndPressurePoints(G, 
-						targetSegment="periphery" if trickleDirection=="down" \
-						else "core")
-			
-			if pngs != "none" or dots != "none":
-				# save resulting graph image to file
-				outImgFilename = "n%d-PTies%d-Ai%d-Trial%d" % (numberOfNodes, 
-															pties, Ai, trial)
-				writeFileDot = pathjoin(outFilePath, outImgFilename+".dot") \
-								if dotFilter(G) else None
-				writeFilePng = pathjoin(outFilePath, outImgFilename+".png") \
-								if pngFilter(G) else None
-				drawAdoptionNetworkGV(G, 
-									  writeFile=writeFileDot,
-									  writePng=writeFilePng)
-			
-			# compute adopters in focal and non-focal strata
-			numCoreAdopters = len([a for a in coreNodes 
-									if G.node[a]['adopted']])
-			numPeriphAdopters = len([a for a in periphNodes  
-									if G.node[a]['adopted']])
-			# record experiment results
-			expTrialLogCSV.writerow([pties, Ai, trial, numCoreAdopters, 
-									len(coreNodes), numPeriphAdopters, 
-									len(periphNodes), len(weaknesses), 
-									len(ppoints)])
-			
-			peripheralDiffusion.addDatum(numPeriphAdopters/len(periphNodes))
-			peripheralDensity.addDatum(pties/totalPossiblePeriphTies)
-			coreDiffusion.addDatum(numCoreAdopters/len(coreNodes))
-			
-			clearWPPCache() # resources about this graph are no longer needed
-			trial += 1
+			Ai, pdens, pdiff, cdiff = caseRow
+			experimentCaseLog[Ai][0].append(pdens)
+			experimentCaseLog[Ai][1].append(pdiff)
+			experimentCaseLog[Ai][2].append(cdiff)
 		
-		experimentCaseLog[Ai][0].append(peripheralDensity.average)
-		experimentCaseLog[Ai][1].append(peripheralDiffusion.average)
-		experimentCaseLog[Ai][2].append(coreDiffusion.average)
+			expCaseLogCSV.writerow(caseRow)
 		
-		expCaseLogCSV.writerow((Ai, peripheralDensity.average,
-									peripheralDiffusion.average,
-									coreDiffusion.average))
+			completedCases += 1
+			if checkpointInterval is not None and \
+					time() - checkpointTime >= checkpointInterval:
+				saveRunCheckpoint(checkpointPath, completedCases, outputs, 
+								  expTrialLog, expCaseLogOutfileP, archive, 
+								  renderQueue, experimentCaseLog, trialMoments)
+				checkpointTime = time()
 	
-	expCaseLogOutfileP.close()
-	expTrialLogFileP.close()
+		if checkpointInterval is not None:
+			saveRunCheckpoint(checkpointPath, completedCases, outputs, 
+							  expTrialLog, expCaseLogOutfileP, archive, 
+							  renderQueue, experimentCaseLog, trialMoments)
+		if pool is not None:
+			pool.close()
+			pool.join()
+		if renderQueue is not None:
+			renderQueue.close()
+	finally:
+		# the workers are stopped even when a case fails
+		if pool is not None:
+			pool.terminate()
+		if renderQueue is not None:
+			renderQueue.terminate()
+		if archive is not None:
+			archive.close()
+		NESTED_SWEEPS.clear()
+		
+		expCaseLogOutfileP.close()
+		if expTrialLog is not None:
+			expTrialLog.close()
 	
 	periphDiffPlotTitle = "Extent of Peripheral Diffusion for Varying "\
 				"Ambiguity and Network Density\n(Averaged over %d trials)"\
@@ -269,56 +1068,237 @@ def run1997ThresholdModel(trickleDirection="down", numberOfNodes=31,
 	createCoreDiffusionPlot(experimentCaseLog, outFilePath, 
 								coreDiffPlotTitle)
 	
-	fullRegressionAnalysis(outFilePath, expTrialLogOutfile, trickleDirection)
+	fullRegressionAnalysis(outFilePath, expTrialLogOutfile, trickleDirection,
+						   workers, trialMoments)
 	
 
 
-def fullRegressionAnalysis(outFilePath, expTrialLogOutfile, trickleDirection):
+def saveRunCheckpoint(checkpointPath, completedCases, outputs, expTrialLog,
+					  expCaseLogFile, dotArchive, renderQueue, 
+					  experimentCaseLog, trialMoments):
+	"""Checkpoints a run of `run1997ThresholdModel` after `completedCases` 
+	cases (see `checkpoint`).
+	
+	The networks submitted to the render queue are drawn, and the logs are
+	synced to disk, before the checkpoint is replaced.
+	
+	:param tuple outputs: The outputs of the run, which a resumed run must 
+						  have too.
+	
+	The other parameters are the logs and the state of the run.
+	"""
+	if renderQueue is not None:
+		renderQueue.drain()
+	saveCheckpoint(checkpointPath, dict(cases=completedCases, 
+		outputs=outputs,
+		trialLog=expTrialLog.checkpoint() if expTrialLog is not None 
+				 else None,
+		caseLog=syncFile(expCaseLogFile),
+		dotArchive=dotArchive.checkpoint() if dotArchive is not None 
+				   else None,
+		experimentCaseLog=dict(experimentCaseLog), 
+		trialMoments=trialMoments))
+
+
+def fullRegressionAnalysis(outFilePath, expTrialLogOutfile, trickleDirection,
+						   workers=1, trialMoments=None):
 	"""Perform regression analysis on all the identified combinations of values
 	from the [AR1997]_ paper (With/without boundary conditions, all/high/low
 	network densities, full/limited to 185 peripheral ties).
 	
 	This function should effectively run the necessary regression analyses 
 	to regenerate all analysis tables presented in the paper.
+	
+	The trial log (CSV or binary, see `triallog`) is loaded, and its 
+	record selections computed, once for all the regressions (see 
+	`stats.RegressionSession`).
+	
+	:param int workers: The number of processes running the regressions.
+	:param trialMoments: The `stats.TrialMoments` accumulated during the 
+						 simulation, from which the regressions are run 
+						 instead of from the trial log.
 	"""
+	session = RegressionSession(trialMoments if trialMoments is not None
+								else pathjoin(outFilePath, expTrialLogOutfile),
+								trickleDirection)
 	
 	pTieRanges = (None, (0,185))
 	densityRanges = (None, (0,0.5), (0.5,1))
 	boundaryConds = (True,False)
 	conditionCombos = product(pTieRanges, densityRanges, boundaryConds)
 	
-	for cond in conditionCombos:
-		runOLSRegression1997(pathjoin(outFilePath, expTrialLogOutfile),
-						trickleDirection=trickleDirection,
-						peripheralTieRange = cond[0],
-						densityRange = cond[1],
-						withBoundaryAnalysis=cond[2],
-                        outFilePath=outFilePath)
+	session.regressAll(conditionCombos, outFilePath, workers)
 		
 
+def writeRunManifest(outFilePath, **params):
+	"""Saves the parameters of a simulation run, including its resolved 
+	base seed, to the run manifest (JSON) in `outFilePath`."""
+	manifestFile = file(pathjoin(outFilePath, RUN_MANIFEST), "w")
+	json.dump(params, manifestFile, indent=1, sort_keys=True)
+	manifestFile.close()
+
+def loadRunManifest(outFilePath):
+	"""Loads the parameters of the simulation run whose output is in 
+	`outFilePath` (see `writeRunManifest`).
+	
+	The strings are returned as `str`, as passed to the run, since the 
+	random streams are keyed by their representation.
+	"""
+	manifestFile = file(pathjoin(outFilePath, RUN_MANIFEST), "r")
+	params = json.load(manifestFile)
+	manifestFile.close()
+	return dict((str(k), str(v) if isinstance(v, unicode) else v) 
+				for k, v in params.iteritems())
+
+def replayTrial(outFilePath, pties, Ai, trial, dots="all", pngs="all",
+				renderPath=None):
+	"""Simulates one trial of a simulation run again and writes its 
+	network, instead of writing the networks of all trials during the run.
+	
+	The network, draws and activation order of every trial are derived from
+	the base seed of the run and the case and trial (see `runCase`), so the
+	trial is simulated exactly as in the run from the parameters of its run
+	manifest. Only the case of the trial, and its trials up to `trial`, are
+	simulated.
+	
+	:param str outFilePath: The output directory of the simulation run.
+	:param int pties: The number of periphery ties of the trial's case.
+	:param Ai: The ambiguity level of the trial's case.
+	:param int trial: The trial number (from 1), as in the trial log.
+	:param str dots: Condition to write the DOT file of the trial (see 
+					 `run1997ThresholdModel`).
+	:param str pngs: Condition to write the PNG file of the trial.
+	:param str renderPath: The directory of the DOT and PNG files, 
+						   `outFilePath` if None.
+	:returns: The trial log row of the trial.
+	"""
+	run = loadRunManifest(outFilePath)
+	# the Ai of the run, whose type is part of the key of its streams
+	levels = [level for level in run['ambiguityLevels'] if level == Ai]
+	assert(levels and 1 <= trial <= run['trials'])
+	Ai = levels[0]
+	caseArgs = dict(trickleDirection=run['trickleDirection'], 
+					numberOfNodes=run['numberOfNodes'], trials=trial,
+					cpRatio=run['cpRatio'], dots=dots, pngs=pngs,
+					outFilePath=outFilePath if renderPath is None 
+								else renderPath,
+					seed=run['seed'], legacySampling=run['legacySampling'],
+					nestedSweep=run['nestedSweep'], 
+					pressurePointProportions=
+									run['pressurePointProportions'],
+					renderTrials=(trial,))
+	if caseArgs['outFilePath'] and not exists(caseArgs['outFilePath']):
+		makedirs(caseArgs['outFilePath'])
+	
+	if run['engine'] == "incremental":
+		# the network of the nested sweep and the draws of the run (see 
+		# `runIncrementalSweep`), whose final adopters are those of any 
+		# activation order
+		numCoreNodes = int(round(run['numberOfNodes']*run['cpRatio']))
+		numPeriphNodes = run['numberOfNodes'] - numCoreNodes
+		streams = RandomStreams(run['seed'], run['trickleDirection'])
+		sweep = NestedCorePeriphSweep(numCoreNodes, numPeriphNodes, 
+									  seed=streams.seedValue)
+		draws = drawTrials(CSRTopology(sweep.graph(0)), 
+						   run['trickleDirection'], trial, streams)
+		Gorig = sweep.graph(pties)
+		trialRows = runCase((pties, Ai), engine="closure", 
+							shared=(Gorig, CSRTopology(Gorig), draws, None),
+							**caseArgs)[0]
+	else:
+		# the trials of a case are drawn from their own streams, so the 
+		# first `trial` trials are those of the run
+		trialRows = runCaseBlock((pties, (Ai,)), 
+							commonRandomNumbers=run['commonRandomNumbers'],
+							engine=run['engine'], **caseArgs)[0][0]
+	NESTED_SWEEPS.clear()
+	return trialRows[-1]
+
 def loadCaseLog(expCaseLogOutfilePath):
-	"""Regenerate experiment case log structure from output log file."""
+	"""Regenerate experiment case log structure from output log file.
+	
+	The file is either a case log (CSV) or a binary trial log (see 
+	`triallog`), whose trials are averaged per case.
+	"""
+	
+	experimentCaseLog = defaultdict(lambda: [[],[],[]])
+	
+	if isBinaryTrialLog(expCaseLogOutfilePath):
+		for caseRow in caseRowsFromTrialLog(
+										loadTrialLog(expCaseLogOutfilePath)):
+			Ai, pdens, pdiff, cdiff = caseRow
+			experimentCaseLog[Ai][0].append(pdens)
+			experimentCaseLog[Ai][1].append(pdiff)
+			experimentCaseLog[Ai][2].append(cdiff)
+		return experimentCaseLog
 	
 	# load data from output file
-	expCaseLogOutfileP = file(expCaseLogOutfilePath, "r+")
+	expCaseLogOutfileP = file(expCaseLogOutfilePath, "r")
 	expCaseLogCSV = csv.reader(expCaseLogOutfileP)
-	# Columns: Ai, avg peripheral diffusion, avg peripheral density,
+	# Columns: Ai, avg peripheral density, avg peripheral diffusion,
 	# avg core diffusion 
 	
-	experimentCaseLog = defaultdict(lambda: [[],[],[]])
-	
-	for Ai, pdiff, pdens, cdiff in expCaseLogCSV:		
-		experimentCaseLog[Ai][0].append(pdiff)
-		experimentCaseLog[Ai][1].append(pdens)
-		experimentCaseLog[Ai][2].append(cdiff)
+	for Ai, pdens, pdiff, cdiff in expCaseLogCSV:		
+		experimentCaseLog[float(Ai)][0].append(float(pdens))
+		experimentCaseLog[float(Ai)][1].append(float(pdiff))
+		experimentCaseLog[float(Ai)][2].append(float(cdiff))
+	expCaseLogOutfileP.close()
 	
 	return experimentCaseLog
 
+def caseRowsFromTrialLog(trialLog):
+	"""The case log rows (Ai, avg peripheral density, avg peripheral 
+	diffusion, avg core diffusion) of the trial log columns `trialLog` (see 
+	`triallog.loadTrialLog`), in the order of the cases in the log."""
+	pties, Ai = trialLog[0], trialLog[1]
+	coreNodes, periphNodes = trialLog[4], trialLog[6]
+	totalPossiblePeriphTies = np.array([possibleTies(c+p, c)[2] for c,p in 
+										zip(coreNodes, periphNodes)])
+	pdens = pties/totalPossiblePeriphTies
+	pdiff = trialLog[5]/periphNodes
+	cdiff = trialLog[3]/coreNodes
+	
+	# the trials of a case are consecutive rows
+	newCase = np.ones(len(pties), dtype=bool)
+	newCase[1:] = (pties[1:] != pties[:-1]) | (Ai[1:] != Ai[:-1])
+	case = np.cumsum(newCase) - 1
+	numTrials = np.bincount(case)
+	average = lambda values: np.bincount(case, weights=values)/numTrials
+	return zip(Ai[newCase].tolist(), average(pdens).tolist(),
+			   average(pdiff).tolist(), average(cdiff).tolist())
+
 
 
 from optparse import OptionParser, make_option
 #from sys import argv
 
+def canonicalAmbiguityLevels(levels):
+	"""The ambiguity levels of a run, all ints if they are all integral, 
+	else all floats. The levels are part of the keys of the random streams 
+	(see `rng.deriveSeed`) and are written to the logs, so 2.0 must be the 
+	same level as 2, and the Ai column of the trial log has a single type 
+	(see `triallog.trialLogColumns`)."""
+	levels = list(levels)
+	if all(Ai == int(Ai) for Ai in levels):
+		return [int(Ai) for Ai in levels]
+	return [float(Ai) for Ai in levels]
+
+def parseAmbiguityLevels(spec):
+	"""Parses the ambiguity levels of the command line, either a comma 
+	separated list ("1,2.5,4") or an inclusive range "start:stop:step".
+	
+	:returns: A list of ambiguity levels (see `canonicalAmbiguityLevels`), 
+			  or None if `spec` is None.
+	"""
+	if spec is None:
+		return None
+	if ":" in spec:
+		start, stop, step = [float(v) for v in spec.split(":")]
+		steps = int(round((stop-start)/step))
+		return canonicalAmbiguityLevels(round(start + i*step, 10) 
+										for i in xrange(steps+1))
+	return canonicalAmbiguityLevels(float(v) for v in spec.split(","))
+
 def parseCommandLine():
 	"""
 	Available commands:
@@ -328,10 +1308,33 @@ def parseCommandLine():
 			-t, --trials=<integer>
 			-D, --dots=all,wpp
 			-P, --pngs=all,wpp
+			-e, --engine=nx,csr,frontier,closure,batch,parametric,incremental
+			--verify-trials=<integer>
+			-w, --workers=<integer>
+			-s, --seed=<integer>
+			--legacy-sampling
+			--nested-sweep
+			--common-random-numbers
+			-a, --ambiguity-levels=<list>|<start:stop:step>
+			--ppoint-proportions=<list>
+			--binary-trial-log
+			--stream-regression
+			--no-trial-log
+			--render-workers=<integer>
+			--dot-archive
+			--resume
+			--checkpoint-interval=<seconds>
 		plotstats 
-			-i, --input-file=caseLogFile.csv
+			-i, --input-file=caseLogFile.csv|trialLog.cols
 		plotnetwork 
-			-i, --input-file=dotfile.dot
+			-i, --input-file=dotfile.dot|archive.dot
+			-c, --trial=<pties>,<Ai>,<trial #> (archives, repeatable)
+			-n, --nodes=<integer> (archives)
+		replay
+			-i, --input-file=<simulation output directory>
+			-c, --trial=<pties>,<Ai>,<trial #> (repeatable)
+			-D, --dots=all,wpp,none
+			-P, --pngs=all,wpp,none
 	
 	Global options:
 		Output directory: -o --output-dir
@@ -339,7 +1342,10 @@ def parseCommandLine():
 	
 	`simulate` runs the simulation
 	`plotstats` takes a case log file (CSV) and produces a graph file (PNG)
-	`plotnetwork` takes a DOT file and produces a network visualization (PNG)
+	`plotnetwork` takes a DOT file, or the trials of a DOT archive, and 
+	produces network visualizations (PNG)
+	`replay` simulates chosen trials of a simulation run again from its run
+	manifest and writes their networks (DOT and PNG unless -D/-P are given)
 	"""
 	
 	graphOutputChoices = GRAPH_FILTERS.keys() # from graphsearch module
@@ -370,9 +1376,89 @@ def parseCommandLine():
 					default="none",
 					help="Generate Graphviz visualization of networks." \
 					"Possible values are 'all' and 'wpp'."),
-		# for plotstats and plotnetwork commands:
+		make_option("-e", "--engine", type="choice", choices=ENGINES,
+					dest="engine", default="nx",
+					help="Simulation engine, 'nx' (networkx graph per "\
+					"trial), 'csr' (adjacency arrays), 'frontier' "\
+					"(event-driven adjacency arrays), 'closure' (final "\
+					"adopters only, order-independent), 'batch' (all "\
+					"trials of a case at once) or 'parametric' (the "\
+					"critical ambiguity of each node, computed once per "\
+					"trial for all Ai, with common random numbers) or "\
+					"'incremental' (the ties of a nested sweep inserted "\
+					"one at a time, with the same trials at every density "\
+					"and Ai; draws no networks, so --dots and --pngs must "\
+					"be 'none')."),
+		make_option("-w", "--workers", type="int", dest="workers", default=1,
+					help="Number of processes to simulate cases in parallel."),
+		make_option("-s", "--seed", type="int", dest="seed", default=None,
+					help="Base random seed of the simulation."),
+		make_option("--legacy-sampling", action="store_true", 
+					dest="legacySampling", default=False,
+					help="Sample periphery ties like the original "\
+					"implementation (to reproduce old results)."),
+		make_option("--nested-sweep", action="store_true", 
+					dest="nestedSweep", default=False,
+					help="Grow one network per Ai through the periphery "\
+					"tie sweep instead of generating one per case."),
+		make_option("--common-random-numbers", action="store_true", 
+					dest="commonRandomNumbers", default=False,
+					help="Simulate all Ai of a number of periphery ties on "\
+					"the same network and profit draws."),
+		make_option("-a", "--ambiguity-levels", type="string", 
+					dest="ambiguityLevels", default=None,
+					help="Ambiguity levels (Ai) to simulate, as a comma "\
+					"separated list or an inclusive range start:stop:step. "\
+					"Default is 1:5:1."),
+		make_option("--ppoint-proportions", type="string", 
+					dest="pressurePointProportions", default="",
+					help="Comma separated proportions for additional "\
+					"pressure point columns in the trial log."),
+		make_option("--binary-trial-log", action="store_true", 
+					dest="binaryTrialLog", default=False,
+					help="Write the trial log in a binary columnar format "\
+					"instead of CSV."),
+		make_option("--stream-regression", action="store_true", 
+					dest="streamRegression", default=False,
+					help="Run the regressions from moments accumulated "\
+					"during the simulation instead of from the trial log."),
+		make_option("--no-trial-log", action="store_false", 
+					dest="trialLog", default=True,
+					help="Do not write the trial log (implies "\
+					"--stream-regression)."),
+		make_option("--render-workers", type="int", dest="renderWorkers",
+					default=1,
+					help="Number of processes drawing the PNG files in the "\
+					"background (0 to draw them in the trial loop). Ignored "\
+					"with several --workers, which draw the PNG files of "\
+					"their own cases."),
+		make_option("--dot-archive", action="store_true", 
+					dest="dotArchive", default=False,
+					help="Append the DOT files of the trials to one indexed "\
+					"archive instead of writing a file per trial."),
+		make_option("--resume", action="store_true", dest="resume", 
+					default=False,
+					help="Continue an interrupted simulation in the output "\
+					"directory from its last checkpoint."),
+		make_option("--checkpoint-interval", type="float", 
+					dest="checkpointInterval", default=300,
+					help="Minimum number of seconds between checkpoints, "\
+					"written at case boundaries. Default is 300."),
+		make_option("--verify-trials", type="int", dest="verifyTrials",
+					default=0,
+					help="Number of trials per case to check against the "\
+					"original simulation loop (array-backed engines). The "\
+					"trials are sampled at random among the trials of the "\
+					"case, the same ones for a given seed."),
+		# for plotstats, plotnetwork and replay commands:
 		make_option("-i", "--input-file", type="string", dest="inputFile", 
 					help="Input file."),
+		# for the replay command:
+		make_option("-c", "--trial", type="string", action="append",
+					dest="replayTrials", default=[],
+					help="Trial to replay or to draw from a DOT archive, as "\
+					"'<periphery ties>,<Ai>,<trial #>' like in the trial "\
+					"log. Repeatable."),
 		# for all commands:
     	make_option("-o", "--output-dir", type="string", dest="outputDir", 
 					default=".",
@@ -380,18 +1466,24 @@ def parseCommandLine():
 						 "working directory."),
 	]
 	usage = "usage: %prog <command> [options] \n\n"\
-			"Command is one of 'simulate' or 'plotstats'."
+			"Command is one of 'simulate', 'plotstats', 'plotnetwork' "\
+			"or 'replay'."
 	parser = OptionParser(option_list=optlist, usage=usage)
 	
 	(options, args) = parser.parse_args()
 	
-	assert(len(args)>0 and args[0] in ("simulate", "plotstats"))
+	assert(len(args)>0 and args[0] in ("simulate", "plotstats", 
+									   "plotnetwork", "replay"))
 	assert(options.dots in graphOutputChoices and \
 			options.pngs in graphOutputChoices)
 	
 	command = args[0]
 	
-	if command == "simulate":		
+	if command == "simulate":
+		if options.engine == "incremental" and \
+				(options.dots != "none" or options.pngs != "none"):
+			parser.error("the incremental engine draws no networks, --dots "
+						 "and --pngs must be 'none'")
 		trickleDirections = [options.direction,]
 		if options.direction == "both":
 			trickleDirections=["up","down"]
@@ -403,7 +1495,24 @@ def parseCommandLine():
 					numberOfNodes=options.numberOfNodes,
 					trials = options.trials, 
 					outFilePath=outputFilePath,
-					dots=options.dots, pngs=options.pngs)
+					dots=options.dots, pngs=options.pngs,
+					engine=options.engine,
+					verifyTrials=options.verifyTrials,
+					workers=options.workers, seed=options.seed,
+					legacySampling=options.legacySampling,
+					nestedSweep=options.nestedSweep,
+					commonRandomNumbers=options.commonRandomNumbers,
+					ambiguityLevels=parseAmbiguityLevels(
+											options.ambiguityLevels),
+					pressurePointProportions=[float(p) for p in 
+						options.pressurePointProportions.split(",") if p],
+					binaryTrialLog=options.binaryTrialLog,
+					streamRegression=options.streamRegression,
+					trialLog=options.trialLog,
+					renderWorkers=options.renderWorkers,
+					dotArchive=options.dotArchive,
+					resume=options.resume,
+					checkpointInterval=options.checkpointInterval)
 	
 	if command == "plotstats":
 		experimentCaseLog = loadCaseLog(options.inputFile)
@@ -411,8 +1520,28 @@ def parseCommandLine():
 		createCoreDiffusionPlot(experimentCaseLog, options.outputDir)
 	
 	if command == "plotnetwork":
-		# TODO: Implement network plot. If not useful, remove feature.
-		pass
+		if isDotArchive(options.inputFile):
+			archive = DotArchive(options.inputFile)
+			for spec in options.replayTrials:
+				pties, Ai, trial = spec.split(",")
+				name = trialFileName(options.numberOfNodes, int(pties), 
+									 float(Ai), int(trial))
+				drawDot(archive.read(name), 
+						pathjoin(options.outputDir, name+".png"))
+		else:
+			pngName = splitext(basename(options.inputFile))[0]+".png"
+			drawDotFile(options.inputFile, 
+						pathjoin(options.outputDir, pngName))
+	
+	if command == "replay":
+		dots, pngs = options.dots, options.pngs
+		if dots == "none" and pngs == "none":
+			dots, pngs = "all", "all"
+		for spec in options.replayTrials:
+			pties, Ai, trial = spec.split(",")
+			print replayTrial(options.inputFile, int(pties), float(Ai),
+							  int(trial), dots=dots, pngs=pngs,
+							  renderPath=options.outputDir)
 
 	if command == "regress":
 		# TODO: Implement regression command line options
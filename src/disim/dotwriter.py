@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Writing the adoption networks as DOT documents.
+
+`adoptionNetworkDot` writes the DOT document of a trial, with the styles of
+`graphgen.drawAdoptionNetworkGV`, straight from the arrays of the trial
+state (see `cascade.TrialState`), without building a networkx graph, its
+`pygraphviz.AGraph` copy and the influence edges one at a time.
+
+The DOT documents of a run can also be appended to a single archive (see
+`DotArchiveWriter`) instead of a file per trial. The archive is the
+concatenation of the documents, which Graphviz reads as a file of several
+graphs, and an index (CSV) of the name, offset and length of each document,
+so any document is read without reading the others (see `DotArchive`).
+The documents simulated in other processes are collected in `DotDocuments`
+and appended by the process writing the archive.
+
+:Author: Christopher Kirkos
+
+Implementation
+--------------
+"""
+
+import re
+import csv
+import numpy as np
+from collections import OrderedDict
+from os.path import exists, isfile
+from checkpoint import syncFile, reopenFile
+
+# The styles of `graphgen.drawAdoptionNetworkGV`, as (name, value) pairs
+GRAPH_ATTRS = [("outputorder", "edgesfirst"), ("size", "8,8!"),
+               ("splines", "true")]
+NODE_ATTRS = [("fixedsize", "true"), ("fontcolor", "white"),
+              ("fontsize", "8"), ("shape", "circle"), ("style", "filled"),
+              ("width", "0.25")]
+EDGE_ATTRS = [("color", "#BBBBBB"), ("dir", "none"), ("weight", "1")]
+CORE_EDGE_ATTRS = [("len", "1.5")]
+INFLUENCE_EDGE_ATTRS = [("color", "#1E90FFAF"), ("dir", "forward"),
+                        ("penwidth", "4"), ("weight", "1")]
+COLOR_ADOPTED, COLOR_NON_ADOPTED = "dodgerblue", "firebrick1"
+# The border (color, width) of the boundary weaknesses and pressure points,
+# keyed by (weak, ppoint)
+BOUNDARY_STYLES = {(True, True):("#CF27CD", "4"),
+                   (True, False):("#CFC627", "3"),
+                   (False, True):("#41B428", "3")}
+
+# The file extension of the index of a DOT archive
+INDEX_EXT = ".index"
+
+_ID = re.compile(r"^([A-Za-z_][A-Za-z_0-9]*|-?(\.[0-9]+|[0-9]+(\.[0-9]*)?))$")
+_KEYWORDS = ("node", "edge", "graph", "digraph", "subgraph", "strict")
+
+def quoteID(value):
+    "The DOT ID of `value`, quoted unless it is a plain name or number."
+    s = str(value)
+    if _ID.match(s) and s.lower() not in _KEYWORDS:
+        return s
+    return '"%s"' % s.replace('"', '\\"')
+
+def attrList(attrs):
+    "The DOT attribute list of the (name, value) pairs `attrs`."
+    return "[%s]" % ", ".join("%s=%s" % (quoteID(k), quoteID(v))
+                              for k, v in attrs)
+
+def adoptionNetworkDot(topo, I, A, adopted, influence, weak, ppoint,
+                       name=None):
+    """The DOT document of the adoption network of a trial.
+
+    The nodes carry the trial state as attributes ('I', 'A', 'adopted',
+    'influence', 'segments', 'weak' and 'ppoint'), like the graphs drawn by
+    `graphgen.drawAdoptionNetworkGV`, and the same styles: the adopters are
+    filled in blue and the others in red, the influence of each adopter is
+    drawn as arrows from its influencing neighbors, the boundary weaknesses
+    and pressure points have a colored border, and the core nodes are
+    grouped in a cluster.
+
+    :param cascade.CSRTopology topo: The case topology.
+    :param I: The assessed profit of each node.
+    :param A: The ambiguity of each node.
+    :param adopted: The adoption flag of each node.
+    :param list influence: The influencing neighbor indices of each node,
+                           or None.
+    :param weak: The boundary weakness flag of each node (see
+                 `graphsearch.boundaryMasks`).
+    :param ppoint: The boundary pressure point flag of each node.
+    :param str name: The name of the graph.
+    :returns: The DOT document (str).
+    """
+    nodes = topo.nodes
+    ids = [quoteID(node) for node in nodes]
+    lines = ["graph %s{" % (quoteID(name)+" " if name else ""),
+             "\tgraph %s;" % attrList(GRAPH_ATTRS),
+             "\tnode %s;" % attrList(NODE_ATTRS),
+             "\tedge %s;" % attrList(EDGE_ATTRS),
+             "\tsubgraph clusterCoreNodes {"]
+    core = np.flatnonzero(topo.isCore)
+    lines.extend("\t\t%s;" % ids[i] for i in core)
+    # each tie once, the ties of the core in its cluster
+    coreEdgeAttrs = attrList(CORE_EDGE_ATTRS)
+    edges = []
+    for i in xrange(topo.n):
+        for j in topo.neighbors(i):
+            if j <= i:
+                continue
+            if topo.isCore[i] and topo.isCore[j]:
+                lines.append("\t\t%s -- %s %s;" % (ids[i], ids[j],
+                                                   coreEdgeAttrs))
+            else:
+                edges.append("\t%s -- %s;" % (ids[i], ids[j]))
+    lines.append("\t}")
+
+    for i in xrange(topo.n):
+        flags = (bool(weak[i]), bool(ppoint[i]))
+        attrs = [("A", A[i].item()), ("I", float(I[i])),
+                 ("adopted", bool(adopted[i])),
+                 ("fillcolor", COLOR_ADOPTED if adopted[i]
+                               else COLOR_NON_ADOPTED),
+                 ("influence", [nodes[j] for j in influence[i]]
+                               if influence is not None else []),
+                 ("ppoint", flags[1]), ("segments", topo.segments[i]),
+                 ("weak", flags[0])]
+        if flags in BOUNDARY_STYLES:
+            color, penwidth = BOUNDARY_STYLES[flags]
+            attrs += [("color", color), ("penwidth", penwidth)]
+        lines.append("\t%s %s;" % (ids[i], attrList(attrs)))
+    lines.extend(edges)
+
+    if influence is not None:
+        influenceAttrs = attrList(INFLUENCE_EDGE_ATTRS)
+        for i in xrange(topo.n):
+            lines.extend("\t%s -- %s %s;" % (ids[j], ids[i], influenceAttrs)
+                         for j in influence[i])
+    lines.append("}\n")
+    return "\n".join(lines)
+
+def writeDot(path, dot):
+    "Writes the DOT document `dot` to the file `path`."
+    dotFile = open(path, "wb")
+    dotFile.write(dot)
+    dotFile.close()
+
+def isDotArchive(path):
+    "Whether `path` is a DOT archive (see `DotArchiveWriter`)."
+    return isfile(path) and exists(path + INDEX_EXT)
+
+
+class DotArchiveWriter(object):
+    """Appends DOT documents to an archive file and its index.
+
+    The index file, named after the archive with the extension
+    `INDEX_EXT`, has a CSV row (name, offset, length) per document.
+    """
+
+    def __init__(self, path, resumeAt=None):
+        """
+        :param str path: The archive file. An existing archive is
+                         overwritten.
+        :param resumeAt: The position returned by `checkpoint` from which 
+                         to continue an existing archive, or None.
+        """
+        self.path = path
+        if resumeAt is None:
+            self.dotFile = open(path, "wb")
+            self.indexFile = open(path + INDEX_EXT, "wb")
+            self.offset = 0
+        else:
+            self.offset, indexSize = resumeAt
+            self.dotFile = reopenFile(path, self.offset)
+            self.indexFile = reopenFile(path + INDEX_EXT, indexSize)
+        self.index = csv.writer(self.indexFile)
+
+    def add(self, name, dot):
+        "Appends the DOT document `dot` under `name`."
+        self.dotFile.write(dot)
+        self.index.writerow((name, self.offset, len(dot)))
+        self.offset += len(dot)
+
+    def checkpoint(self):
+        """Syncs the archive and its index to disk.
+
+        :returns: The position from which the archive can be continued.
+        """
+        return (syncFile(self.dotFile), syncFile(self.indexFile))
+
+    def close(self):
+        self.dotFile.close()
+        self.indexFile.close()
+
+
+class DotDocuments(OrderedDict):
+    """Collects DOT documents by name, in the order they are added, in place
+    of a `DotArchiveWriter`, eg. in a worker process, whose documents are 
+    appended to the archive by the parent process."""
+
+    def add(self, name, dot):
+        "Adds the DOT document `dot` under `name`."
+        self[name] = dot
+
+
+class DotArchive(object):
+    "Reads the documents of a DOT archive (see `DotArchiveWriter`)."
+
+    def __init__(self, path):
+        """
+        :param str path: The archive file.
+        """
+        self.path = path
+        indexFile = open(path + INDEX_EXT, "rb")
+        self.index = OrderedDict((name, (int(offset), int(length)))
+                                 for name, offset, length in
+                                 csv.reader(indexFile))
+        indexFile.close()
+
+    def names(self):
+        "The names of the documents, in the order they were added."
+        return self.index.keys()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def read(self, name):
+        "The DOT document `name`, read without reading the others."
+        offset, length = self.index[name]
+        dotFile = open(self.path, "rb")
+        dotFile.seek(offset)
+        dot = dotFile.read(length)
+        dotFile.close()
+        return dot
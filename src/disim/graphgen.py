@@ -26,9 +26,10 @@ Implementation
 from __future__ import division
 
 from stats import possibleTies
+from graphsearch import markGraphChanged
 
 import random
-from random import sample
+from math import sqrt
 import networkx as nx
 import pygraphviz as pgv
 from itertools import combinations, chain
@@ -69,15 +70,19 @@ class DICorePeriphNxGenerator(DINetworkGenerator):
     """
     
     def __init__(self, numCoreNodes, numPeriphNodes, pties, seed=None, 
-                 *args, **kwargs):
+                 legacySampling=False, *args, **kwargs):
         """Construct the network generator object.
         
         :param int numCoreNodes: The number of nodes in the Core (>0).
         :param int numPeriphNodes: The number of nodes in the Periphery (>0).
         :param int pties: The number of additional ties to generate in 
                               the periphery.
-        :param int seed: A number to seed the random number generator.
-                             (Optional)
+        :param int seed: A number to seed the private random number 
+                         generator of the generator. If None, the networks
+                         are sampled with the `random` module. (Optional)
+        :param bool legacySampling: Sample the ties like the original 
+                                    implementation (see 
+                                    `generateARCorePeriph`).
         """
         assert(numCoreNodes>=0 and numPeriphNodes>=0 and pties>=0)
         
@@ -92,14 +97,17 @@ class DICorePeriphNxGenerator(DINetworkGenerator):
         self.numCoreNodes = numCoreNodes
         self.numPeriphNodes = numPeriphNodes
         self.pties = pties
+        self.legacySampling = legacySampling
         
-        # customize random number generator seed value if desired
-        if not seed is None:
-            random.seed(seed)
+        # a private random number generator, so the state of the `random`
+        # module is not changed
+        self.rng = None if seed is None else random.Random(seed)
         
     def next(self):
         return generateARCorePeriph(self.numCoreNodes, self.numPeriphNodes, 
-                                    self.pties)
+                                    self.pties, 
+                                    legacySampling=self.legacySampling,
+                                    rng=self.rng)
         
 
 def dissimilarProduct(A,B):
@@ -107,6 +115,33 @@ def dissimilarProduct(A,B):
     same."""
     return ((x,y) for x in A for y in B if x!=y)      
 
+def periphTieFromIndex(idx, numCoreNodes, numPeriphNodes):
+    """Maps an index in ``range(possibleTies(n, numCoreNodes)[2])`` to a
+    distinct undirected peripheral tie of a core-periphery network whose core
+    nodes are numbered first (see `generateARCorePeriph`).
+    
+    The first ``numPeriphNodes*numCoreNodes`` indices are the 
+    periphery-core ties, the remaining indices are the periphery-periphery 
+    ties (u, v), u < v, in lexicographic order.
+    
+    :returns: A tuple (peripheral node, other node).
+    """
+    C, P = numCoreNodes, numPeriphNodes
+    if idx < P*C:
+        return (C + idx//C, idx%C)
+    j = idx - P*C
+    # row u holds the P-1-u pairs (u, u+1..P-1) and starts at index
+    # u*(2P-u-1)/2; solve for the last row start <= j
+    rowStart = lambda u: u*(2*P-u-1)//2
+    u = int(((2*P-1) - sqrt((2*P-1)**2 - 8*j))/2)
+    # correct floating point rounding of the square root
+    while u > 0 and rowStart(u) > j:
+        u -= 1
+    while rowStart(u+1) <= j:
+        u += 1
+    v = u + 1 + (j - rowStart(u))
+    return (C+u, C+v)
+
 def setDefaultNodeAttrs(G):
     """Helper function to set default attributes on a new network. This 
     funciton modifies the graph itself.
@@ -120,7 +155,8 @@ def setDefaultNodeAttrs(G):
         G.node[a]['ppoint'] = False
 
 
-def generateARCorePeriph(numCoreNodes, numPeriphNodes, pties, show=False):
+def generateARCorePeriph(numCoreNodes, numPeriphNodes, pties, show=False,
+                         legacySampling=False, rng=None):
     """Generates a core-periphery network like the one discussed in [AR1997]_ 
     using NetworkX [HSS2008]_. 
     
@@ -132,8 +168,20 @@ def generateARCorePeriph(numCoreNodes, numPeriphNodes, pties, show=False):
     :param int numPeriphNodes: The number of nodes in the Periphery (>0).
     :param int pties: The number of additional ties to generate in 
                           the periphery.
+    :param bool legacySampling: The ties are sampled by index from the 
+                                distinct undirected peripheral ties (see
+                                `periphTieFromIndex`), in time and memory
+                                proportional to `pties`. If True, sample
+                                like the original implementation instead: 
+                                from a materialized pool of all candidate 
+                                ties, in which each periphery-periphery tie
+                                appears in both directions (twice as likely, 
+                                and possibly sampled twice).
+    :param random.Random rng: The random number generator the ties are 
+                              sampled with. If None, the `random` module.
     """
     assert(numCoreNodes>=0 and numPeriphNodes>=0)
+    sample = random.sample if rng is None else rng.sample
     
     # total number of nodes (n) in graph
     n = numCoreNodes + numPeriphNodes
@@ -155,22 +203,26 @@ def generateARCorePeriph(numCoreNodes, numPeriphNodes, pties, show=False):
     G.add_nodes_from([(pn,{'segments':['periphery']}) for pn in periphNodes])
     G.name="random core-periphery(%s)"%(n)
 
-    # iterator for all periph to core edges
-    pcedges = dissimilarProduct(periphNodes, coreNodes)
-    # iterator for all periph to periph edges
-    ppedges = dissimilarProduct(periphNodes, periphNodes)
-    
-    allPotentialEdges = chain(pcedges, ppedges)
-        #sampEdges = sample(tuple(pcedges), pcties)
-        #sampEdges.extend(sample(tuple(ppedges), ppties))
-    
-    # random sampling of edges to add
-    sampEdges = sample(tuple(allPotentialEdges), pties)
+    if legacySampling:
+        # iterator for all periph to core edges
+        pcedges = dissimilarProduct(periphNodes, coreNodes)
+        # iterator for all periph to periph edges
+        ppedges = dissimilarProduct(periphNodes, periphNodes)
+        
+        allPotentialEdges = chain(pcedges, ppedges)
+        
+        # random sampling of edges to add
+        sampEdges = sample(tuple(allPotentialEdges), pties)
+    else:
+        totalPeriphTies = possibleTies(n, numCoreNodes)[2]
+        sampEdges = [periphTieFromIndex(idx, numCoreNodes, numPeriphNodes) 
+                     for idx in sample(xrange(totalPeriphTies), pties)]
     
     # add extra non-core (peripheral) edges to the network
     G.add_edges_from(sampEdges)
     
     setDefaultNodeAttrs(G)
+    markGraphChanged(G)
     
     if show:
         nx.draw(G)
@@ -178,6 +230,62 @@ def generateARCorePeriph(numCoreNodes, numPeriphNodes, pties, show=False):
 
     return G
 
+class NestedCorePeriphSweep(object):
+    """Generates the networks of a sweep over the number of periphery ties as
+    nested edge sets.
+    
+    One random ordering of the candidate periphery ties is drawn for the 
+    sweep, and the network with `pties` ties holds the first `pties` ties of
+    that ordering. Moving up the sweep adds the missing ties to the same 
+    network instead of generating a new one, so a whole sweep costs time 
+    proportional to its total number of ties, and the networks at adjacent
+    densities differ only by the added ties.
+    """
+    
+    def __init__(self, numCoreNodes, numPeriphNodes, maxPties=None, 
+                 seed=None):
+        """
+        :param int numCoreNodes: The number of nodes in the Core.
+        :param int numPeriphNodes: The number of nodes in the Periphery.
+        :param int maxPties: The largest number of periphery ties the sweep 
+                             will request. Defaults to all possible ties.
+        :param seed: Seed for the ordering of the ties. The ordering is drawn 
+                     from a private random number generator; the state of
+                     the `random` module is not changed.
+        """
+        self.numCoreNodes = numCoreNodes
+        self.numPeriphNodes = numPeriphNodes
+        totPeriph = possibleTies(numCoreNodes+numPeriphNodes, 
+                                 numCoreNodes)[2]
+        if maxPties is None:
+            maxPties = totPeriph
+        self.order = random.Random(seed).sample(xrange(totPeriph), maxPties)
+        self.G = None
+        self.pties = 0
+    
+    def graph(self, pties):
+        """The network with the first `pties` ties of the sweep's ordering.
+        
+        The same graph object is returned, and grown in place, while `pties`
+        does not decrease; asking for fewer ties than the current network 
+        has rebuilds it.
+        """
+        if pties > len(self.order):
+            raise Exception("Cannot create more ties than the sweep's "\
+                            "maximum.")
+        if self.G is None or pties < self.pties:
+            self.G = generateARCorePeriph(self.numCoreNodes, 
+                                          self.numPeriphNodes, 0)
+            self.pties = 0
+        newEdges = [periphTieFromIndex(idx, self.numCoreNodes, 
+                                       self.numPeriphNodes) 
+                    for idx in self.order[self.pties:pties]]
+        self.G.add_edges_from(newEdges)
+        markGraphChanged(self.G)
+        self.pties = pties
+        return self.G
+
+
 def drawAdoptionNetworkGV(G, writeFile=None, writePng=None):
     """Generates the GraphViz adoption network. Optionally writes the output
     to DOT and/or PNG files.
@@ -283,6 +391,24 @@ def drawAdoptionNetworkGV(G, writeFile=None, writePng=None):
     
     return gvGraph
 
+def drawDotFile(dotFile, writePng):
+    """Renders a DOT file written by `drawAdoptionNetworkGV` to a PNG file,
+    with the same layout.
+    
+    :param str dotFile: The filename/path of the DOT file.
+    :param str writePng: The filename/path to which to save the PNG file.
+    """
+    filterwarnings(action="ignore", category=RuntimeWarning)
+    pgv.AGraph(dotFile).draw(writePng, 'png', 'fdp')
+    resetwarnings()
+
+def drawDot(dot, writePng):
+    """Renders a DOT document (str), eg. of a `dotwriter.DotArchive`, to a 
+    PNG file like `drawDotFile`."""
+    filterwarnings(action="ignore", category=RuntimeWarning)
+    pgv.AGraph(string=dot).draw(writePng, 'png', 'fdp')
+    resetwarnings()
+
 def drawAdoptionNetworkMPL(G, fnum=1, show=False, writeFile=None):
     """Draws the network to matplotlib, coloring the nodes based on adoption. 
     Looks for the node attribute 'adopted'. If the attribute is True, colors 
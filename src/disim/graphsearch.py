@@ -64,6 +64,11 @@ Implementation
 
 from __future__ import division
 
+import numpy as np
+import hashlib
+from itertools import count
+from collections import OrderedDict
+
 class GraphFilter(object):
     """An abstract base class defining the structure of `GraphFilter` objects.
     
@@ -77,6 +82,11 @@ class GraphFilter(object):
         pass
     def __call__(self, G):        
         raise NotImplementedError("Override this method")
+    def acceptCounts(self, numWeaknesses, numPPoints):
+        """The filter applied to a graph with `numWeaknesses` boundary 
+        weaknesses and `numPPoints` pressure points, for simulations which 
+        count them without a networkx graph."""
+        raise NotImplementedError("Override this method")
 
 
 class TrueFilter(GraphFilter):
@@ -85,6 +95,8 @@ class TrueFilter(GraphFilter):
         pass
     def __call__(self, G):
         return True
+    def acceptCounts(self, numWeaknesses, numPPoints):
+        return True
 
 
 class FalseFilter(GraphFilter):
@@ -93,6 +105,8 @@ class FalseFilter(GraphFilter):
         pass
     def __call__(self, G):
         return False
+    def acceptCounts(self, numWeaknesses, numPPoints):
+        return False
 
 
 class WPPFilter(GraphFilter):
@@ -107,28 +121,86 @@ class WPPFilter(GraphFilter):
         self.weaknessThresh=weaknessThresh
         self.pressurePointThresh=pressurePointThresh
         self.targetSegment=targetSegment
-        #self.wpp_cache = {}
         
     def __call__(self, G):
-        #if not G in self.wpp_cache:
-        #    self.wpp_cache[G] = findWeaknessesAndPressurePoints(G)
-        #w,pp = self.wpp_cache[G]
+        # shares the result of the trial's search through `WPP_CACHE`
         w,pp = findWeaknessesAndPressurePoints(G, 
                                             targetSegment=self.targetSegment)
-        
-        if len(w) >= self.weaknessThresh or \
-            len(pp) >= self.pressurePointThresh:
+        return self.acceptCounts(len(w), len(pp))
+    
+    def acceptCounts(self, numWeaknesses, numPPoints):
+        if numWeaknesses >= self.weaknessThresh or \
+            numPPoints >= self.pressurePointThresh:
                 return True
         return False
 
 
 GRAPH_FILTERS = {"all":TrueFilter, "none":FalseFilter,"wpp":WPPFilter}
 
-WPP_CACHE = {}
+# Source of the version stamps of `markGraphChanged`
+_GRAPH_VERSIONS = count()
+
+def markGraphChanged(G):
+    """Give the graph `G` a new version stamp. 
+    
+    Call this after changing the edges of `G` or the node attributes that
+    the weakness and pressure point search depends on ('segments', 'I' and
+    'A'), so the results cached for the previous version are not reused.
+    """
+    G.graph['version'] = next(_GRAPH_VERSIONS)
+
+def graphVersion(G):
+    """The version stamp of the graph `G` (see `markGraphChanged`).
+    
+    For a graph without a stamp, a hash of its edges and of the node 
+    attributes 'segments', 'I' and 'A' is used instead.
+    """
+    version = G.graph.get('version')
+    if version is not None:
+        return version
+    content = (sorted(G.edges()), 
+               [(n, G.node[n].get('segments'), G.node[n].get('I'), 
+                 G.node[n].get('A')) for n in sorted(G.nodes())])
+    return hashlib.md5(repr(content)).hexdigest()
+
+
+class WPPCache(object):
+    """A bounded cache of weakness and pressure point search results, keyed 
+    by graph version stamp (see `graphVersion`) rather than by the graph 
+    object, so it neither keeps graphs alive nor returns the results of an
+    earlier state of a graph. The least recently used entries are evicted 
+    once `maxSize` entries are held.
+    """
+    def __init__(self, maxSize=64):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def __contains__(self, key):
+        return key in self.entries
+    
+    def __getitem__(self, key):
+        value = self.entries.pop(key)
+        # re-insert as the most recently used entry
+        self.entries[key] = value
+        return value
+    
+    def __setitem__(self, key, value):
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+    
+    def clear(self):
+        self.entries.clear()
+
+
+WPP_CACHE = WPPCache()
 
 def clearWPPCache():
     "Delete all entries in Weaknesses and Pressure Points Cache."
-    global WPP_CACHE
     WPP_CACHE.clear()
 
 def findWeaknessesAndPressurePoints(G, proportion=1/2, 
@@ -155,23 +227,25 @@ def findWeaknessesAndPressurePoints(G, proportion=1/2,
                                representing weaknesses and pressure points.
     :param bool ignoreCache: Cause function to recalculate for the given
                              Graph `G` and update the cache accordingly.
+                             Results are cached by the version stamp of `G`
+                             (see `markGraphChanged`), so a search of an 
+                             unchanged graph is only done once, whether 
+                             from the simulation or from a `WPPFilter`.
     :returns: A tuple of 2 lists, the first list contains the node IDs 
               that were identified as being boundary weaknesses, the
               second contains node ID's of pressure points.
-    
-    .. todo::
-        See if there's a way to automatically determine graph 'dirtyness' for
-        cache invalidation.
-    
     """
-    # cache the result for multiple calls
-    # WARNING: The results become invalid if the graph's edge configuration
-    # changes OR if the node attributes for I_i and A_i change!
-    global WPP_CACHE
-    
-    cacheKey = (G,proportion,targetSegment)
+    # cache the result for multiple calls of the same version of the graph
+    cacheKey = (graphVersion(G),proportion,targetSegment)
     if not ignoreCache and cacheKey in WPP_CACHE:
-        return WPP_CACHE[cacheKey]
+        weakNodes, pressurePointNodes = WPP_CACHE[cacheKey]
+        if addGraphAttrs:
+            # the attributes may have been reset since the search
+            for a_i in weakNodes:
+                G.node[a_i]['weak']=True
+            for a_i in pressurePointNodes:
+                G.node[a_i]['ppoint']=True
+        return (weakNodes, pressurePointNodes)
     
     weakNodes=[]
     pressurePointNodes=[]
@@ -203,3 +277,102 @@ def findWeaknessesAndPressurePoints(G, proportion=1/2,
     
     return (weakNodes, pressurePointNodes) 
 
+
+def crossSegmentDegree(adjacency, isTarget):
+    """The number of neighbors of each node outside the target segment.
+    
+    :param adjacency: The *n x n* adjacency matrix (NumPy array or SciPy 
+                      sparse matrix).
+    :param numpy.Array isTarget: Boolean array, True for the nodes in the 
+                                 target segment.
+    """
+    crossDeg = np.asarray(adjacency.dot((~isTarget).astype(np.intp)))
+    return crossDeg.reshape(len(isTarget))
+
+def boundaryMasks(adjacency, isTarget, I, A, proportion=1/2):
+    """Array version of the boundary weakness and pressure point conditions 
+    of `findWeaknessesAndPressurePoints`.
+    
+    The cross-segment degree of every node is computed at once, as the 
+    product of the adjacency matrix with the indicator of the nodes outside
+    the target segment. `I` and `A` may hold a whole batch of trials on the
+    same network (*trials x n* arrays).
+    
+    :param adjacency: The *n x n* adjacency matrix (NumPy array or SciPy 
+                      sparse matrix).
+    :param numpy.Array isTarget: Boolean array, True for the nodes in the 
+                                 target segment.
+    :param numpy.Array I: The assessed profit of each node.
+    :param numpy.Array A: The ambiguity of each node.
+    :param float proportion: See `findWeaknessesAndPressurePoints`.
+    :returns: A tuple of 2 boolean arrays shaped like `I`, True for the 
+              boundary weaknesses and for the pressure points.
+    """
+    N = len(isTarget)
+    n_b = N - np.count_nonzero(isTarget)
+    crossDeg = crossSegmentDegree(adjacency, isTarget)
+    Bc_ik = np.asarray(I) + (np.asarray(A) * (1/N))
+    weak = isTarget & (crossDeg > 0) & (Bc_ik > 0)
+    ppoint = np.zeros(weak.shape, dtype=bool)
+    ppoint[...] = isTarget & (crossDeg >= n_b * proportion)
+    return weak, ppoint
+
+def findWeaknessesAndPressurePointsArray(nodes, adjacency, isTarget, I, A,
+                                         proportion=1/2):
+    """Array version of `findWeaknessesAndPressurePoints` for networks held
+    as adjacency matrices (see `boundaryMasks`).
+    
+    :param list nodes: The node IDs, in the order of the rows of 
+                       `adjacency`.
+    
+    The other parameters are those of `boundaryMasks`.
+    
+    :returns: The same tuple of 2 lists (boundary weakness node IDs, 
+              pressure point node IDs) as `findWeaknessesAndPressurePoints`
+              for a graph with the nodes in the order of `nodes`. For a 
+              batch of trials, a list of such tuples, one per trial.
+    """
+    weak, ppoint = boundaryMasks(adjacency, isTarget, I, A, proportion)
+    toNodes = lambda mask: [nodes[i] for i in np.flatnonzero(mask)]
+    if weak.ndim == 1:
+        return (toNodes(weak), toNodes(ppoint))
+    return [(toNodes(w), toNodes(pp)) for w, pp in zip(weak, ppoint)]
+
+def pressurePointCounts(crossDeg, isTarget, proportions):
+    """Counts the boundary pressure points of a network for several 
+    proportions at once.
+    
+    The cross-segment degrees of the target nodes are sorted once, and the
+    number of nodes reaching the degree required by each proportion is read
+    off with a binary search.
+    
+    :param numpy.Array crossDeg: The cross-segment degree of each node (see
+                                 `crossSegmentDegree`).
+    :param numpy.Array isTarget: Boolean array, True for the nodes in the 
+                                 target segment.
+    :param proportions: The proportions of the nodes outside the target 
+                        segment that a pressure point must neighbor (see 
+                        `findWeaknessesAndPressurePoints`).
+    :returns: A list with the number of pressure points for each proportion.
+    """
+    isTarget = np.asarray(isTarget, dtype=bool)
+    n_b = len(isTarget) - np.count_nonzero(isTarget)
+    degrees = np.sort(np.asarray(crossDeg)[isTarget])
+    thresholds = n_b * np.asarray(proportions, dtype=np.float)
+    return (len(degrees) - np.searchsorted(degrees, thresholds, 
+                                           side='left')).tolist()
+
+def countPressurePoints(G, proportions, targetSegment='periphery'):
+    """Counts the boundary pressure points of the graph `G` for each of 
+    `proportions`, with a single scan of its nodes (see 
+    `pressurePointCounts`).
+    
+    :returns: A list with the number of pressure points for each proportion.
+    """
+    nodes = G.nodes()
+    isTarget = np.array([targetSegment in G.node[n]['segments'] 
+                         for n in nodes], dtype=bool)
+    crossDeg = [len([b for b in G.neighbors(a) if targetSegment not in \
+                                                    G.node[b]['segments']])
+                if target else 0 for a, target in zip(nodes, isTarget)]
+    return pressurePointCounts(crossDeg, isTarget, proportions)
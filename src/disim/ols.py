@@ -0,0 +1,489 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Closed-form ordinary least squares over subsets of records.
+
+The regressions of `stats.runOLSRegression1997` standardize the selected
+records and regress without a constant, so a fit only depends on the number
+of selected records, the means of the variables and their centered
+cross-product matrix. These are computed once per group of records (see
+`groupCrossProducts`) and the statistics of any union of groups follow from
+them (see `combineGroups`), so many regressions over different record
+selections and variable subsets are solved together without going back to
+the records (see `fitStandardized`).
+
+The fits report the statistics of the `scikits.statsmodels` OLS results, with
+its conventions (the degrees of freedom of the model assume a constant).
+
+:Author: Christopher Kirkos
+
+Implementation
+--------------
+"""
+
+from __future__ import division
+
+import time
+import numpy as np
+from scipy import stats
+
+# The number of fits whose group statistics are combined at once
+COMBINE_CHUNK = 256
+
+class CrossProducts(object):
+    """The number of records, the means of the variables and their centered
+    cross-product matrix (the sum of the outer products of the deviations
+    from the mean) of a set of records."""
+
+    def __init__(self, n, mean, cross):
+        """
+        :param int n: The number of records.
+        :param numpy.Array mean: The means of the `k` variables.
+        :param numpy.Array cross: The `k` x `k` centered cross products.
+        """
+        self.n = n
+        self.mean = np.asarray(mean, dtype=np.float)
+        self.cross = np.asarray(cross, dtype=np.float)
+
+    @classmethod
+    def fromData(cls, data):
+        """The cross products of `data`, an array with one record per row
+        and one variable per column."""
+        data = np.asarray(data, dtype=np.float)
+        mean = data.mean(axis=0)
+        centered = data - mean
+        return cls(len(data), mean, np.dot(centered.T, centered))
+
+    def merge(self, other):
+        "The cross products of the records of `self` and `other`."
+        n = self.n + other.n
+        if self.n == 0 or other.n == 0:
+            return other if self.n == 0 else self
+        delta = other.mean - self.mean
+        return CrossProducts(n, self.mean + delta*(other.n/n),
+                             self.cross + other.cross + \
+                             np.outer(delta, delta)*(self.n*other.n/n))
+
+    __add__ = merge
+
+
+class Moments(object):
+    """The power sums, up to the fourth order, of a sequence of records, 
+    accumulated as they are produced.
+
+    Besides the cross products of the records (see `crossProducts`), they 
+    give the statistics of the residuals of a fit over the records (see 
+    `momentResidualStatistics`), so the records do not have to be kept. The
+    sums are of the deviations from the first record, which keeps them
+    small. The sum of the outer products of the differences between 
+    consecutive records gives the Durbin-Watson statistic.
+    """
+
+    def __init__(self, numVariables):
+        """
+        :param int numVariables: The number of variables of a record.
+        """
+        k = numVariables
+        self.n = 0
+        self.origin = self.first = self.last = None
+        self.sums = [np.zeros((k,)*order) for order in (1, 2, 3, 4)]
+        self.diffCross = np.zeros((k, k))
+
+    def update(self, rows):
+        "Adds the records `rows`, one per row, in order."
+        rows = np.atleast_2d(np.asarray(rows, dtype=np.float))
+        if len(rows) == 0:
+            return
+        if self.origin is None:
+            self.origin = self.first = rows[0].copy()
+            steps = np.diff(rows, axis=0)
+        else:
+            steps = np.diff(np.vstack([self.last, rows]), axis=0)
+        d = rows - self.origin
+        self.sums[0] += d.sum(axis=0)
+        self.sums[1] += np.dot(d.T, d)
+        self.sums[2] += np.einsum('ti,tj,tk->ijk', d, d, d)
+        self.sums[3] += np.einsum('ti,tj,tk,tl->ijkl', d, d, d, d)
+        self.diffCross += np.dot(steps.T, steps)
+        self.last = rows[-1].copy()
+        self.n += len(rows)
+
+    def crossProducts(self):
+        "The `CrossProducts` of the records."
+        k = len(self.sums[0])
+        if self.n == 0:
+            return CrossProducts(0, np.zeros(k), np.zeros((k, k)))
+        deviation = self.sums[0]/self.n
+        return CrossProducts(self.n, self.origin + deviation, 
+                             self.sums[1] - np.outer(deviation, 
+                                                     self.sums[0]))
+
+    def powerSums(self, w, a):
+        """The sums of the first four powers of ``w.z + a`` over the 
+        records ``z``."""
+        offset = a + np.dot(w, self.origin)
+        p = [self.n, np.dot(w, self.sums[0]), 
+             np.dot(np.dot(w, self.sums[1]), w),
+             np.einsum('ijk,i,j,k', self.sums[2], w, w, w),
+             np.einsum('ijkl,i,j,k,l', self.sums[3], w, w, w, w)]
+        # binomial expansion of (w.(z-origin) + offset)**order
+        binomial = ((1,), (1, 1), (1, 2, 1), (1, 3, 3, 1), (1, 4, 6, 4, 1))
+        return np.array([sum(c*offset**(order-j)*p[j] 
+                             for j, c in enumerate(binomial[order]))
+                         for order in (1, 2, 3, 4)])
+
+
+def groupCrossProducts(data, groups, numGroups=None):
+    """The cross products of each group of records.
+
+    :param numpy.Array data: The records, one per row.
+    :param numpy.Array groups: The group (0..`numGroups`-1) of each record.
+    :param int numGroups: The number of groups, by default one more than the
+                          largest group.
+    :returns: The number of records (`G`), the means (`G` x `k`) and the
+              centered cross products (`G` x `k` x `k`) of each group. The
+              means of empty groups are 0.
+    """
+    data = np.asarray(data, dtype=np.float)
+    groups = np.asarray(groups, dtype=np.intp)
+    if numGroups is None:
+        numGroups = groups.max()+1 if len(groups) else 0
+    k = data.shape[1]
+    counts = np.bincount(groups, minlength=numGroups).astype(np.float)
+    means = np.zeros((numGroups, k))
+    nonEmpty = counts > 0
+    for j in xrange(k):
+        sums = np.bincount(groups, data[:,j], numGroups)
+        means[nonEmpty,j] = sums[nonEmpty]/counts[nonEmpty]
+    centered = data - means[groups]
+    cross = np.empty((numGroups, k, k))
+    for i in xrange(k):
+        for j in xrange(i, k):
+            cross[:,i,j] = cross[:,j,i] = np.bincount(groups,
+                                    centered[:,i]*centered[:,j], numGroups)
+    return counts, means, cross
+
+def combineGroups(counts, means, cross, selections):
+    """The cross products of unions of groups.
+
+    :param counts, means, cross: The statistics of each group, as returned
+                                 by `groupCrossProducts`.
+    :param numpy.Array selections: One row per union, of the `G` booleans
+                                   selecting its groups.
+    :returns: The number of records (`r`), the means (`r` x `k`) and the
+              centered cross products (`r` x `k` x `k`) of each union.
+    """
+    selections = np.atleast_2d(np.asarray(selections, dtype=np.float))
+    n = selections.dot(counts)
+    k = means.shape[1]
+    mean = np.zeros((len(n), k))
+    nonEmpty = n > 0
+    mean[nonEmpty] = selections[nonEmpty].dot(counts[:,None]*means) / \
+                     n[nonEmpty,None]
+    combined = np.tensordot(selections, cross, 1)
+    for start in xrange(0, len(n), COMBINE_CHUNK):
+        chunk = slice(start, start+COMBINE_CHUNK)
+        # the spread of the group means about the mean of the union
+        dev = means[None,:,:] - mean[chunk,None,:]
+        combined[chunk] += np.einsum('rg,rgi,rgj->rij',
+                                     selections[chunk]*counts, dev, dev)
+    return n, mean, combined
+
+
+class OLSFit(object):
+    """A least squares fit of standardized variables without a constant.
+
+    Has the attributes of the `scikits.statsmodels` OLS results used by the
+    regression summaries.
+    """
+
+    def __init__(self, params, normalizedCov, nobs, rank, ssr, centeredTSS):
+        """
+        :param numpy.Array params: The coefficients.
+        :param numpy.Array normalizedCov: The inverse of the cross products
+                                          of the regressors.
+        :param int nobs: The number of records.
+        :param int rank: The rank of the regressors.
+        :param float ssr: The sum of the squared residuals.
+        :param float centeredTSS: The centered total sum of squares of the
+                                  dependent variable.
+        """
+        self.params = params
+        self.normalized_cov_params = normalizedCov
+        self.nobs = float(nobs)
+        self.df_resid = self.nobs - rank
+        # (below assumes that we have a constant, as statsmodels does)
+        self.df_model = float(rank-1)
+        self.ssr = ssr
+        self.centered_tss = centeredTSS
+
+    @property
+    def scale(self):
+        return self.ssr/self.df_resid
+
+    @property
+    def bse(self):
+        return np.sqrt(np.diag(self.normalized_cov_params)*self.scale)
+
+    @property
+    def tvalues(self):
+        return self.params/self.bse
+
+    @property
+    def pvalues(self):
+        return stats.t.sf(np.abs(self.tvalues), self.df_resid)*2
+
+    @property
+    def ess(self):
+        return self.centered_tss - self.ssr
+
+    @property
+    def rsquared(self):
+        return 1 - self.ssr/self.centered_tss
+
+    @property
+    def rsquared_adj(self):
+        return 1 - (self.nobs - 1)/self.df_resid * (1 - self.rsquared)
+
+    @property
+    def fvalue(self):
+        return (self.ess/self.df_model)/(self.ssr/self.df_resid)
+
+    @property
+    def f_pvalue(self):
+        return stats.f.sf(self.fvalue, self.df_model, self.df_resid)
+
+    @property
+    def llf(self):
+        nobs2 = self.nobs/2
+        return -nobs2*np.log(2*np.pi) - nobs2*np.log(self.ssr/self.nobs) - \
+               nobs2
+
+    @property
+    def aic(self):
+        return -2*self.llf + 2*(self.df_model + 1)
+
+    @property
+    def bic(self):
+        return -2*self.llf + np.log(self.nobs)*(self.df_model + 1)
+
+
+def fitStandardized(n, cross, xIdx, yIdx):
+    """Fits the standardized variable `yIdx` on the standardized variables
+    `xIdx`, without a constant, for each set of records.
+
+    The variables are standardized within each set of records, with the
+    sample standard deviation (see `stats.standardizeCoeff`).
+
+    :param numpy.Array n: The number of records of each set.
+    :param numpy.Array cross: The centered cross products of each set.
+    :param list xIdx: The variables of the regressors.
+    :param int yIdx: The variable of the dependent variable.
+    :returns: The list of the `OLSFit` of each set. Sets in which a variable
+              is constant have a fit of NaNs.
+    """
+    n = np.atleast_1d(np.asarray(n, dtype=np.float))
+    cross = np.asarray(cross, dtype=np.float).reshape(len(n),
+                                                      *cross.shape[-2:])
+    idx = list(xIdx) + [yIdx]
+    cross = cross[:,idx][:,:,idx]
+    p = len(xIdx)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sd = np.sqrt(np.diagonal(cross, axis1=1, axis2=2)/(n[:,None]-1))
+        standardized = cross/(sd[:,:,None]*sd[:,None,:])
+    valid = np.isfinite(standardized).all(axis=2).all(axis=1)
+    standardized[~valid] = np.eye(p+1)
+
+    XtX = standardized[:,:p,:p]
+    Xty = standardized[:,:p,p]
+    # one set at a time, the stacked forms need numpy 1.14
+    normalizedCov = np.array([np.linalg.pinv(m) for m in XtX]).reshape(
+                                                                XtX.shape)
+    rank = np.array([np.linalg.matrix_rank(m) for m in XtX], dtype=int)
+    params = np.einsum('rij,rj->ri', normalizedCov, Xty)
+    # the standardized dependent variable has a mean of 0, so its centered
+    # and uncentered sums of squares are both n-1
+    tss = standardized[:,p,p]
+    ssr = tss - np.einsum('ri,ri->r', params, Xty)
+
+    params[~valid] = np.nan
+    ssr[~valid] = np.nan
+    return [OLSFit(params[r], normalizedCov[r], n[r], rank[r], ssr[r],
+                   tss[r]) for r in xrange(len(n))]
+
+def standardizedResiduals(data, fit, xIdx, yIdx):
+    """The residuals of `fit` (see `fitStandardized`) over its records
+    `data`, one record per row, in order."""
+    standardized = (data - data.mean(axis=0))/data.std(axis=0, ddof=1)
+    return standardized[:,yIdx] - np.dot(standardized[:,list(xIdx)],
+                                         fit.params)
+
+def residualStatistics(resid):
+    """The residual statistics of a regression summary: the Durbin-Watson
+    statistic, the omnibus normality test and its p-value, the Jarque-Bera
+    test and its p-value, the skew and the kurtosis.
+
+    :param numpy.Array resid: The residuals of the fit, in record order
+                              (see `standardizedResiduals`).
+    """
+    from scikits.statsmodels.stats.stattools import (jarque_bera,
+            omni_normtest, durbin_watson)
+
+    JB, JBpv, skew, kurtosis = jarque_bera(resid)
+    omni, omnipv = omni_normtest(resid)
+    return (durbin_watson(resid), omni, omnipv, JB, JBpv, skew, kurtosis)
+
+def normalityTest(n, skew, kurtosis):
+    """The omnibus test for normality of `scipy.stats.normaltest`, from the
+    number of values and their skew and (Pearson) kurtosis.
+
+    :returns: The test statistic and its p-value.
+    """
+    # skew test
+    y = skew * np.sqrt(((n + 1) * (n + 3)) / (6.0 * (n - 2)))
+    beta2 = (3.0 * (n**2 + 27*n - 70) * (n+1) * (n+3) /
+             ((n-2.0) * (n+5) * (n+7) * (n+9)))
+    W2 = -1 + np.sqrt(2 * (beta2 - 1))
+    delta = 1 / np.sqrt(0.5 * np.log(W2))
+    alpha = np.sqrt(2.0 / (W2 - 1))
+    y = 1 if y == 0 else y
+    Zskew = delta * np.log(y / alpha + np.sqrt((y / alpha)**2 + 1))
+    # kurtosis test
+    E = 3.0*(n-1) / (n+1)
+    varb2 = 24.0*n*(n-2)*(n-3) / ((n+1)*(n+1.)*(n+3)*(n+5))
+    x = (kurtosis-E) / np.sqrt(varb2)
+    sqrtbeta1 = 6.0*(n*n-5*n+2)/((n+7)*(n+9)) * np.sqrt((6.0*(n+3)*(n+5)) /
+                                                        (n*(n-2)*(n-3)))
+    A = 6.0 + 8.0/sqrtbeta1 * (2.0/sqrtbeta1 + np.sqrt(1+4.0/(sqrtbeta1**2)))
+    term1 = 1 - 2/(9.0*A)
+    denom = 1 + x*np.sqrt(2/(A-4.0))
+    if denom < 0:
+        Zkurt = 0
+    else:
+        Zkurt = (term1 - np.power((1-2.0/A)/denom, 1/3.0)) / \
+                np.sqrt(2/(9.0*A))
+    k2 = Zskew**2 + Zkurt**2
+    return k2, stats.chi2.sf(k2, 2)
+
+def momentResidualStatistics(moments, fit, xIdx, yIdx, mean, sd):
+    """The residual statistics (see `residualStatistics`) of a fit from the
+    `Moments` of its records.
+
+    :param list moments: The `Moments` of the consecutive sequences of the
+                         records of the fit, in record order.
+    :param OLSFit fit: The fit (see `fitStandardized`).
+    :param list xIdx, yIdx: The variables of the fit.
+    :param numpy.Array mean, sd: The mean and sample standard deviation of
+                                 each variable over the records of the fit.
+    """
+    # the residual of a record z is w.z + a
+    w = np.zeros(len(mean))
+    w[yIdx] = 1/sd[yIdx]
+    w[list(xIdx)] = -fit.params/sd[list(xIdx)]
+    a = -np.dot(w, mean)
+
+    E = np.zeros(4)
+    sumSquaredSteps = 0
+    last = None
+    for m in moments:
+        if m.n == 0:
+            continue
+        E += m.powerSums(w, a)
+        sumSquaredSteps += np.dot(np.dot(w, m.diffCross), w)
+        if last is not None:
+            sumSquaredSteps += np.dot(w, m.first - last)**2
+        last = m.last
+
+    n = fit.nobs
+    mu = E[0]/n
+    m2 = E[1]/n - mu**2
+    m3 = E[2]/n - 3*mu*E[1]/n + 2*mu**3
+    m4 = E[3]/n - 4*mu*E[2]/n + 6*mu**2*E[1]/n - 3*mu**4
+    skew = m3/m2**1.5
+    kurtosis = m4/m2**2
+    # as computed by `scikits.statsmodels.stats.stattools.jarque_bera`, 
+    # whose integer divisions drop the kurtosis term
+    JB = (int(n)//6) * skew**2
+    omni, omnipv = normalityTest(n, skew, kurtosis)
+    return (sumSquaredSteps/E[1], omni, omnipv, JB, stats.chi2.sf(JB, 2),
+            skew, kurtosis)
+
+def summary(fit, residualStats, yname, xname):
+    """The text summary of the regression `fit`, laid out as the summary of
+    the `scikits.statsmodels` OLS results.
+
+    :param OLSFit fit: The fit.
+    :param tuple residualStats: The residual statistics of the fit (see 
+                                `residualStatistics`).
+    :param str yname: The name of the dependent variable.
+    :param list xname: The names of the regressors.
+    """
+    from scikits.statsmodels.iolib.table import SimpleTable
+
+    t = time.localtime()
+
+    part1_fmt = dict(data_fmts=["%s"], empty_cell='', colwidths=15,
+                     colsep=' ', row_pre='| ', row_post='|',
+                     table_dec_above='=', table_dec_below='',
+                     header_dec_below=None, header_fmt='%s', stub_fmt='%s',
+                     title_align='c', header_align='r', data_aligns="r",
+                     stubs_align="l", fmt='txt')
+    part2_fmt = dict(data_fmts=["%#10.4g","%#10.4g","%#6.4f","%#6.4f"],
+                     empty_cell='', colwidths=14, colsep=' ', row_pre='| ',
+                     row_post=' |', table_dec_above='=',
+                     table_dec_below='=', header_dec_below='-',
+                     header_fmt='%s', stub_fmt='%s', title_align='c',
+                     header_align='r', data_aligns='r', stubs_align='l',
+                     fmt='txt')
+    part3_fmt = dict(data_fmts=["%#10.4g","%#10.4g","%#10.4g","%#6.4g"],
+                     empty_cell='', colwidths=15, colsep='   ',
+                     row_pre='| ', row_post='  |', table_dec_above=None,
+                     table_dec_below='-', header_dec_below='-',
+                     header_fmt='%s', stub_fmt='%s', title_align='c',
+                     header_align='r', data_aligns='r', stubs_align='l',
+                     fmt='txt')
+
+    part1data = [[yname], ['OLS'], ['Least Squares'],
+                 [time.strftime("%a, %d %b %Y",t)],
+                 [time.strftime("%H:%M:%S",t)],
+                 [fit.nobs], [fit.df_resid], [fit.df_model]]
+    part1stubs = ('Dependent Variable:', 'Model:', 'Method:', 'Date:',
+                  'Time:', '# obs:', 'Df residuals:', 'Df model:')
+    part1 = SimpleTable(part1data, None, part1stubs,
+                        title='Summary of Regression Results',
+                        txt_fmt=part1_fmt)
+
+    part2data = zip(fit.params, fit.bse, fit.tvalues, fit.pvalues)
+    part2header = ('coefficient', 'std. error', 't-statistic', 'prob.')
+    part2 = SimpleTable(part2data, part2header, xname, title=None,
+                        txt_fmt=part2_fmt)
+
+    part3Lstubs = ('R-squared:', 'Adjusted R-squared:', 'F-statistic:',
+                   'Prob (F-statistic):', 'Log likelihood:',
+                   'AIC criterion:', 'BIC criterion:',)
+    part3Rstubs = ('Durbin-Watson:', 'Omnibus:', 'Prob(Omnibus):', 'JB:',
+                   'Prob(JB):', 'Skew:', 'Kurtosis:')
+    part3Ldata = [[fit.rsquared], [fit.rsquared_adj], [fit.fvalue],
+                  [fit.f_pvalue], [fit.llf], [fit.aic], [fit.bic]]
+    part3Rdata = [[value] for value in residualStats]
+    part3L = SimpleTable(part3Ldata, ['Models stats'], part3Lstubs,
+                         txt_fmt=part3_fmt)
+    part3R = SimpleTable(part3Rdata, ['Residual stats'], part3Rstubs,
+                         txt_fmt=part3_fmt)
+    part3L.extend_right(part3R)
+    return str(part1) + '\n' + str(part2) + '\n' + str(part3L)
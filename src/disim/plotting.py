@@ -47,7 +47,7 @@ def createPeripheralDiffusionPlot(experimentCaseLog, outFilePath,
     for Ai in experimentCaseLog.keys():
         # x axis is peripheral density, y axis is the peripheral diffusion
         x,y = experimentCaseLog[Ai][0], experimentCaseLog[Ai][1]
-        ax.plot(x,y, label="Ambiguity=%d"%Ai, marker=mc.next())
+        ax.plot(x,y, label="Ambiguity=%g"%Ai, marker=mc.next())
     
     ax.set_xlabel("Network Density Beyond the Core")
     ax.set_ylabel("Peripheral Diffusion")
@@ -75,7 +75,7 @@ def createCoreDiffusionPlot(experimentCaseLog, outFilePath, plotTitle=None):
     for Ai in experimentCaseLog.keys():
         # x axis is peripheral density, y axis is the core diffusion
         x,y = experimentCaseLog[Ai][0], experimentCaseLog[Ai][2]
-        ax.plot(x,y, label="Ambiguity=%d"%Ai, marker=mc.next())
+        ax.plot(x,y, label="Ambiguity=%g"%Ai, marker=mc.next())
     
     ax.set_xlabel("Network Density Beyond the Core")
     ax.set_ylabel("Core Diffusion")
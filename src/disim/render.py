@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Drawing the adoption networks in the background.
+
+Drawing a network runs a Graphviz layout, which takes much longer than 
+simulating the trial. A `RenderQueue` takes the compact snapshot of a 
+trial, its DOT document (see `dotwriter.adoptionNetworkDot`), which holds 
+the ties, the adoption and influence of each node and the boundary flags in 
+the order of the topology, and draws it in a pool of worker processes while 
+the simulation goes on. The state of a case is overwritten by its next 
+trial, so it is not drawn directly.
+
+The number of snapshots waiting to be drawn is bounded: when the workers
+fall behind, `RenderQueue.submit` waits for the oldest drawing to finish,
+so the memory does not grow with the number of trials.
+
+:Author: Christopher Kirkos
+
+Implementation
+--------------
+"""
+
+from graphgen import drawDot
+from collections import deque
+from multiprocessing import Pool
+
+
+class RenderQueue(object):
+    """Draws the networks of trials in a pool of worker processes."""
+
+    def __init__(self, workers=1, maxPending=None, draw=drawDot):
+        """
+        :param int workers: The number of drawing processes.
+        :param int maxPending: The maximum number of snapshots submitted
+                               and not yet drawn, twice the number of
+                               workers by default.
+        :param draw: The module-level function drawing a DOT document, 
+                     called with (dot, writePng), `graphgen.drawDot` by 
+                     default.
+        """
+        self.pool = Pool(workers)
+        self.maxPending = 2*workers if maxPending is None else maxPending
+        self.draw = draw
+        self.pending = deque()
+
+    def submit(self, dot, writePng):
+        """Draws the DOT document `dot` of a trial to the PNG file 
+        `writePng` in the background, after waiting for the oldest drawings
+        if `maxPending` are not finished.
+
+        An exception raised while drawing is raised again by the call which
+        waits for that drawing.
+        """
+        while len(self.pending) >= self.maxPending:
+            self.pending.popleft().get()
+        self.pending.append(self.pool.apply_async(self.draw, 
+                                                  (dot, writePng)))
+
+    def drain(self):
+        "Waits until all submitted networks are drawn."
+        while self.pending:
+            self.pending.popleft().get()
+
+    def close(self):
+        "Draws the remaining networks and stops the workers."
+        try:
+            self.drain()
+        finally:
+            self.pool.close()
+            self.pool.join()
+
+    def terminate(self):
+        """Stops the workers without drawing the remaining networks, eg. 
+        when the simulation fails."""
+        self.pending.clear()
+        self.pool.terminate()
+        self.pool.join()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Reproducible random number streams.
+
+The random draws of a simulation run come from streams derived from the base
+seed of the run and a key naming what is drawn, eg. (trickle direction,
+periphery ties, Ai, trial). A stream does not depend on any other, so the
+draws of a case or of a trial are the same whichever process simulates it,
+and in whatever order or batch. The global states of the `random` and
+`numpy.random` modules are neither used nor changed.
+
+The streams are `numpy.random.RandomState` generators (the `Generator` and
+`SeedSequence` of later NumPy versions are not available to Python 2), or
+`random.Random` generators for the code sampling with the `random` module
+interface, seeded from a hash of the base seed and the key.
+
+:Author: Christopher Kirkos
+
+Implementation
+--------------
+"""
+
+import random
+import hashlib
+import numpy as np
+
+def deriveSeed(seed, *key):
+    """Derives a 32 bit seed from the base `seed` of a run and the `key` of
+    a stream, eg. (trickle direction, pties, Ai)."""
+    return int(hashlib.md5(repr((seed,)+key)).hexdigest()[:8], 16)
+
+
+class RandomStreams(object):
+    """The random number stream of a key, and the source of the streams of
+    its sub-keys (see `spawn`)."""
+
+    def __init__(self, seed, *key):
+        """
+        :param int seed: The base seed of the run.
+        :param key: The key of the stream.
+        """
+        self.seed = seed
+        self.key = key
+
+    def spawn(self, *key):
+        "The streams of the key extended with `key`."
+        return RandomStreams(self.seed, *(self.key+key))
+
+    @property
+    def seedValue(self):
+        "The seed of the stream (see `deriveSeed`)."
+        return deriveSeed(self.seed, *self.key)
+
+    def numpy(self):
+        "A new `numpy.random.RandomState` generator of the stream."
+        return np.random.RandomState(self.seedValue)
+
+    def python(self):
+        "A new `random.Random` generator of the stream."
+        return random.Random(self.seedValue)
+
+
+def drawTrialProfits(streams, trials, numNodes, seedCandidates, mu, sigma):
+    """Draws the profits and the seed node of each trial from the stream of
+    the trial, ``streams.spawn(trial)``, one array draw per trial.
+
+    :param RandomStreams streams: The streams of the case.
+    :param int trials: The number of trials.
+    :param int numNodes: The number of nodes.
+    :param numpy.Array seedCandidates: The nodes a seed node is chosen from.
+    :param float mu, sigma: The mean and standard deviation of the profits.
+    :returns: A tuple (I, seeds): the *trials x numNodes* profits and the
+              seed node of each trial.
+    """
+    I = np.empty((trials, numNodes))
+    seeds = np.empty(trials, dtype=np.intp)
+    for t in xrange(trials):
+        rs = streams.spawn(t).numpy()
+        I[t] = rs.normal(mu, sigma, numNodes)
+        seeds[t] = seedCandidates[rs.randint(len(seedCandidates))]
+    return I, seeds
+
+def activationShuffle(streams, trial):
+    """The shuffle of the activation order of the agents in `trial`, from
+    its own stream."""
+    return streams.spawn(trial, "activation").numpy().shuffle
+
+def verifiedTrials(streams, trials, count):
+    """The numbers (from 1) of a uniform sample of `count` of the `trials`
+    trials of a case, drawn from their own stream, ``streams.spawn("verify")``,
+    so the sample does not change the draws of the trials.
+
+    :returns: The set of the sampled trials, all trials if `count` is not 
+              less than `trials`.
+    """
+    if count <= 0:
+        return frozenset()
+    order = streams.spawn("verify").numpy().permutation(trials)
+    return frozenset((order[:count] + 1).tolist())
@@ -26,10 +26,14 @@ from __future__ import division
 
 import numpy as np
 import scikits.statsmodels as sm
-from scikits.statsmodels.regression import linear_model
 import numexpr as ne
+from triallog import loadTrialLog
+from ols import groupCrossProducts, combineGroups, fitStandardized, \
+                standardizedResiduals, residualStatistics, Moments, \
+                momentResidualStatistics, summary as olsSummary
 #from itertools import product
 from os.path import isdir, join as pathjoin
+from multiprocessing import Pool
 
 def standardizeCoeff(A, sample=True):
     """Element-wise, subtract the mean of the values from each value and
@@ -72,7 +76,9 @@ def runOLSRegression1997(expTrialLogFilePath,
     of peripheral diffusion.
 
     :param str expTrialLogFilePath: The full path to the experiment's trial
-                                       log file.
+                                       log file, CSV or binary (see 
+                                       `triallog`), or its columns as 
+                                       loaded by `triallog.loadTrialLog`.
     :param str trickleDirection: Either "up" or "down". If "up", core diffusion
                                  is selected as the dependent variable in the
                                  regression analysis. If "down", peripheral
@@ -92,6 +98,11 @@ def runOLSRegression1997(expTrialLogFilePath,
                                the specified range (Eg. *(0,0.5)*). If `None`
                                is specified, then no density restriction is
                                placed on the records.
+    :param str outFilePath: The directory in which the regression summary is
+                            written, or the path of the summary file.
+    :returns: A tuple of the fitted regression and the (mean, standard 
+              deviation, min, max) of the dependent variable, or None if no
+              record matches the ranges.
 
     .. note::
         The original authors only simulated with the number of peripheral
@@ -102,8 +113,57 @@ def runOLSRegression1997(expTrialLogFilePath,
         density >0.5. This is the reasoning behind the `peripheralTieRange`
         and `densityRange` function parameters.
 
+    To run several regressions on the same trial log, use a 
+    `RegressionSession`, which loads the log only once.
     """
-    # 7 Columns (from log file):
+    session = RegressionSession(expTrialLogFilePath, trickleDirection)
+    return session.regress(peripheralTieRange, densityRange, 
+                           withBoundaryAnalysis, outFilePath)
+
+def selectRanges(pties, densA, peripheralTieRange, densityRange):
+    """The selection of the values of `pties` and `densA` within the tie and
+    density ranges (see `runOLSRegression1997`)."""
+    # Begin down selecting records based on input conditions
+    ptr0,ptr1 = peripheralTieRange if peripheralTieRange else \
+                                        (np.min(pties), np.max(pties))
+    # selecting on pties, the # peripheral ties
+    tieMask = np.ma.masked_inside(pties, ptr0, ptr1)
+    
+    dr0,dr1 = densityRange if densityRange else \
+                                        (np.min(densA), np.max(densA))
+    # Todo: ask authors which density they used? Nx or peripheral..
+    # (originally) selecting on x3, the peripheral density independent 
+    # variable
+    # selecting on densA, the network density
+    densityMask = np.ma.masked_inside(densA, dr0, dr1)
+    
+    return np.ma.getmaskarray(tieMask) & np.ma.getmaskarray(densityMask)
+
+def regressionFileName(peripheralTieRange, densityRange, 
+                       withBoundaryAnalysis):
+    "The name of the summary file of a regression of `runOLSRegression1997`."
+    ptr = peripheralTieRange
+    ptiesStr = "{0:d}To{1:d}PTies-".format(ptr[0],ptr[1]) if ptr else ""
+    dr = densityRange
+    pdensStr = "PDensity{0:.2f}To{1:.2f}-".format(dr[0],dr[1]) if dr else ""
+    boundStr = "{0:s}Boundaries".format( "With" if withBoundaryAnalysis \
+                                     else "Without" )
+    return "Regression-{0:s}{1:s}{2:s}.txt".format(ptiesStr,pdensStr,
+                                                   boundStr)
+
+
+def regressionVariables(trialLog, trickleDirection="down"):
+    """The variables of the regressions of `runOLSRegression1997` for the
+    records of a trial log.
+    
+    :param trialLog: The columns of the trial log.
+    :param str trickleDirection: See `runOLSRegression1997`.
+    :returns: The variables, one record per row: ambiguity, diffusion in 
+              the other segment, peripheral density, weaknesses, pressure 
+              points and the dependent diffusion. Also the periphery ties 
+              and the network density of each record.
+    """
+    # 9 Columns (from log file):
     # (0) periphery ties
     # (1) ambiguity Ai
     # (2) trial #
@@ -113,96 +173,294 @@ def runOLSRegression1997(expTrialLogFilePath,
     # (6) total # periph nodes
     # (7) # boundary weaknesses
     # (8) # boundary pressure points
-
-    # Test output path, create new output name
-    if outFilePath and isdir(outFilePath):
-        ptr = peripheralTieRange
-        ptiesStr = "{0:d}To{1:d}PTies-".format(ptr[0],ptr[1]) if ptr else ""
-        dr = densityRange
-        pdensStr = "PDensity{0:.2f}To{1:.2f}-".format(dr[0],dr[1]) if dr else ""
-        boundStr = "{0:s}Boundaries".format( "With" if withBoundaryAnalysis \
-                                         else "Without" )
-        fname = "Regression-{0:s}{1:s}{2:s}.txt".format(ptiesStr,pdensStr,
-                                                        boundStr)
-        outFilePath = pathjoin(outFilePath,fname)
-
-    # Import trial data from CSV file
-    trialLogArray = np.genfromtxt(expTrialLogFilePath, dtype=np.float,
-                                  delimiter=',')
-
+    trialLogColumn = lambda i: np.asarray(trialLog[i], dtype=np.float)
+    
     depIdx = 5 if trickleDirection=="down" else 3
     diffIndepIdx = 3 if trickleDirection=="down" else 5
-
+    
     # y is the dependent variable, the number of peripheral adopters
-    y = yorig = trialLogArray[:,depIdx]
-
-    x1 = trialLogArray[:,1] # Ambiguity
-
-    x2 = trialLogArray[:,diffIndepIdx] #/trialLogArray[:,4] # Diffusion
-
+    y = trialLogColumn(depIdx)
+    
+    x1 = trialLogColumn(1) # Ambiguity
+    
+    x2 = trialLogColumn(diffIndepIdx) #/trialLogArray[:,4] # Diffusion
+    
     # numexpr optimized version to calculate peripheral density
-    x3 = optimizedCalcPeriphDensity(trialLogArray[:,0], trialLogArray[:,4],
-                                    trialLogArray[:,6])
-
-
-    diffDepStr = "Core" if trickleDirection=="down" else "Peripheral"
-    yname = "%s diffusion" % "Peripheral" if trickleDirection=="down" else "Core"
-    xnames = ["Ambiguity", "%s diff." % diffDepStr, "Per. Dens."]
-
-    indep = [x1,x2,x3] # independent variables
-    if withBoundaryAnalysis:
-        x4 = trialLogArray[:,7] # weaknesses
-        x5 = trialLogArray[:,8] # pressure points
-        indep.extend([x4,x5])
-        xnames.extend(["Weaknesses", "Press. Pnts"])
-
-    # Begin down selecting records based on input conditions
-    pties = trialLogArray[:,0]
-    ptr0,ptr1 = peripheralTieRange if peripheralTieRange else \
-                                                (np.min(pties), np.max(pties))
-    # selecting on pties, the # peripheral ties
-    tieMask = np.ma.masked_inside(pties, ptr0, ptr1)
-
-    densA = optimizedCalcNxDensity(trialLogArray[:,0], trialLogArray[:,4],
-                           trialLogArray[:,6])
-    dr0,dr1 = densityRange if densityRange else (np.min(densA), np.max(densA))
-    # Todo: ask authors which density they used? Nx or peripheral..
-    # (originally) selecting on x3, the peripheral density independent variable
-    # selecting on densA, the network density
-    densityMask = np.ma.masked_inside(densA, dr0, dr1)
-
-    combinedMaskVals = tieMask.mask & densityMask.mask
-
-    indep = map(lambda x: x[combinedMaskVals], indep)
-    y = y[combinedMaskVals]
-    yorig = yorig[combinedMaskVals]
-
-    # ensure we didn't down select to 0 sized arrays
-    for x in indep + [y,yorig]:
-        if len(x) <= 0:
+    x3 = optimizedCalcPeriphDensity(trialLogColumn(0), trialLogColumn(4),
+                                    trialLogColumn(6))
+    
+    x4 = trialLogColumn(7) # weaknesses
+    x5 = trialLogColumn(8) # pressure points
+    
+    pties = trialLogColumn(0)
+    densA = optimizedCalcNxDensity(pties, trialLogColumn(4),
+                                   trialLogColumn(6))
+    return np.column_stack([x1,x2,x3,x4,x5,y]), pties, densA
+
+
+def uniqueRows(keys):
+    """The distinct rows of `keys`, in lexicographic order, and the index of
+    the row of each record, like ``np.unique(keys, axis=0, 
+    return_inverse=True)`` of numpy 1.13.
+    
+    :param numpy.Array keys: The key of each record, one record per row.
+    :returns: The distinct rows and the index of each record in them.
+    """
+    # sort by the first column, then the second, ... and number the runs
+    order = np.lexsort(keys.T[::-1])
+    sortedKeys = keys[order]
+    newRow = np.ones(len(keys), dtype=bool)
+    newRow[1:] = (sortedKeys[1:] != sortedKeys[:-1]).any(axis=1)
+    inverse = np.empty(len(keys), dtype=np.intp)
+    inverse[order] = np.cumsum(newRow) - 1
+    return sortedKeys[newRow], inverse
+
+
+class TrialMoments(object):
+    """The moments of the regression variables of each case, accumulated as
+    the trials are simulated.
+    
+    A `RegressionSession` runs the regressions, and writes their summaries,
+    from them instead of from the trial log. They take the same space 
+    whatever the number of trials.
+    """
+    
+    def __init__(self, trickleDirection="down"):
+        """
+        :param str trickleDirection: See `runOLSRegression1997`.
+        """
+        self.trickleDirection = trickleDirection
+        # The (periphery ties, Ai, network density), the `ols.Moments` and
+        # the extremes of the dependent variable of each run of the records
+        # of a case
+        self.keys = []
+        self.moments = []
+        self.yMin = []
+        self.yMax = []
+    
+    def writerows(self, rows):
+        """Adds trial log rows (see `disim.run1997ThresholdModel`), in the 
+        order of the log."""
+        if not rows:
+            return
+        data, pties, densA = regressionVariables(
+                                    [np.array(c, dtype=np.float) 
+                                     for c in zip(*rows)],
+                                    self.trickleDirection)
+        keys = np.column_stack([pties, data[:,0], densA])
+        breaks = np.flatnonzero((keys[1:] != keys[:-1]).any(axis=1)) + 1
+        for run in np.split(np.arange(len(data)), breaks):
+            key = tuple(keys[run[0]])
+            if not self.keys or self.keys[-1] != key:
+                self.keys.append(key)
+                self.moments.append(Moments(data.shape[1]))
+                self.yMin.append(np.inf)
+                self.yMax.append(-np.inf)
+            self.moments[-1].update(data[run])
+            self.yMin[-1] = min(self.yMin[-1], data[run,5].min())
+            self.yMax[-1] = max(self.yMax[-1], data[run,5].max())
+
+
+class RegressionSession(object):
+    """The regressions of `runOLSRegression1997` over one trial log.
+    
+    The log is loaded once, and the variables of the regressions, the 
+    density columns and the record selections of each tie and density range
+    are computed once and shared by all the regressions of the session.
+    
+    The regressions are solved in closed form from the cross products of 
+    the variables within each case, computed once per session (see `ols`),
+    so a regression does not go back to the records unless its summary is
+    written.
+    """
+    
+    def __init__(self, trialLog, trickleDirection="down"):
+        """
+        :param trialLog: The path of the trial log, CSV or binary (see 
+                         `triallog`), its columns as loaded by 
+                         `triallog.loadTrialLog`, or the `TrialMoments` 
+                         accumulated in place of the log.
+        :param str trickleDirection: See `runOLSRegression1997`.
+        """
+        diffDepStr = "Core" if trickleDirection=="down" else "Peripheral"
+        self.yname = "%s diffusion" % "Peripheral" \
+                     if trickleDirection=="down" else "Core"
+        self.xnames = ["Ambiguity", "%s diff." % diffDepStr, "Per. Dens."]
+        self.boundaryXnames = ["Weaknesses", "Press. Pnts"]
+        self.masks = {}
+        
+        if isinstance(trialLog, TrialMoments):
+            assert(trialLog.trickleDirection == trickleDirection)
+            # There are no records, only the moments of each run of the 
+            # records of a case, in the order of the log.
+            self.data = None
+            self.moments = trialLog.moments
+            caseKeys = np.array(trialLog.keys, dtype=np.float).reshape(-1, 3)
+            self.casePties, self.caseAi, self.caseDensity = caseKeys.T
+            crossProducts = [m.crossProducts() for m in self.moments]
+            self.caseStats = (np.array([cp.n for cp in crossProducts], 
+                                       dtype=np.float),
+                              np.array([cp.mean for cp in crossProducts]),
+                              np.array([cp.cross for cp in crossProducts]))
+            self.caseYMin = np.array(trialLog.yMin)
+            self.caseYMax = np.array(trialLog.yMax)
+            return
+        
+        # Import trial data from the log file
+        if isinstance(trialLog, basestring):
+            trialLog = loadTrialLog(trialLog)
+        self.data, self.pties, self.densA = regressionVariables(trialLog,
+                                                        trickleDirection)
+        self.y = self.data[:,5]
+        self.indep = [self.data[:,i] for i in xrange(3)]
+        self.boundaryIndep = [self.data[:,3], self.data[:,4]]
+        
+        # The records of a case (the same ties, ambiguity and density) are
+        # always selected together, so the regressions are solved from the
+        # cross products of the variables within each case (see `ols`).
+        caseKeys, self.caseOf = uniqueRows(np.column_stack([self.pties, 
+                                                            self.data[:,0],
+                                                            self.densA]))
+        self.casePties, self.caseAi, self.caseDensity = caseKeys.T
+        self.caseStats = groupCrossProducts(self.data, self.caseOf,
+                                            len(caseKeys))
+        order = np.argsort(self.caseOf, kind="mergesort")
+        starts = np.searchsorted(self.caseOf[order], 
+                                 np.arange(len(caseKeys)))
+        self.caseYMin = np.minimum.reduceat(self.y[order], starts) \
+                        if len(order) else np.zeros(0)
+        self.caseYMax = np.maximum.reduceat(self.y[order], starts) \
+                        if len(order) else np.zeros(0)
+    
+    def mask(self, peripheralTieRange=None, densityRange=None):
+        """The selection of the records within the tie and density ranges 
+        (see `runOLSRegression1997`), computed once per pair of ranges."""
+        key = (peripheralTieRange, densityRange)
+        if key not in self.masks:
+            self.masks[key] = selectRanges(self.pties, self.densA, 
+                                           peripheralTieRange, densityRange)
+        return self.masks[key]
+    
+    def caseMask(self, peripheralTieRange=None, densityRange=None):
+        """The selection of the cases within the tie and density ranges
+        (see `runOLSRegression1997`).
+
+        The ranges default to those of the whole log, as in `mask`."""
+        ptr = peripheralTieRange if peripheralTieRange else \
+                            (np.min(self.casePties), np.max(self.casePties))
+        dr = densityRange if densityRange else \
+                        (np.min(self.caseDensity), np.max(self.caseDensity))
+        return selectRanges(self.casePties, self.caseDensity, ptr, dr)
+    
+    def variables(self, withBoundaryAnalysis=False):
+        """The (regressors, dependent variable) indices of the columns of 
+        `data` in a regression, and the names of the regressors."""
+        if withBoundaryAnalysis:
+            return range(5), 5, self.xnames + self.boundaryXnames
+        return range(3), 5, list(self.xnames)
+    
+    def regressCases(self, caseSelections, withBoundaryAnalysis=False):
+        """Runs the regressions of many selections of cases at once.
+
+        For example, with ``values = np.unique(session.caseAi)``, 
+        ``session.regressCases([session.caseAi == Ai for Ai in values])``
+        fits one regression per ambiguity.
+
+        :param caseSelections: One array of booleans per regression, 
+                               selecting the cases (`casePties`, `caseAi`,
+                               `caseDensity`) of its records.
+        :param bool withBoundaryAnalysis: See `runOLSRegression1997`.
+        :returns: The `ols.OLSFit` of each regression, or None for the 
+                  regressions without records.
+        """
+        caseSelections = np.asarray(caseSelections, dtype=bool)
+        if len(caseSelections) == 0:
+            return []
+        xIdx, yIdx = self.variables(withBoundaryAnalysis)[:2]
+        n, mean, cross = combineGroups(*(self.caseStats+(caseSelections,)))
+        fits = fitStandardized(n, cross, xIdx, yIdx)
+        return [fit if nobs > 0 else None for fit, nobs in zip(fits, n)]
+    
+    def regress(self, peripheralTieRange=(0,185), densityRange=None,
+                withBoundaryAnalysis=False, outFilePath=None):
+        """Runs one regression of the session. The parameters and the 
+        return value are those of `runOLSRegression1997`, with the fit an
+        `ols.OLSFit`."""
+        # Test output path, create new output name
+        if outFilePath and isdir(outFilePath):
+            outFilePath = pathjoin(outFilePath, 
+                                   regressionFileName(peripheralTieRange, 
+                                                      densityRange,
+                                                      withBoundaryAnalysis))
+        
+        xIdx, yIdx, xnames = self.variables(withBoundaryAnalysis)
+        
+        selection = self.caseMask(peripheralTieRange, densityRange)
+        # ensure we didn't down select to 0 records
+        if not selection.any():
             return None
-
-    # standardize all coefficients
-    indep = map(standardizeCoeff, indep)
-    y = standardizeCoeff(y)
-
-    # X represents the independent control variables
-    X = np.array(indep, dtype=np.float).transpose()
-
-    #olsRegression = sm.OLS(y,X)
-    olsRegression = linear_model.OLS(y,X)
-    olsFit = olsRegression.fit()
-    regstats = (olsFit, (np.mean(yorig), np.std(yorig), np.min(yorig),
-                         np.max(yorig)))
-
-    if outFilePath != None:
-        with file(outFilePath, 'w') as outFileP:
-            outFileP.write("Regression Summary\n")
-            outFileP.write(olsFit.summary(yname=yname, xname=xnames))
-            outFileP.write("\nMean: %f\nStdDev: %f\nMin: %f\nMax: %f\n" % \
-                           (regstats[1]) )
-
-    return regstats
+        n, mean, cross = combineGroups(*(self.caseStats+(selection,)))
+        olsFit = fitStandardized(n, cross, xIdx, yIdx)[0]
+        regstats = (olsFit, (mean[0,yIdx], np.sqrt(cross[0,yIdx,yIdx]/n[0]),
+                             np.min(self.caseYMin[selection]), 
+                             np.max(self.caseYMax[selection])))
+        
+        if outFilePath != None:
+            if self.data is None:
+                residualStats = momentResidualStatistics(
+                            [self.moments[i] for i in np.flatnonzero(selection)],
+                            olsFit, xIdx, yIdx, mean[0], 
+                            np.sqrt(np.diag(cross[0])/(n[0]-1)))
+            else:
+                data = self.data[self.mask(peripheralTieRange, densityRange)]
+                residualStats = residualStatistics(
+                            standardizedResiduals(data, olsFit, xIdx, yIdx))
+            with file(outFilePath, 'w') as outFileP:
+                outFileP.write("Regression Summary\n")
+                outFileP.write(olsSummary(olsFit, residualStats, self.yname, 
+                                          xnames))
+                outFileP.write("\nMean: %f\nStdDev: %f\nMin: %f\nMax: %f\n" % \
+                               (regstats[1]) )
+        
+        return regstats
+    
+    def regressAll(self, conditions, outFilePath=None, workers=1):
+        """Runs the regressions of all `conditions`.
+        
+        :param conditions: The (peripheral tie range, density range, with 
+                           boundary analysis) of each regression.
+        :param str outFilePath: See `runOLSRegression1997`.
+        :param int workers: The number of processes running the 
+                            regressions. With more than one, the summary
+                            files are written by the worker processes and 
+                            the regression results are not returned.
+        :returns: The list of the results of `regress` for each condition,
+                  if run in this process.
+        """
+        conditions = list(conditions)
+        if workers <= 1:
+            return [self.regress(ptr, dr, withBoundaryAnalysis, outFilePath)
+                    for ptr, dr, withBoundaryAnalysis in conditions]
+        
+        # the forked workers inherit the session
+        global _WORKER_SESSION
+        _WORKER_SESSION = self
+        pool = Pool(workers)
+        try:
+            pool.map(_regressInWorker, [cond + (outFilePath,) 
+                                        for cond in conditions])
+        finally:
+            pool.close()
+            pool.join()
+            _WORKER_SESSION = None
+
+# The session of `RegressionSession.regressAll` in its worker processes
+_WORKER_SESSION = None
+
+def _regressInWorker(args):
+    "Runs one regression of `RegressionSession.regressAll` in a worker."
+    ptr, dr, withBoundaryAnalysis, outFilePath = args
+    _WORKER_SESSION.regress(ptr, dr, withBoundaryAnalysis, outFilePath)
 
 def possibleTies(numberOfNodes, numCoreNodes):
     """ Calculates the max number of ties for a network with given node
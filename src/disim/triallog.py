@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Storage of the experiment trial log.
+
+Besides the original CSV layout, the trial log can be stored in a binary
+columnar format: a directory holding one file of fixed-width, typed values
+per column and a manifest (``columns.txt``) listing the column names and
+types. Rows are buffered and appended to the column files in chunks, and the
+columns are read back as memory maps, so loading a log does not parse it.
+
+The columns are those of the CSV trial log (see
+`disim.run1997ThresholdModel`), optionally followed by the extra pressure
+point columns.
+
+:Author: Christopher Kirkos
+
+Implementation
+--------------
+"""
+
+from __future__ import division
+
+import csv
+import numpy as np
+from os import makedirs
+from os.path import isdir, exists, getsize, join as pathjoin
+from checkpoint import syncFile, reopenFile
+
+# The columns of the trial log, (name, type)
+TRIAL_LOG_COLUMNS = [("pties", "<i4"), ("Ai", "<f8"), ("trial", "<i4"),
+                     ("coreAdopters", "<i4"), ("coreNodes", "<i4"),
+                     ("periphAdopters", "<i4"), ("periphNodes", "<i4"),
+                     ("weaknesses", "<i4"), ("pressurePoints", "<i4")]
+
+# The file extension of binary trial logs
+BINARY_EXT = ".cols"
+
+MANIFEST = "columns.txt"
+
+def trialLogColumns(numExtraColumns=0, integralAi=False):
+    """The columns of a trial log with `numExtraColumns` additional pressure
+    point columns.
+
+    :param bool integralAi: Whether the ambiguity levels are integers, 
+                            stored as such, as they are written to the CSV
+                            log (see `trialLogToCSV`).
+    """
+    columns = [(name, "<i4" if name == "Ai" and integralAi else dtype)
+               for name, dtype in TRIAL_LOG_COLUMNS]
+    return columns + [("pressurePoints%d" % i, "<i4")
+                      for i in xrange(numExtraColumns)]
+
+def isBinaryTrialLog(path):
+    "Whether `path` is a binary columnar trial log."
+    return isdir(path) and exists(pathjoin(path, MANIFEST))
+
+
+class BinaryTrialLogWriter(object):
+    """Writes a binary columnar trial log.
+
+    Has the `writerows` method of a `csv.writer`, so the simulation writes
+    either format the same way.
+    """
+
+    def __init__(self, path, columns=TRIAL_LOG_COLUMNS, chunkRows=65536,
+                 resumeAt=None):
+        """
+        :param str path: The directory of the log, created if needed. An
+                         existing log in it is overwritten.
+        :param list columns: The (name, type) of each column.
+        :param int chunkRows: The number of rows buffered between writes.
+        :param resumeAt: The position returned by `checkpoint` from which 
+                         to continue an existing log, or None.
+        """
+        if not exists(path):
+            makedirs(path)
+        self.path = path
+        self.columns = columns
+        self.chunkRows = chunkRows
+        self.rows = []
+        with file(pathjoin(path, MANIFEST), "w") as manifest:
+            for name, dtype in columns:
+                manifest.write("%s %s\n" % (name, dtype))
+        if resumeAt is None:
+            self.files = [file(pathjoin(path, name+".bin"), "wb")
+                          for name, dtype in columns]
+            self.numRows = 0
+        else:
+            self.files = [reopenFile(pathjoin(path, name+".bin"),
+                                     resumeAt*np.dtype(dtype).itemsize)
+                          for name, dtype in columns]
+            self.numRows = resumeAt
+
+    def writerow(self, row):
+        "Append one row."
+        self.rows.append(row)
+        if len(self.rows) >= self.chunkRows:
+            self.flush()
+
+    def writerows(self, rows):
+        "Append the rows of `rows`."
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        "Write the buffered rows to the column files."
+        if not self.rows:
+            return
+        for values, (name, dtype), fp in zip(zip(*self.rows), self.columns,
+                                             self.files):
+            np.array(values, dtype=dtype).tofile(fp)
+            fp.flush()
+        self.numRows += len(self.rows)
+        self.rows = []
+
+    def checkpoint(self):
+        """Writes the buffered rows and syncs the column files to disk.
+
+        :returns: The number of rows written, from which the log can be 
+                  continued (see `resumeAt`).
+        """
+        self.flush()
+        for fp in self.files:
+            syncFile(fp)
+        return self.numRows
+
+    def close(self):
+        self.flush()
+        for fp in self.files:
+            fp.close()
+
+
+class CSVTrialLogWriter(object):
+    "Writes a trial log in the CSV layout."
+
+    def __init__(self, path, resumeAt=None):
+        """
+        :param str path: The CSV file, overwritten if it exists.
+        :param resumeAt: The position returned by `checkpoint` from which 
+                         to continue an existing log, or None.
+        """
+        self.fp = file(path, "w") if resumeAt is None \
+                  else reopenFile(path, resumeAt)
+        self.writer = csv.writer(self.fp)
+
+    def writerows(self, rows):
+        self.writer.writerows(rows)
+
+    def checkpoint(self):
+        """Syncs the log to disk.
+
+        :returns: The size of the log, from which it can be continued.
+        """
+        return syncFile(self.fp)
+
+    def close(self):
+        self.fp.close()
+
+
+def openTrialLog(path, binary=False, numExtraColumns=0, resumeAt=None,
+                 integralAi=False):
+    """Opens a trial log for writing, in the binary columnar format or as
+    CSV.
+
+    :param bool integralAi: Whether the ambiguity levels of the run are 
+                            integers (see `trialLogColumns`).
+    :param resumeAt: The position returned by the `checkpoint` method of 
+                     the writer from which to continue the log, or None to
+                     start a new log.
+    :returns: A writer with the methods `writerows`, `checkpoint` and 
+              `close`.
+    """
+    if binary:
+        return BinaryTrialLogWriter(path, trialLogColumns(numExtraColumns,
+                                                          integralAi),
+                                    resumeAt=resumeAt)
+    return CSVTrialLogWriter(path, resumeAt)
+
+def readManifest(path):
+    "The (name, type) of the columns of the binary trial log `path`."
+    with file(pathjoin(path, MANIFEST)) as manifest:
+        return [tuple(line.split()) for line in manifest if line.strip()]
+
+def loadTrialLog(path):
+    """Loads a trial log, binary or CSV.
+
+    The columns of a binary log are memory-mapped, not read. A CSV log is
+    parsed into floats.
+
+    :param str path: The path of the log.
+    :returns: A list of the columns, one 1-D array each.
+    """
+    if not isBinaryTrialLog(path):
+        trialLogArray = np.genfromtxt(path, dtype=np.float, delimiter=',')
+        return list(np.atleast_2d(trialLogArray).T)
+
+    columns = []
+    for name, dtype in readManifest(path):
+        columnPath = pathjoin(path, name+".bin")
+        if getsize(columnPath) == 0:
+            # (an empty file cannot be mapped)
+            columns.append(np.zeros(0, dtype=dtype))
+        else:
+            columns.append(np.memmap(columnPath, dtype=dtype, mode="r"))
+    return columns
+
+def trialLogToCSV(path, csvPath, chunkRows=65536):
+    """Converts the binary trial log `path` to the CSV file `csvPath`.
+
+    The values are written as the simulation writes them, by the type of
+    their column: ints for the integer columns and floats for the others.
+    """
+    columns = loadTrialLog(path)
+    numRows = len(columns[0]) if columns else 0
+    with file(csvPath, "w") as fp:
+        writer = csv.writer(fp)
+        for start in xrange(0, numRows, chunkRows):
+            # (tolist converts the values to Python ints or floats)
+            writer.writerows(zip(*[c[start:start+chunkRows].tolist() 
+                                   for c in columns]))
+
+def csvToTrialLog(csvPath, path):
+    """Converts the CSV trial log `csvPath` to the binary trial log `path`.
+    Columns beyond the standard ones are taken as extra pressure point
+    columns."""
+    # a first pass finds the number of columns, and whether the Ai column
+    # only holds integers
+    numColumns, integralAi = len(TRIAL_LOG_COLUMNS), True
+    with file(csvPath) as fp:
+        for row in csv.reader(fp):
+            numColumns = len(row)
+            integralAi = integralAi and row[1].lstrip("-").isdigit()
+    writer = BinaryTrialLogWriter(path, trialLogColumns(
+                        numColumns - len(TRIAL_LOG_COLUMNS), integralAi))
+    with file(csvPath) as fp:
+        writer.writerows([float(v) for v in row] for row in csv.reader(fp))
+    writer.close()
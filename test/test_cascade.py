@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''
+:author: Christopher Kirkos
+
+The array-backed cascade engines must reproduce the results of the original
+networkx simulation loop. These tests run both on the same generated networks
+and random number streams and compare the outcome of each trial.
+'''
+from __future__ import division
+
+import random
+import numpy as np
+from disim.disim import runTrialNx, runTrialCSR, runTrialsBatch, runCaseBlock
+from disim.cascade import CSRTopology, applyTrialState, frontierCascade, \
+                          closureCascade, verifyCascade, \
+                          referenceCascade, sweepCascade, \
+                          adoptionThresholds, NEVER_ADOPT, \
+                          influenceFromRounds, criticalAmbiguities, \
+                          countWeaknessesAndPressurePoints, \
+                          IncrementalCascade
+from nose.tools import raises
+from disim.graphgen import generateARCorePeriph, NestedCorePeriphSweep, \
+                           periphTieFromIndex
+from disim.graphsearch import findWeaknessesAndPressurePoints
+
+
+def compareTrialEngines(numCore, numPeriph, pties, Ai, trickleDirection):
+    random.seed(pties*10+Ai)
+    Gorig = generateARCorePeriph(numCore, numPeriph, pties)
+    topo = CSRTopology(Gorig)
+    targetSegment = 'periphery' if trickleDirection=="down" else "core"
+
+    for trial in range(5):
+        state = random.getstate()
+        I, A, adopted, influence = runTrialCSR(topo, Ai, trickleDirection,
+                                               recordInfluence=True)
+        nextCSR = random.random()
+        random.setstate(state)
+        G = runTrialNx(Gorig, Ai, trickleDirection)
+        # both engines leave the random stream in the same state
+        assert(random.random() == nextCSR)
+
+        Gcsr = applyTrialState(Gorig.copy(), topo, I, A, adopted, influence)
+        for node in G.nodes():
+            assert(G.node[node]['I'] == Gcsr.node[node]['I'])
+            assert(G.node[node]['adopted'] == Gcsr.node[node]['adopted'])
+            # (neighbor order may differ between copies of a graph)
+            assert(sorted(G.node[node]['influence']) == \
+                   sorted(Gcsr.node[node]['influence']))
+
+        w, pp = findWeaknessesAndPressurePoints(G, targetSegment=targetSegment,
+                                                ignoreCache=True)
+        assert((len(w), len(pp)) == countWeaknessesAndPressurePoints(topo,
+                                        I, A, targetSegment=targetSegment))
+
+
+def testSweepCascadeMatchesNx():
+    for pties in (0, 5, 40, 150, 300):
+        for Ai in (1, 3, 5):
+            for trickleDirection in ("down", "up"):
+                yield compareTrialEngines, 10, 21, pties, Ai, trickleDirection
+
+
+def compareFrontierCascade(numCore, numPeriph, pties, Ai, trickleDirection):
+    random.seed(pties*10+Ai)
+    topo = CSRTopology(generateARCorePeriph(numCore, numPeriph, pties))
+
+    for trial in range(5):
+        state = random.getstate()
+        I, A, adopted, influence = runTrialCSR(topo, Ai, trickleDirection,
+                                               recordInfluence=True)
+        random.setstate(state)
+        I2, A2, adopted2, influence2 = runTrialCSR(topo, Ai, trickleDirection,
+                                            recordInfluence=True,
+                                            cascade=frontierCascade)
+        assert((I == I2).all())
+        assert((adopted == adopted2).all())
+        for i in range(topo.n):
+            # influences are adopted neighbors, recorded once per adopter
+            assert(set(influence2[i]) <= set(topo.neighbors(i).tolist()))
+            assert(all(adopted2[influence2[i]]))
+
+
+def testFrontierCascadeMatchesSweep():
+    for pties in (0, 5, 40, 150, 300):
+        for Ai in (1, 3, 5):
+            for trickleDirection in ("down", "up"):
+                yield compareFrontierCascade, 10, 21, pties, Ai, \
+                                            trickleDirection
+
+
+def checkClosureCascade(numCore, numPeriph, pties, Ai, trickleDirection):
+    random.seed(pties*10+Ai)
+    topo = CSRTopology(generateARCorePeriph(numCore, numPeriph, pties))
+    for trial in range(5):
+        # verify=True raises if the adopters differ from the original loop
+        runTrialCSR(topo, Ai, trickleDirection, cascade=closureCascade,
+                    verify=True)
+
+
+def testClosureCascadeMatchesSweep():
+    for pties in (0, 5, 40, 150, 300):
+        for Ai in (1, 3, 5):
+            for trickleDirection in ("down", "up"):
+                yield checkClosureCascade, 10, 21, pties, Ai, trickleDirection
+
+
+@raises(AssertionError)
+def testVerifyCascadeDetectsMismatch():
+    random.seed(1)
+    topo = CSRTopology(generateARCorePeriph(3, 6, 10))
+    I, A, adopted, influence = runTrialCSR(topo, 1, "down")
+    initialAdopted = adopted.copy()
+    initialAdopted[:] = False
+    verifyCascade(topo, I, A, initialAdopted, ~adopted)
+
+
+def testReferenceCascadeMatchesNx():
+    random.seed(7)
+    Gorig = generateARCorePeriph(10, 21, 40)
+    topo = CSRTopology(Gorig)
+    for trial in range(5):
+        state = random.getstate()
+        I, A, adopted, influence = runTrialCSR(topo, 3, "down",
+                                               recordInfluence=True,
+                                               cascade=referenceCascade)
+        random.setstate(state)
+        G = runTrialNx(Gorig, 3, "down")
+        Gref = applyTrialState(Gorig.copy(), topo, I, A, adopted, influence)
+        for node in G.nodes():
+            assert(G.node[node]['adopted'] == Gref.node[node]['adopted'])
+            assert(sorted(G.node[node]['influence']) == \
+                   sorted(Gref.node[node]['influence']))
+
+
+@raises(AssertionError)
+def testVerifyCascadeDetectsThresholdError():
+    # B_i,k is exactly 0 at k=2, which is not enough to adopt: a threshold
+    # of 2 instead of 3 makes node 1 adopt
+    topo = CSRTopology(generateARCorePeriph(3, 0, 0))
+    I = np.array([1.0, -2.0/3, 1.0])
+    A = np.ones(3)
+    initialAdopted = np.array([True, False, True])
+    adopted = sweepCascade(topo, I, A, initialAdopted.copy())
+    assert(not adopted[1])
+    adopted[1] = True
+    verifyCascade(topo, I, A, initialAdopted, adopted)
+
+
+def testAdoptionThresholds():
+    N = 10
+    # include profits where -I*N/A is exactly an integer: B_i,k == 0 there,
+    # which is not enough to adopt
+    I = np.array([0.5, 0.0, -0.5, -0.3, -1.0, -2.0, -0.7, -3.0, -1.2, -0.1])
+    A = np.array([1.0, 1.0, 1.0,   3.0,  2.0,  1.0,  0.0,  5.0,  5.0,  0.0])
+    degree = np.array([9, 9, 9, 9, 9, 9, 9, 5, 9, 9])
+    T = adoptionThresholds(I, A, N, degree)
+    for i in range(N):
+        ks = [k for k in range(N) if I[i] + (A[i] * (k/N)) > 0]
+        expected = ks[0] if ks and ks[0] <= degree[i] else NEVER_ADOPT
+        assert(T[i] == expected)
+    assert(list(T[:3]) == [0, 1, 6])
+
+
+def checkBatchCascade(numCore, numPeriph, pties, Ai, trickleDirection):
+    np.random.seed(pties*10+Ai)
+    topo = CSRTopology(generateARCorePeriph(numCore, numPeriph, pties))
+    I, A, adopted, rounds = runTrialsBatch(topo, Ai, trickleDirection, 20)
+    wBatch, ppBatch = countWeaknessesAndPressurePoints(topo, I, A)
+    for t in range(20):
+        verifyCascade(topo, I[t], A[t], rounds[t] == 0, adopted[t])
+        assert((rounds[t] >= 0).tolist() == adopted[t].tolist())
+        assert((wBatch[t], ppBatch[t]) == \
+               countWeaknessesAndPressurePoints(topo, I[t], A[t]))
+        influence = influenceFromRounds(topo, rounds[t])
+        for a in np.flatnonzero(rounds[t] > 0):
+            # the round a node adopts in is one after its latest influence
+            assert(rounds[t][a] == max(rounds[t][influence[a]]) + 1 \
+                   if influence[a] else rounds[t][a] == 1)
+
+
+def testBatchCascadeMatchesSweep():
+    for pties in (0, 5, 40, 150, 300):
+        for Ai in (1, 3, 5):
+            for trickleDirection in ("down", "up"):
+                yield checkBatchCascade, 10, 21, pties, Ai, trickleDirection
+
+
+def checkCommonRandomNumbers(pties, engine, trickleDirection):
+    results = runCaseBlock((pties, (1, 2, 3, 4, 5)), commonRandomNumbers=True,
+                           trickleDirection=trickleDirection, numberOfNodes=13,
+                           trials=10, engine=engine, seed=pties)
+    for (rows, caseRow), (nextRows, nextCaseRow) in zip(results, results[1:]):
+        for row, nextRow in zip(rows, nextRows):
+            # same network, profits and seed node: a higher Ai only adds
+            # bandwagon pressure, so it never has fewer adopters
+            assert(row[3] <= nextRow[3] and row[5] <= nextRow[5])
+        assert(caseRow[1] == nextCaseRow[1])
+
+
+def testCommonRandomNumbers():
+    for pties in (0, 10, 40):
+        for engine in ("nx", "csr", "batch"):
+            for trickleDirection in ("down", "up"):
+                yield checkCommonRandomNumbers, pties, engine, trickleDirection
+
+
+def checkCriticalAmbiguities(numCore, numPeriph, pties):
+    np.random.seed(pties)
+    random.seed(pties)
+    topo = CSRTopology(generateARCorePeriph(numCore, numPeriph, pties))
+    for trial in range(5):
+        I = np.random.normal(-1, 1, topo.n)
+        seedNode = np.random.randint(topo.n)
+        critical = criticalAmbiguities(topo, I, seedNode)
+        assert(critical[seedNode] == -np.inf)
+        for Ai in (0, 0.5, 1, 2, 3, 4, 5, 7.5, 20, 100):
+            initialAdopted = np.zeros(topo.n, dtype=bool)
+            initialAdopted[seedNode] = True
+            verifyCascade(topo, I, np.repeat(float(Ai), topo.n),
+                          initialAdopted, critical < Ai)
+
+
+def testCriticalAmbiguitiesMatchSweep():
+    for pties in (0, 5, 40, 150, 300):
+        yield checkCriticalAmbiguities, 10, 21, pties
+
+
+def checkIncrementalCascade(numCore, numPeriph, Ai, trickleDirection):
+    np.random.seed(Ai)
+    targetSegment = 'periphery' if trickleDirection=="down" else "core"
+    sweep = NestedCorePeriphSweep(numCore, numPeriph, seed=Ai)
+    topo = CSRTopology(sweep.graph(0))
+    A = np.repeat(Ai, topo.n)
+    for trial in range(3):
+        I = np.random.normal(-1, 1, topo.n)
+        seedNode = np.random.randint(topo.n)
+        cascade = IncrementalCascade(topo, I, A, seedNode,
+                                     targetSegment=targetSegment)
+        for pties, idx in enumerate(sweep.order[:200]):
+            if pties % 20 == 0:
+                caseTopo = CSRTopology(sweep.graph(pties))
+                adopted = np.zeros(topo.n, dtype=bool)
+                adopted[seedNode] = True
+                closureCascade(caseTopo, I, A, adopted)
+                assert((adopted == cascade.adopted).all())
+                assert(cascade.numCoreAdopters == \
+                       np.count_nonzero(adopted & topo.isCore))
+                assert(cascade.numPeriphAdopters == \
+                       np.count_nonzero(adopted & ~topo.isCore))
+                assert((cascade.numWeaknesses, cascade.numPPoints) == \
+                       countWeaknessesAndPressurePoints(caseTopo, I, A,
+                                            targetSegment=targetSegment))
+            cascade.addTie(*[topo.index[a] for a in
+                             periphTieFromIndex(idx, numCore, numPeriph)])
+
+
+def testIncrementalCascadeMatchesClosure():
+    for Ai in (1, 3, 5):
+        for trickleDirection in ("down", "up"):
+            yield checkIncrementalCascade, 10, 21, Ai, trickleDirection
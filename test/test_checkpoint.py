@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''
+:author: Christopher Kirkos
+
+A run interrupted after a checkpoint and resumed must produce the same
+output as an uninterrupted run.
+'''
+
+import shutil
+import tempfile
+from os import listdir
+from os.path import join as pathjoin
+from itertools import count
+from disim import disim
+from disim.disim import run1997ThresholdModel, loadRunManifest
+from disim.triallog import isBinaryTrialLog, loadTrialLog
+from disim.checkpoint import atomicWrite, loadCheckpoint, saveCheckpoint
+
+
+class Interrupted(Exception):
+    pass
+
+
+def runOutputs(outFilePath):
+    "The logs and regression summaries of a run, without their dates."
+    outputs = {}
+    for name in listdir(outFilePath):
+        path = pathjoin(outFilePath, name)
+        if isBinaryTrialLog(path):
+            outputs[name] = [c.tolist() for c in loadTrialLog(path)]
+        elif name.endswith((".csv", ".dot", ".index")) or \
+                name.startswith("Regression"):
+            outputs[name] = [line for line in open(path) if
+                             "Date:" not in line and "Time:" not in line]
+    return outputs
+
+
+def interruptedRun(outFilePath, numCases, **runArgs):
+    "Runs until the case `numCases` fails, with a checkpoint after each case."
+    runCase = disim.runCase
+    calls = count()
+    def interruptingRunCase(*args, **kwargs):
+        if next(calls) == numCases:
+            raise Interrupted()
+        return runCase(*args, **kwargs)
+    disim.runCase = interruptingRunCase
+    try:
+        run1997ThresholdModel(outFilePath=outFilePath, checkpointInterval=0,
+                              **runArgs)
+        assert(False)
+    except Interrupted:
+        pass
+    finally:
+        disim.runCase = runCase
+
+
+def checkResume(runArgs):
+    runArgs = dict(dict(trickleDirection="down", numberOfNodes=13, trials=4,
+                        ambiguityLevels=[1, 2.5, 4]), **runArgs)
+    base = tempfile.mkdtemp()
+    try:
+        interrupted = pathjoin(base, "interrupted")
+        interruptedRun(interrupted, 7, **runArgs)
+        assert(loadCheckpoint(pathjoin(interrupted,
+                                       disim.CHECKPOINT))['cases'] == 6)
+        # output written after the checkpoint, discarded when resuming
+        for name in listdir(interrupted):
+            if name.endswith(".csv"):
+                open(pathjoin(interrupted, name), "a").write("1,2,3\n")
+        run1997ThresholdModel(outFilePath=interrupted, resume=True,
+                              **runArgs)
+
+        seed = loadRunManifest(interrupted)['seed']
+        full = pathjoin(base, "full")
+        run1997ThresholdModel(outFilePath=full, **dict(runArgs, seed=seed))
+        outputs = runOutputs(full)
+        assert(len(outputs) >= 3 and runOutputs(interrupted) == outputs)
+    finally:
+        shutil.rmtree(base)
+
+
+def testResume():
+    for runArgs in (dict(engine="csr", seed=3),
+                    dict(engine="csr"),
+                    dict(engine="batch", seed=4, binaryTrialLog=True,
+                         streamRegression=True),
+                    dict(engine="parametric", seed=5, trialLog=False),
+                    dict(engine="nx", seed=6, dots="wpp", dotArchive=True,
+                         nestedSweep=True)):
+        yield checkResume, runArgs
+
+
+def testAtomicWrite():
+    base = tempfile.mkdtemp()
+    try:
+        path = pathjoin(base, "state")
+        assert(loadCheckpoint(path) is None)
+        saveCheckpoint(path, {"cases":3})
+        atomicWrite(path + ".txt", "done")
+        assert(loadCheckpoint(path) == {"cases":3})
+        assert(sorted(listdir(base)) == ["state", "state.txt"])
+    finally:
+        shutil.rmtree(base)
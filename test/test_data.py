@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''
+:author: Christopher Kirkos
+
+The running statistics of `Data` must match those computed from all the
+samples, however they are added and merged.
+'''
+from __future__ import division
+
+import numpy as np
+from disim.data import Data
+
+
+def checkStatistics(data, values):
+    assert(data.N == len(values))
+    assert(np.allclose(data.average, np.mean(values), rtol=1e-12, atol=0))
+    assert(np.allclose(data.variance, np.var(values, ddof=1), rtol=1e-6))
+    assert(data.min == np.min(values) and data.max == np.max(values))
+
+
+def testAddDatum():
+    rs = np.random.RandomState(1)
+    # a large offset: the variance is lost in sum2 - N*avg**2
+    for values in (rs.normal(1e9, 1, 10000), rs.uniform(-5, -1, 100)):
+        data = Data()
+        for v in values:
+            data.addDatum(v)
+        checkStatistics(data, values)
+
+
+def testAddDataAndMerge():
+    rs = np.random.RandomState(2)
+    values = rs.normal(-3, 2, 1000)
+    batched = Data()
+    for start in xrange(0, 1000, 64):
+        batched.addData(values[start:start+64])
+    checkStatistics(batched, values)
+
+    # partial statistics, as computed by separate workers
+    parts = [Data() for i in range(3)]
+    for i, v in enumerate(values):
+        parts[i % 3].addDatum(v)
+    merged = Data()
+    for part in parts:
+        merged.merge(part)
+    checkStatistics(merged, values)
+    checkStatistics(merged.merge(Data()), values)
+
+
+def testEmpty():
+    data = Data()
+    data.addData([])
+    assert(data.N == 0 and data.average == 0.0 and data.variance == 0.0)
+
+
+def testHistogram():
+    rs = np.random.RandomState(3)
+    values = rs.uniform(0, 1, 20000)
+    bins = np.linspace(0.1, 0.9, 81)
+    data, other = Data(bins), Data(bins)
+    data.addData(values[:10000])
+    for v in values[10000:]:
+        other.addDatum(v)
+    data.merge(other)
+    assert(data.counts.sum() == 20000)
+    for q in (0, 0.05, 0.25, 0.5, 0.9, 1):
+        assert(abs(data.quantile(q) - np.percentile(values, q*100)) < 0.02)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''
+:author: Christopher Kirkos
+
+The DOT document of a trial must hold every tie and influence of the trial
+once, and a document of a DOT archive must be read back unchanged.
+'''
+
+import re
+import random
+import shutil
+import tempfile
+from os import listdir
+from os.path import join as pathjoin
+import numpy as np
+from disim.graphgen import generateARCorePeriph
+from disim.cascade import CSRTopology, TrialState, sweepCascade, \
+                          applyTrialState, graphTrialState
+from disim.graphsearch import boundaryMasks
+from disim.dotwriter import adoptionNetworkDot, quoteID, DotArchiveWriter, \
+                            DotArchive, isDotArchive
+from disim.disim import run1997ThresholdModel
+
+
+def trialState(pties, seed):
+    random.seed(seed)
+    G = generateARCorePeriph(4, 8, pties)
+    topo = CSRTopology(G)
+    rs = np.random.RandomState(seed)
+    state = TrialState(topo, 2, recordInfluence=True)
+    state.reset(rs.normal(0, 1, topo.n), 0)
+    sweepCascade(topo, state.I, state.A, state.adopted, state.influence)
+    weak, ppoint = boundaryMasks(topo.adjacency, topo.segmentMask('periphery'),
+                                 state.I, state.A)
+    return G, topo, state, weak, ppoint
+
+
+def checkAdoptionNetworkDot(pties, seed):
+    G, topo, state, weak, ppoint = trialState(pties, seed)
+    dot = adoptionNetworkDot(topo, state.I, state.A, state.adopted,
+                             state.influence, weak, ppoint)
+    assert(dot.startswith("graph {") and dot.endswith("}\n"))
+
+    ties = re.findall(r"^\t+(\d+) -- (\d+)( \[len=1.5\])?;$", dot, re.M)
+    assert(sorted((int(a), int(b)) for a, b, core in ties) == \
+           sorted(tuple(sorted(edge)) for edge in G.edges()))
+    assert(all((bool(core) == (int(a) < 4 and int(b) < 4))
+               for a, b, core in ties))
+    arrows = re.findall(r"^\t(\d+) -- (\d+) \[.*dir=forward.*\];$", dot, re.M)
+    assert(sorted((int(b), int(a)) for a, b in arrows) == \
+           sorted((topo.nodes[i], topo.nodes[j])
+                  for i in xrange(topo.n) for j in state.influence[i]))
+    for i, node in enumerate(topo.nodes):
+        line = re.search(r"^\t%d \[(.*)\];$" % node, dot, re.M).group(1)
+        assert(("adopted=%s" % state.adopted[i]) in line)
+        assert(("color=" in line.replace("fillcolor=", "")) == \
+               (weak[i] or ppoint[i]))
+
+    # the same document from the graph of the nx simulation
+    H = applyTrialState(G, topo, state.I, state.A, state.adopted,
+                        state.influence)
+    I, A, adopted, influence = graphTrialState(H, topo)
+    assert(adoptionNetworkDot(topo, I, A, adopted, influence, weak,
+                              ppoint) == dot)
+
+
+def testAdoptionNetworkDot():
+    for pties in (0, 10, 30):
+        for seed in (1, 2):
+            yield checkAdoptionNetworkDot, pties, seed
+
+
+def testQuoteID():
+    assert(quoteID(12) == "12" and quoteID(-0.5) == "-0.5")
+    assert(quoteID("firebrick1") == "firebrick1")
+    assert(quoteID("node") == '"node"' and quoteID("8,8!") == '"8,8!"')
+    assert(quoteID('say "hi"') == '"say \\"hi\\""')
+
+
+def testDotArchive():
+    outFilePath = tempfile.mkdtemp()
+    try:
+        path = pathjoin(outFilePath, "networks.dot")
+        archive = DotArchiveWriter(path)
+        docs = {}
+        for trial in xrange(1, 6):
+            G, topo, state, weak, ppoint = trialState(5*trial, trial)
+            name = "PTies%d-Trial%d" % (5*trial, trial)
+            docs[name] = adoptionNetworkDot(topo, state.I, state.A,
+                                            state.adopted, state.influence,
+                                            weak, ppoint)
+            archive.add(name, docs[name])
+        archive.close()
+
+        assert(isDotArchive(path) and not isDotArchive(outFilePath))
+        reader = DotArchive(path)
+        assert(len(reader) == 5 and "PTies10-Trial2" in reader)
+        assert(reader.names() == sorted(docs, key=lambda name:
+                                        int(name.split("Trial")[1])))
+        for name in ("PTies20-Trial4", "PTies5-Trial1", "PTies25-Trial5"):
+            assert(reader.read(name) == docs[name])
+        # the archive is the concatenation of the documents
+        assert(open(path).read() == "".join(docs[name]
+                                            for name in reader.names()))
+    finally:
+        shutil.rmtree(outFilePath)
+
+
+def testRunArchiveDoesNotDependOnWorkers():
+    base = tempfile.mkdtemp()
+    try:
+        archives = []
+        for workers in (1, 3):
+            outFilePath = pathjoin(base, "workers%d" % workers)
+            run1997ThresholdModel(outFilePath=outFilePath, numberOfNodes=13,
+                                  trials=3, ambiguityLevels=[1, 3], seed=2,
+                                  dots="all", dotArchive=True, 
+                                  workers=workers, engine="csr")
+            # no file per trial
+            assert([name for name in listdir(outFilePath)
+                    if name.endswith(".dot")] == ["adoptionNetworks-n13.dot"])
+            path = pathjoin(outFilePath, "adoptionNetworks-n13.dot")
+            archives.append((open(path).read(), open(path+".index").read()))
+        # a document per trial
+        trialLog = open(pathjoin(outFilePath, "experimentTrialLog-n13.csv"))
+        assert(len(DotArchive(path)) == len(trialLog.readlines()))
+        assert(archives[0] == archives[1])
+    finally:
+        shutil.rmtree(base)
@@ -38,7 +38,8 @@ Test implementation
 '''
 from nose.tools import raises
 from itertools import permutations, product
-from disim.graphgen import DICorePeriphNxGenerator
+from disim.graphgen import DICorePeriphNxGenerator, periphTieFromIndex, \
+                           NestedCorePeriphSweep
 from disim.stats import possibleTies
 
 @raises(Exception)
@@ -72,6 +73,39 @@ def createAndTestValidGraph(numCore, numPeriph, pties):
         assert(len(coreNodes) == numCore)
         
 
+def testPeriphTieFromIndex():
+    for numCore, numPeriph in product([0, 1, 2, 10], [0, 1, 2, 3, 10, 37]):
+        totNxTies,totCoreTies,totPeriphTies = possibleTies(numCore+numPeriph,
+                                                           numCore)
+        ties = [periphTieFromIndex(i, numCore, numPeriph) 
+                for i in xrange(totPeriphTies)]
+        undirected = set(frozenset(t) for t in ties)
+        # every index maps to a distinct tie, and every tie to a periph node
+        assert(len(undirected) == totPeriphTies)
+        for u,v in ties:
+            assert(u != v and u >= numCore)
+            assert(0 <= v < numCore+numPeriph)
+
+
+def testNestedSweep():
+    numCore, numPeriph = 4, 12
+    totNxTies,totCoreTies,totPeriphTies = possibleTies(numCore+numPeriph,
+                                                       numCore)
+    sweep = NestedCorePeriphSweep(numCore, numPeriph, seed=3)
+    previous = set()
+    for pties in range(0, totPeriphTies+1, 5):
+        G = sweep.graph(pties)
+        edges = set(frozenset(e) for e in G.edges())
+        assert(len(edges) == totCoreTies+pties)
+        # each network of the sweep contains the previous one
+        assert(previous <= edges)
+        previous = edges
+    # going back down the sweep rebuilds the same prefix
+    again = NestedCorePeriphSweep(numCore, numPeriph, seed=3).graph(20)
+    assert(set(frozenset(e) for e in sweep.graph(20).edges()) == \
+           set(frozenset(e) for e in again.edges()))
+
+
 def testGraphGeneration():
     numCoreNodesL = numPeriphNodesL = [1, 2, 10, 100]
     ptiesL = [0,1]
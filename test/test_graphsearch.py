@@ -23,8 +23,15 @@ The purpose of this module is to test the networks search functions that
 detect weaknesses and pressure points.
 '''
 
-from disim.graphsearch import findWeaknessesAndPressurePoints
+from disim.graphsearch import findWeaknessesAndPressurePoints, \
+                              findWeaknessesAndPressurePointsArray, \
+                              WPPCache, WPP_CACHE, WPPFilter, \
+                              markGraphChanged, clearWPPCache, \
+                              countPressurePoints
+from disim.graphgen import generateARCorePeriph
 
+import random
+import numpy as np
 import networkx as nx
 from itertools import combinations
 
@@ -54,7 +61,83 @@ def testDetectWeaknessesAndPressurePoints():
     #print ppoints
     assert(weaknesses == [7])
     assert(ppoints == [5,7])
+
+
+def compareArrayWeaknessesAndPressurePoints(pties, targetSegment):
+    random.seed(pties)
+    G = generateARCorePeriph(10, 21, pties)
+    nodes = G.nodes()
+    adjacency = nx.to_numpy_matrix(G, nodelist=nodes).A
+    isTarget = np.array([targetSegment in G.node[n]['segments'] 
+                         for n in nodes])
+    I = np.array([[random.gauss(-1, 1) for n in nodes] for t in range(10)])
+    A = np.repeat(3.0, I.size).reshape(I.shape)
+    
+    batch = findWeaknessesAndPressurePointsArray(nodes, adjacency, isTarget,
+                                                 I, A)
+    for t in range(10):
+        for i,n in enumerate(nodes):
+            G.node[n]['I'], G.node[n]['A'] = I[t][i], A[t][i]
+        expected = findWeaknessesAndPressurePoints(G, 
+                            targetSegment=targetSegment, ignoreCache=True)
+        assert(batch[t] == expected)
+        assert(findWeaknessesAndPressurePointsArray(nodes, adjacency, 
+                                            isTarget, I[t], A[t]) == expected)
+
+def testArrayWeaknessesAndPressurePoints():
+    for pties in (0, 5, 40, 150, 300):
+        for targetSegment in ('periphery', 'core'):
+            yield compareArrayWeaknessesAndPressurePoints, pties, targetSegment
+
+def testWPPCacheEviction():
+    cache = WPPCache(maxSize=3)
+    for key in range(3):
+        cache[key] = key
+    cache[0] # 0 is now the most recently used entry
+    cache[3] = 3
+    assert(1 not in cache)
+    assert(len(cache) == 3 and all(key in cache for key in (0, 2, 3)))
+
+def testWPPCacheFollowsGraphVersion():
+    clearWPPCache()
+    random.seed(1)
+    G = generateARCorePeriph(4, 8, 20)
+    for n in G.nodes():
+        G.node[n]['I'], G.node[n]['A'] = -2.0, 3.0
+    markGraphChanged(G)
+    assert(findWeaknessesAndPressurePoints(G)[0] == [])
+    
+    # the filters of the trial reuse the simulation's search
+    WPPFilter()(G)
+    assert(len(WPP_CACHE) == 1)
     
+    # a changed graph is searched again
+    for n in G.nodes():
+        G.node[n]['I'] = 1.0
+    markGraphChanged(G)
+    weaknesses, ppoints = findWeaknessesAndPressurePoints(G)
+    assert(len(WPP_CACHE) == 2)
+    assert(weaknesses == findWeaknessesAndPressurePoints(G, 
+                                                    ignoreCache=True)[0])
+    assert(weaknesses != [])
+
+def compareMultiProportionPressurePoints(pties, targetSegment):
+    random.seed(pties)
+    G = generateARCorePeriph(10, 21, pties)
+    for n in G.nodes():
+        G.node[n]['I'], G.node[n]['A'] = -1.0, 1.0
+    proportions = [0, 0.1, 0.25, 0.3, 0.5, 0.6, 0.9, 1]
+    counts = countPressurePoints(G, proportions, targetSegment)
+    for proportion, numPPoints in zip(proportions, counts):
+        ppoints = findWeaknessesAndPressurePoints(G, proportion=proportion,
+                    targetSegment=targetSegment, addGraphAttrs=False)[1]
+        assert(numPPoints == len(ppoints))
+
+def testMultiProportionPressurePoints():
+    for pties in (0, 5, 40, 150, 300):
+        for targetSegment in ('periphery', 'core'):
+            yield compareMultiProportionPressurePoints, pties, targetSegment
+
 if __name__ == "__main__":
     testDetectWeaknessesAndPressurePoints()
     
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''
+:author: Christopher Kirkos
+
+The queue must draw every submitted snapshot of a trial, and a failing run
+must not leave drawing or simulation workers running.
+'''
+
+import shutil
+import tempfile
+from os.path import join as pathjoin, exists
+from multiprocessing import active_children
+import numpy as np
+from disim import disim
+from disim.graphgen import generateARCorePeriph
+from disim.cascade import CSRTopology
+from disim.dotwriter import adoptionNetworkDot
+from disim.render import RenderQueue
+
+
+def trialDot(topo, trial):
+    rs = np.random.RandomState(trial)
+    adopted = rs.uniform(size=topo.n) < 0.5
+    influence = [[j for j in topo.neighbors(i) if adopted[j]]
+                 for i in xrange(topo.n)]
+    flags = np.zeros(topo.n, dtype=bool)
+    return adoptionNetworkDot(topo, rs.normal(size=topo.n),
+                              np.repeat(2.0, topo.n), adopted, influence,
+                              flags, flags)
+
+
+def writeDocument(dot, writePng):
+    outFile = open(writePng, "w")
+    outFile.write(dot)
+    outFile.close()
+
+
+def testRenderQueue():
+    topo = CSRTopology(generateARCorePeriph(4, 8, 12))
+    outFilePath = tempfile.mkdtemp()
+    try:
+        queue = RenderQueue(2, maxPending=1, draw=writeDocument)
+        expected = []
+        for trial in xrange(10):
+            expected.append(trialDot(topo, trial))
+            queue.submit(expected[-1], pathjoin(outFilePath, "%d.png" % trial))
+            assert(len(queue.pending) <= 1)
+        queue.close()
+        for trial in xrange(10):
+            assert(open(pathjoin(outFilePath, "%d.png" % trial)).read() == \
+                   expected[trial])
+        assert(not exists(pathjoin(outFilePath, "10.png")))
+    finally:
+        shutil.rmtree(outFilePath)
+
+
+class Interrupted(Exception):
+    pass
+
+
+def checkFailedRunStopsWorkers(workers):
+    def failingRunCase(*args, **kwargs):
+        raise Interrupted()
+    runCase = disim.runCase
+    disim.runCase = failingRunCase
+    outFilePath = tempfile.mkdtemp()
+    try:
+        disim.run1997ThresholdModel(outFilePath=outFilePath, numberOfNodes=13,
+                                    trials=2, pngs="all", seed=1,
+                                    workers=workers)
+        assert(False)
+    except Interrupted:
+        assert(active_children() == [])
+    finally:
+        disim.runCase = runCase
+        shutil.rmtree(outFilePath)
+
+
+def testFailedRunStopsWorkers():
+    # the render queue of a single case worker, or the pool of case workers
+    for workers in (1, 2):
+        yield checkFailedRunStopsWorkers, workers
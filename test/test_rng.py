@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''
+:author: Christopher Kirkos
+
+The draws of a case or trial must only depend on the base seed and its key,
+not on the global random states or on what was drawn before.
+'''
+
+import csv
+import random
+import shutil
+import tempfile
+from os.path import join as pathjoin
+import numpy as np
+from disim.rng import RandomStreams, drawTrialProfits, verifiedTrials
+from disim.disim import runCase, run1997ThresholdModel, replayTrial, \
+                        parseAmbiguityLevels
+from disim.graphgen import DICorePeriphNxGenerator
+
+
+def testTrialDrawsDoNotDependOnBatch():
+    streams = RandomStreams(3, "down", 10, 2)
+    candidates = np.arange(5)
+    I, seeds = drawTrialProfits(streams, 20, 8, candidates, -1, 1)
+    for t in (0, 7, 19):
+        # a trial drawn alone, or in a smaller batch
+        I2, seeds2 = drawTrialProfits(streams.spawn(), t+1, 8, candidates,
+                                      -1, 1)
+        assert((I2[t] == I[t]).all() and seeds2[t] == seeds[t])
+    other = drawTrialProfits(RandomStreams(3, "down", 10, 3), 20, 8,
+                             candidates, -1, 1)[0]
+    assert(not (other == I).any())
+
+
+def testVerifiedTrials():
+    streams = RandomStreams(3, "down", 10, 2)
+    sample = verifiedTrials(streams, 100, 10)
+    assert(len(sample) == 10 and sample <= set(xrange(1, 101)))
+    assert(max(sample) > 10 and verifiedTrials(streams, 100, 10) == sample)
+    assert(verifiedTrials(streams, 5, 8) == set(xrange(1, 6)))
+    assert(verifiedTrials(streams, 5, 0) == set())
+
+
+def checkCaseIsReproducible(engine):
+    kwargs = dict(trickleDirection="up", numberOfNodes=13, trials=10,
+                  engine=engine, seed=5)
+    random.seed(1)
+    np.random.seed(1)
+    state, npState = random.getstate(), np.random.get_state()
+    first = runCase((20, 2), **kwargs)
+    # the global random states are neither used nor changed
+    assert(random.getstate() == state)
+    assert((np.random.get_state()[1] == npState[1]).all())
+    random.seed(2)
+    np.random.seed(2)
+    runCase((25, 3), **kwargs)
+    assert(runCase((20, 2), **kwargs) == first)
+
+
+def testCaseIsReproducible():
+    for engine in ("nx", "csr", "batch", "parametric"):
+        yield checkCaseIsReproducible, engine
+
+
+def testGeneratorSeedIsPrivate():
+    random.seed(1)
+    state = random.getstate()
+    G = DICorePeriphNxGenerator(3, 6, 10, seed=4).next()
+    assert(random.getstate() == state)
+    assert(sorted(G.edges()) == \
+           sorted(DICorePeriphNxGenerator(3, 6, 10, seed=4).next().edges()))
+
+
+def checkReplayTrial(runArgs):
+    outFilePath = tempfile.mkdtemp()
+    try:
+        run1997ThresholdModel(trickleDirection="up", numberOfNodes=13, 
+                              trials=6, outFilePath=outFilePath, seed=11,
+                              ambiguityLevels=[1, 2.5], **runArgs)
+        logFile = open(pathjoin(outFilePath, "experimentTrialLog-n13.csv"))
+        rows = list(csv.reader(logFile))
+        logFile.close()
+        for row in rows[::17]:
+            pties, Ai, trial = int(row[0]), float(row[1]), int(row[2])
+            replayed = replayTrial(outFilePath, pties, Ai, trial, 
+                                   dots="none", pngs="none")
+            assert([str(v) for v in replayed] == row)
+    finally:
+        shutil.rmtree(outFilePath)
+
+
+def testReplayTrial():
+    for runArgs in (dict(engine="csr"), dict(engine="batch", 
+                                             commonRandomNumbers=True),
+                    dict(engine="nx", nestedSweep=True),
+                    dict(engine="incremental", 
+                         pressurePointProportions=[0.25])):
+        yield checkReplayTrial, runArgs
+
+
+def testAmbiguityLevelsSpecReproducesDefault():
+    base = tempfile.mkdtemp()
+    try:
+        logs = []
+        for spec in (None, "1:5:1", "1,2,3,4,5"):
+            outFilePath = pathjoin(base, str(len(logs)))
+            run1997ThresholdModel(numberOfNodes=13, trials=3, seed=8,
+                                  engine="csr", outFilePath=outFilePath,
+                                  ambiguityLevels=parseAmbiguityLevels(spec))
+            logs.append([open(pathjoin(outFilePath, name)).read() for name in
+                         ("experimentTrialLog-n13.csv", 
+                          "experimentCaseLog-n13.csv")])
+        assert(logs[1] == logs[0] and logs[2] == logs[0])
+    finally:
+        shutil.rmtree(base)
@@ -26,14 +26,26 @@ the optimized versions match the output of the standard versions.
 '''
 from __future__ import division
 
+import shutil
+import tempfile
 from numpy import vectorize, array
+from os.path import join as pathjoin
+import numpy as np
+from itertools import product
 
 from disim.stats import ( standardizeCoeff, 
                           calcNxDensity, 
                           calcPerpipheralDensity, 
                           optimizedCalcNxDensity, 
                           optimizedCalcPeriphDensity,
-                          possibleTies )
+                          possibleTies,
+                          runOLSRegression1997,
+                          RegressionSession,
+                          TrialMoments )
+from disim.ols import CrossProducts, groupCrossProducts, combineGroups, \
+                      fitStandardized, standardizedResiduals, summary, \
+                      residualStatistics, momentResidualStatistics
+from scikits.statsmodels.regression import linear_model
 
 
 def testNetworkDensity():
@@ -74,7 +86,161 @@ def testNetworkDensity():
     pdensSvO = pdensS == pdensO
     assert (False not in pdensSvO)
     
+
+
+def makeTrialLog(numRows=2000, seed=1):
+    "Random trial log columns of a network with 10 core and 21 periph nodes."
+    rs = np.random.RandomState(seed)
+    pties = rs.randint(0, 270, numRows)
+    columns = [pties, rs.randint(1, 6, numRows), np.ones(numRows),
+               rs.randint(0, 11, numRows), np.repeat(10, numRows),
+               rs.randint(0, 22, numRows), np.repeat(21, numRows),
+               rs.randint(0, 5, numRows), rs.randint(0, 5, numRows)]
+    return [np.asarray(c, dtype=float) for c in columns]
+
+def legacyRegression(trialLog, peripheralTieRange, densityRange,
+                     withBoundaryAnalysis):
+    "The regression of the original `runOLSRegression1997`, with statsmodels."
+    log = np.column_stack(trialLog)
+    indep = [log[:,1], log[:,3], 
+             optimizedCalcPeriphDensity(log[:,0], log[:,4], log[:,6])]
+    if withBoundaryAnalysis:
+        indep.extend([log[:,7], log[:,8]])
+    y = log[:,5]
+    pties = log[:,0]
+    densA = optimizedCalcNxDensity(log[:,0], log[:,4], log[:,6])
+    ptr = peripheralTieRange or (np.min(pties), np.max(pties))
+    dr = densityRange or (np.min(densA), np.max(densA))
+    mask = np.ma.masked_inside(pties, *ptr).mask & \
+           np.ma.masked_inside(densA, *dr).mask
+    if not mask.any():
+        return None
+    y = y[mask]
+    X = np.array([standardizeCoeff(x[mask]) for x in indep]).T
+    fit = linear_model.OLS(standardizeCoeff(y), X).fit()
+    return fit, (np.mean(y), np.std(y), np.min(y), np.max(y))
+
+def testRegressionSession():
+    trialLog = makeTrialLog()
+    session = RegressionSession(trialLog)
+    conditions = list(product((None, (0,185), (300, 400)), 
+                              (None, (0,0.5), (0.5,1)), (True, False)))
+    for cond, regstats in zip(conditions, session.regressAll(conditions)):
+        expected = legacyRegression(trialLog, *cond)
+        single = runOLSRegression1997(trialLog, peripheralTieRange=cond[0],
+                                      densityRange=cond[1],
+                                      withBoundaryAnalysis=cond[2])
+        if expected is None:
+            assert(regstats is None and single is None)
+            continue
+        assert(np.allclose(expected[0].params, single[0].params))
+        for attr in ("params", "bse", "rsquared", "fvalue", "llf"):
+            assert(np.allclose(getattr(expected[0], attr), 
+                               getattr(regstats[0], attr), rtol=1e-9, 
+                               atol=0))
+        assert(np.allclose(expected[1], regstats[1]))
+    
+def testFitMatchesStatsmodels():
+    trialLog = makeTrialLog(5000, 2)
+    session = RegressionSession(trialLog, "up")
+    selections = [session.caseMask(), session.caseAi >= 3,
+                  session.caseDensity <= 0.5]
+    for withBoundaryAnalysis in (True, False):
+        xIdx, yIdx, xnames = session.variables(withBoundaryAnalysis)
+        fits = session.regressCases(selections, withBoundaryAnalysis)
+        for selection, fit in zip(selections, fits):
+            data = session.data[selection[session.caseOf]]
+            X = np.array([standardizeCoeff(x) for x in data[:,xIdx].T]).T
+            expected = linear_model.OLS(standardizeCoeff(data[:,yIdx]),
+                                        X).fit()
+            for attr in ("params", "bse", "tvalues", "pvalues", "rsquared",
+                         "rsquared_adj", "fvalue", "f_pvalue", "llf", "aic",
+                         "bic", "nobs", "df_model", "df_resid"):
+                assert(np.allclose(getattr(expected, attr), 
+                                   getattr(fit, attr), rtol=1e-9, atol=0))
+            resid = standardizedResiduals(data, fit, xIdx, yIdx)
+            assert(np.allclose(resid, expected.wresid))
+            text = lambda s: [l for l in s.splitlines() 
+                              if "Date:" not in l and "Time:" not in l]
+            assert(text(summary(fit, residualStatistics(resid), "y", 
+                                xnames)) == \
+                   text(expected.summary(yname="y", xname=xnames)))
+
+def testGroupCrossProducts():
+    rs = np.random.RandomState(3)
+    data = rs.normal(size=(300, 4))
+    groups = rs.randint(0, 7, 300)
+    groups[groups == 5] = 4 # an empty group
+    stats = groupCrossProducts(data, groups)
+    selections = rs.randint(0, 2, (10, 7)).astype(bool)
+    n, mean, cross = combineGroups(*(stats + (selections,)))
+    for r, selection in enumerate(selections):
+        rows = data[selection[groups]]
+        if len(rows) == 0:
+            assert(n[r] == 0)
+            continue
+        expected = CrossProducts.fromData(rows)
+        assert(n[r] == expected.n)
+        assert(np.allclose(mean[r], expected.mean))
+        assert(np.allclose(cross[r], expected.cross))
+    merged = CrossProducts.fromData(data[:100]) + \
+             CrossProducts.fromData(data[100:])
+    assert(np.allclose(merged.cross, CrossProducts.fromData(data).cross))
+
+def testConstantVariableFit():
+    data = np.column_stack([np.arange(10.), np.ones(10), np.arange(10.)**2])
+    cp = CrossProducts.fromData(data)
+    assert(np.isnan(fitStandardized(cp.n, cp.cross, [1], 2)[0].params).all())
+    assert(np.isfinite(fitStandardized(cp.n, cp.cross, [0], 2)[0].params).all())
+
+def checkTrialMoments(trickleDirection, chunkRows):
+    trialLog = makeTrialLog(3000, 4)
+    # the simulation writes the trials of a case together
+    trialLog[0] = trialLog[0] // 10 * 10
+    order = np.lexsort((trialLog[1], trialLog[0]))
+    trialLog = [c[order] for c in trialLog]
+    rows = zip(*trialLog)
+    moments = TrialMoments(trickleDirection)
+    for start in xrange(0, len(rows), chunkRows):
+        moments.writerows(rows[start:start+chunkRows])
     
+    logSession = RegressionSession(trialLog, trickleDirection)
+    momentSession = RegressionSession(moments, trickleDirection)
+    tmp = tempfile.mkdtemp()
+    try:
+        for ptr, dr, wb in product((None, (0,185)), (None, (0,0.5)),
+                                   (True, False)):
+            logFit, logY = logSession.regress(ptr, dr, wb, 
+                                              pathjoin(tmp, "log.txt"))
+            fit, y = momentSession.regress(ptr, dr, wb, 
+                                           pathjoin(tmp, "moments.txt"))
+            assert(np.allclose(logFit.params, fit.params))
+            assert(np.allclose(logFit.bse, fit.bse))
+            assert(np.allclose(logY, y))
+            
+            xIdx, yIdx = logSession.variables(wb)[:2]
+            n, mean, cross = combineGroups(*(momentSession.caseStats + 
+                                     (momentSession.caseMask(ptr, dr),)))
+            expected = residualStatistics(standardizedResiduals(
+                                logSession.data[logSession.mask(ptr, dr)],
+                                fit, xIdx, yIdx))
+            assert(np.allclose(expected, momentResidualStatistics(
+                      [momentSession.moments[i] for i in 
+                       np.flatnonzero(momentSession.caseMask(ptr, dr))],
+                      fit, xIdx, yIdx, mean[0], 
+                      np.sqrt(np.diag(cross[0])/(n[0]-1)))))
+            text = lambda path: [l for l in file(path) 
+                                 if "Date:" not in l and "Time:" not in l]
+            assert(text(pathjoin(tmp, "log.txt")) == \
+                   text(pathjoin(tmp, "moments.txt")))
+    finally:
+        shutil.rmtree(tmp)
+
+def testTrialMoments():
+    for trickleDirection in ("down", "up"):
+        for chunkRows in (7, 3000):
+            yield checkTrialMoments, trickleDirection, chunkRows
+
 if __name__ == "__main__":
     testNetworkDensity()         
     
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011 Christopher Kirkos. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''
+:author: Christopher Kirkos
+
+Tests of the binary columnar trial log and its conversion to and from the
+CSV layout.
+'''
+
+import csv
+import shutil
+import tempfile
+import numpy as np
+from os.path import join as pathjoin
+from disim.triallog import openTrialLog, loadTrialLog, trialLogToCSV, \
+                           csvToTrialLog, isBinaryTrialLog
+from disim.disim import caseRowsFromTrialLog
+
+
+def makeRows(numExtra=0, levels=(1.0, 2.5)):
+    rows = []
+    for pties in (0, 5, 10):
+        for Ai in levels:
+            for trial in (1, 2, 3):
+                rows.append([pties, Ai, trial, trial % 4, 4, pties % 9, 9,
+                             trial, pties // 5] + [pties % 3]*numExtra)
+    return rows
+
+
+def checkRoundTrip(numExtra, chunkRows, levels):
+    tmp = tempfile.mkdtemp()
+    try:
+        rows = makeRows(numExtra, levels)
+        # as run1997ThresholdModel opens the log
+        integralAi = all(isinstance(Ai, int) for Ai in levels)
+        csvPath = pathjoin(tmp, "log.csv")
+        with file(csvPath, "w") as fp:
+            csv.writer(fp).writerows(rows)
+
+        logPath = pathjoin(tmp, "log.cols")
+        log = openTrialLog(logPath, binary=True, numExtraColumns=numExtra,
+                           integralAi=integralAi)
+        log.chunkRows = chunkRows
+        log.writerows(rows)
+        log.close()
+        assert(isBinaryTrialLog(logPath) and not isBinaryTrialLog(csvPath))
+
+        columns = loadTrialLog(logPath)
+        assert(len(columns) == 9 + numExtra)
+        for expected, column in zip(np.array(rows).T,
+                                    loadTrialLog(csvPath)):
+            assert((expected == column).all())
+        for expected, column in zip(np.array(rows).T, columns):
+            assert((expected == column).all())
+
+        trialLogToCSV(logPath, pathjoin(tmp, "back.csv"))
+        assert(file(pathjoin(tmp, "back.csv")).read() == \
+               file(csvPath).read())
+        csvToTrialLog(csvPath, pathjoin(tmp, "conv.cols"))
+        for a, b in zip(loadTrialLog(pathjoin(tmp, "conv.cols")), columns):
+            assert((a == b).all() and a.dtype == b.dtype)
+    finally:
+        shutil.rmtree(tmp)
+
+
+def testRoundTrip():
+    for numExtra in (0, 2):
+        for chunkRows in (1, 7, 1000):
+            # integer levels, and float levels, integral or not
+            for levels in ((1, 2), (1.0, 2.5), (1.0, 2.0)):
+                yield checkRoundTrip, numExtra, chunkRows, levels
+
+
+def testEmptyLog():
+    tmp = tempfile.mkdtemp()
+    try:
+        logPath = pathjoin(tmp, "log.cols")
+        openTrialLog(logPath, binary=True).close()
+        assert(all(len(c) == 0 for c in loadTrialLog(logPath)))
+    finally:
+        shutil.rmtree(tmp)
+
+
+def testCaseRowsFromTrialLog():
+    columns = [np.array(c, dtype=float) for c in zip(*makeRows())]
+    caseRows = caseRowsFromTrialLog(columns)
+    assert([row[0] for row in caseRows] == [1, 2.5]*3)
+    # 5 periphery ties of 4*9 + 9*8/2 possible
+    assert(np.allclose(caseRows[2][1], 5/72.))
+    assert(np.allclose(caseRows[2][2], 5/9.))
+    assert(np.allclose(caseRows[0][3], (1+2+3)/12.))